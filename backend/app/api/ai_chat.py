@@ -5,9 +5,9 @@ Handles initialization, syncing, and chat interactions with separate internal/ex
 """
 from flask import Blueprint, jsonify, request, g
 from app.api.auth import require_auth, require_role
+from app.core.config import settings
 from app.core.supabase import db
-from app.services import openai_service, slack_sync_service
-from datetime import datetime
+from app.services import openai_service, local_retrieval, project_ai, ai_warmup
 
 ai_chat = Blueprint('ai_chat', __name__)
 
@@ -17,66 +17,29 @@ ai_chat = Blueprint('ai_chat', __name__)
 @require_role('superadmin', 'internal')
 def initialize_ai(project_id):
     """
-    Initialize AI assistants and vector stores for a project.
-    Creates both internal and external assistants.
+    Initialize AI resources for a project.
+    Creates one source-tagged vector store (AI_CONSOLIDATED_LAYOUT) or the
+    per-source stores and assistants, same as global sync.
     """
     try:
         # Get project info
-        project = db.table("projects").select("client_name, internal_vector_store_id, external_vector_store_id").eq("id", project_id).execute()
+        project = db.table("projects").select("*").eq("id", project_id).execute()
         if not project.data:
             return jsonify({"error": "Project not found"}), 404
         
         project_data = project.data[0]
-        client_name = project_data['client_name']
         
         # Check if already initialized
-        if project_data.get('internal_vector_store_id'):
+        if project_ai.is_initialized(project_data):
             return jsonify({"error": "AI already initialized for this project"}), 400
         
-        # Create internal vector store and assistant
-        internal_store_id = openai_service.create_vector_store(
-            name=f"{client_name} - Internal",
-            description=f"Internal communications for {client_name} project"
-        )
-        
-        internal_assistant_id = openai_service.create_assistant(
-            name=f"{client_name} Internal Assistant",
-            instructions=f"""You are an AI assistant for the {client_name} project's internal team.
-You have access to internal Slack communications and project notes.
-Help the team with project questions, status updates, and technical discussions.
-Be professional, concise, and helpful.""",
-            vector_store_id=internal_store_id
-        )
-        
-        # Create external vector store and assistant
-        external_store_id = openai_service.create_vector_store(
-            name=f"{client_name} - External",
-            description=f"External communications for {client_name} project"
-        )
-        
-        external_assistant_id = openai_service.create_assistant(
-            name=f"{client_name} External Assistant",
-            instructions=f"""You are an AI assistant for the {client_name} project.
-You have access to external communications with the client and Shopline team.
-Help answer questions about the project, provide status updates, and assist with coordination.
-Be professional, friendly, and client-focused.""",
-            vector_store_id=external_store_id
-        )
-        
-        # Update project with IDs
-        db.table("projects").update({
-            "internal_vector_store_id": internal_store_id,
-            "external_vector_store_id": external_store_id,
-            "internal_assistant_id": internal_assistant_id,
-            "external_assistant_id": external_assistant_id,
-            "sync_status": "initialized"
-        }).eq("id", project_id).execute()
+        fields = project_ai.initialize_project(project_data)
         
         return jsonify({
             "success": True,
-            "message": "AI assistants initialized successfully",
-            "internal_assistant_id": internal_assistant_id,
-            "external_assistant_id": external_assistant_id
+            "message": "AI initialized successfully",
+            "layout": "consolidated" if project_ai.CONSOLIDATED_STORE_COLUMN in fields else "legacy",
+            **fields
         })
     except Exception as e:
         print(f"Error initializing AI: {e}")
@@ -88,8 +51,8 @@ Be professional, friendly, and client-focused.""",
 @require_role('superadmin', 'internal')
 def sync_knowledge_base(project_id):
     """
-    Sync Slack messages to vector stores.
-    Fetches messages from both internal and external channels.
+    Sync the project's knowledge to its vector stores: Slack messages from
+    both channels, PM data and emails.
     """
     try:
         # Get project
@@ -100,40 +63,22 @@ def sync_knowledge_base(project_id):
         project_data = project.data[0]
         
         # Check if AI is initialized
-        if not project_data.get('internal_vector_store_id'):
+        if not project_ai.is_usable(project_data):
             return jsonify({"error": "AI not initialized. Call /initialize first"}), 400
         
         # Update status to syncing
         db.table("projects").update({"sync_status": "syncing"}).eq("id", project_id).execute()
         
-        # Sync internal channel
-        internal_messages = slack_sync_service.sync_internal_channel(project_id)
-        if internal_messages:
-            openai_service.upload_messages_to_vector_store(
-                project_data['internal_vector_store_id'],
-                internal_messages
-            )
-        
-        # Sync external channel
-        external_messages = slack_sync_service.sync_external_channel(project_id)
-        if external_messages:
-            openai_service.upload_messages_to_vector_store(
-                project_data['external_vector_store_id'],
-                external_messages
-            )
-        
-        # Update sync timestamps
-        db.table("projects").update({
-            "last_sync_internal": datetime.now().isoformat(),
-            "last_sync_external": datetime.now().isoformat(),
-            "sync_status": "synced"
-        }).eq("id", project_id).execute()
+        # Upload changed month shards for every source and stamp the sync time (UTC)
+        counts, _ = project_ai.sync_knowledge(project_data)
         
         return jsonify({
             "success": True,
-            "message": f"Synced {len(internal_messages)} internal and {len(external_messages)} external messages",
-            "internal_count": len(internal_messages),
-            "external_count": len(external_messages)
+            "message": f"Synced {counts.get('internal', 0)} internal and {counts.get('external', 0)} external messages",
+            "internal_count": counts.get('internal', 0),
+            "external_count": counts.get('external', 0),
+            "pm_count": counts.get('pm', 0),
+            "email_count": counts.get('email', 0)
         })
     except Exception as e:
         print(f"Error syncing: {e}")
@@ -147,11 +92,14 @@ def chat_with_ai(project_id):
     """
     Send a message to the AI assistant.
     Routes to internal or external assistant based on user role and visibility.
+    With backend="local" the question is answered from the local retrieval
+    index with a single completion instead of an assistant run.
     """
     data = request.json
     message = data.get('message')
     visibility = data.get('visibility', 'external')  # internal or external
     thread_id = data.get('thread_id')  # Optional: continue existing conversation
+    backend = data.get('backend', 'assistant')  # assistant or local
     
     if not message:
         return jsonify({"error": "Message is required"}), 400
@@ -176,34 +124,105 @@ def chat_with_ai(project_id):
             # Everyone can access external assistant
             assistant_id = project_data.get('external_assistant_id')
         
-        if not assistant_id:
+        if backend == 'local':
+            if not local_retrieval.ensure_fresh(project_id):
+                # First question on this project: its index is being built in the background
+                return jsonify({
+                    "success": False,
+                    "status": "indexing",
+                    "message": "The project index is being built. Please try again in a moment.",
+                    "retry_after": ai_warmup.WARMUP_RETRY_AFTER_SECONDS
+                }), 202
+            result = local_retrieval.answer_question(
+                project_id=project_id,
+                client_name=project_data.get('client_name'),
+                question=message,
+                visibility=visibility
+            )
+            return jsonify({
+                "success": True,
+                "thread_id": None,
+                "response": result['response'],
+                "visibility": visibility,
+                "backend": "local",
+                "sources": result['sources'],
+                "retrieval_stats": result['retrieval_stats']
+            })
+        
+        if settings.AI_LAZY_INIT and not ai_warmup.ensure_ready(project_data):
+            # First chat on this project: resources and knowledge are being prepared
+            return jsonify({
+                "success": False,
+                "status": "warming_up",
+                "message": "The AI assistant for this project is warming up. Please try again in a moment.",
+                "retry_after": ai_warmup.WARMUP_RETRY_AFTER_SECONDS
+            }), 202
+        
+        if project_ai.uses_consolidated_layout(project_data):
+            # One store for every source; visibility is applied as a file_search filter
+            result = project_ai.chat(project_data, visibility, message, previous_response_id=thread_id)
+        elif not assistant_id:
             return jsonify({"error": "AI not initialized for this project"}), 400
-        
-        # Chat with assistant
-        result = openai_service.chat_with_assistant(
-            assistant_id=assistant_id,
-            thread_id=thread_id,
-            message=message
-        )
+        else:
+            # Chat with assistant
+            result = openai_service.chat_with_assistant(
+                assistant_id=assistant_id,
+                thread_id=thread_id,
+                message=message
+            )
         
         return jsonify({
             "success": True,
             "thread_id": result['thread_id'],
             "response": result['response'],
-            "visibility": visibility
+            "visibility": visibility,
+            "run_stats": result['run_stats']
         })
+    except openai_service.AssistantRunError as e:
+        print(f"AI run did not complete: {e}")
+        return jsonify({
+            "error": str(e),
+            "run_stats": e.stats
+        }), 504 if e.status in ['timeout', 'expired'] else 500
     except Exception as e:
         print(f"Error chatting with AI: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@ai_chat.route('/projects/<project_id>/ai/local-index', methods=['POST'])
+@require_auth
+@require_role('superadmin', 'internal')
+def update_local_index(project_id):
+    """
+    Update (or with {"rebuild": true}, rebuild) the project's local retrieval index.
+    Chats refresh a stale index in the background; this front-loads the work.
+    """
+    try:
+        project = db.table("projects").select("id").eq("id", project_id).execute()
+        if not project.data:
+            return jsonify({"error": "Project not found"}), 404
+        
+        rebuild = bool((request.get_json(silent=True) or {}).get('rebuild'))
+        stats = local_retrieval.update_index(project_id, rebuild=rebuild)
+        
+        return jsonify({
+            "success": True,
+            "passages_added": stats['added'],
+            "passages_replaced": stats['replaced'],
+            "passages_total": stats['total']
+        })
+    except Exception as e:
+        print(f"Error updating local index: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @ai_chat.route('/projects/<project_id>/ai/status', methods=['GET'])
 @require_auth
 def get_ai_status(project_id):
     """Get AI initialization and sync status for a project."""
     try:
         project = db.table("projects").select(
-            "internal_assistant_id, external_assistant_id, last_sync_internal, last_sync_external, sync_status"
+            f"{project_ai.AI_COLUMNS}, last_sync_internal, last_sync_external, sync_status"
         ).eq("id", project_id).execute()
         
         if not project.data:
@@ -212,7 +231,10 @@ def get_ai_status(project_id):
         data = project.data[0]
         
         return jsonify({
-            "initialized": bool(data.get('internal_assistant_id')),
+            "initialized": project_ai.is_usable(data),
+            "complete": project_ai.is_initialized(data),
+            "layout": "consolidated" if project_ai.uses_consolidated_layout(data) else "legacy",
+            "warming_up": ai_warmup.is_warming(project_id),
             "sync_status": data.get('sync_status'),
             "last_sync_internal": data.get('last_sync_internal'),
             "last_sync_external": data.get('last_sync_external')
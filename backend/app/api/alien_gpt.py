@@ -5,30 +5,16 @@ Dynamically queries vector stores based on user permissions.
 """
 from flask import Blueprint, request, jsonify, g
 from app.api.auth import require_auth
-from app.services import access_control
-from app.core.config import settings
-from openai import OpenAI
-import time
+from app.services import access_control, openai_service, answer_cache, assistant_registry
 
 alien_gpt = Blueprint('alien_gpt', __name__)
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
-# Global AlienGPT assistant ID (created once, stored here)
-# TODO: Move to database settings table for persistence
-ALIEN_GPT_ASSISTANT_ID = None
+# app_settings key holding {"assistant_id", "config_hash"} for the shared assistant
+ALIEN_GPT_REGISTRY_KEY = "ALIEN_GPT_ASSISTANT"
 
-
-def get_or_create_alien_gpt():
-    """Get or create the global AlienGPT assistant."""
-    global ALIEN_GPT_ASSISTANT_ID
-    
-    if ALIEN_GPT_ASSISTANT_ID:
-        return ALIEN_GPT_ASSISTANT_ID
-    
-    # Create global assistant (no vector stores attached - we'll add them per query)
-    assistant = client.beta.assistants.create(
-        name="AlienGPT - Global Assistant",
-        instructions="""You are AlienGPT, the global AI assistant for the Alien Portal platform.
+ALIEN_GPT_NAME = "AlienGPT - Global Assistant"
+ALIEN_GPT_MODEL = "gpt-4o-mini"
+ALIEN_GPT_INSTRUCTIONS = """You are AlienGPT, the global AI assistant for the Alien Portal platform.
 
 CRITICAL RULES:
 1. You have access to multiple projects based on user permissions
@@ -63,15 +49,22 @@ You: "**Project X**: Latest update from Dec 20:
 - Next milestone: Launch scheduled for Jan 15
 - Source: PM report by Leo, Dec 20"
 
-Be helpful, accurate, and always attribute information to the correct project.""",
-        model="gpt-4o-mini",
+Be helpful, accurate, and always attribute information to the correct project."""
+
+
+def get_or_create_alien_gpt():
+    """
+    Get the global AlienGPT assistant, shared by all workers through app_settings.
+    Created once; updated in place when the instructions above change.
+    """
+    # No vector stores attached - we'll add them per query
+    return assistant_registry.ensure_assistant(
+        ALIEN_GPT_REGISTRY_KEY,
+        name=ALIEN_GPT_NAME,
+        instructions=ALIEN_GPT_INSTRUCTIONS,
+        model=ALIEN_GPT_MODEL,
         tools=[{"type": "file_search"}]
     )
-    
-    ALIEN_GPT_ASSISTANT_ID = assistant.id
-    print(f"✅ Created AlienGPT assistant: {ALIEN_GPT_ASSISTANT_ID}")
-    
-    return ALIEN_GPT_ASSISTANT_ID
 
 
 @alien_gpt.route('/alien-gpt/chat', methods=['POST'])
@@ -100,8 +93,9 @@ def chat():
                 "error": "AlienGPT is only available for internal team members. Please use the per-project AI assistant instead."
             }), 403
         
-        # Get accessible vector stores based on role
-        accessible_stores = access_control.get_accessible_vector_stores(user_id, user_role)
+        # One access snapshot (stores + projects) serves the whole request
+        access = access_control.get_access_snapshot(user_id, user_role)
+        accessible_stores = access['stores']
         
         if not accessible_stores:
             return jsonify({
@@ -109,66 +103,61 @@ def chat():
                 "accessible_projects": []
             }), 403
         
-        # Get or create AlienGPT assistant
-        assistant_id = get_or_create_alien_gpt()
+        # New conversations reuse a cached answer while the searchable data is
+        # unchanged: same stores, and no project synced since it was cached
+        cache_key = None
+        if not thread_id:
+            cache_key = answer_cache.make_key(
+                'alien_gpt', message, user_role,
+                answer_cache.fingerprint([sorted(accessible_stores), access['version']])
+            )
+            cached = answer_cache.get('alien_gpt', cache_key)
+            if cached:
+                return jsonify(dict(cached, cached=True))
+        
+        if not openai_service.get_openai_client():
+            return jsonify({"error": "OpenAI API key not configured"}), 400
         
         # NOTE: OpenAI only allows 1 vector store per thread
         # For now, we'll use the assistant without thread-level vector stores
         # The assistant will search across all vector stores it has access to
         # TODO: Implement role-based filtering in the assistant instructions
         
-        # Create or use existing thread (without vector stores)
-        if thread_id:
-            # Continue existing conversation
-            pass  # Use existing thread_id
-        else:
-            # Create new thread
-            thread = client.beta.threads.create()
-            thread_id = thread.id
-        
-        # Add user message to thread
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=message
-        )
-        
-        # Run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=assistant_id
-        )
-        
-        # Wait for completion
-        while run.status in ['queued', 'in_progress']:
-            time.sleep(0.5)
-            run = client.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run.id
+        # Run on the shared assistant event loop (new thread if thread_id is None);
+        # an AlienGPT assistant deleted upstream is recreated and the run retried
+        try:
+            run_result = assistant_registry.call_with_assistant(
+                ALIEN_GPT_REGISTRY_KEY,
+                get_or_create_alien_gpt,
+                lambda assistant_id: openai_service.chat_with_assistant(assistant_id, thread_id, message)
             )
-        
-        if run.status == 'failed':
+        except openai_service.AssistantRunError as e:
             return jsonify({
                 "error": "AI processing failed",
-                "details": run.last_error
-            }), 500
+                "details": str(e),
+                "run_stats": e.stats
+            }), 504 if e.status in ['timeout', 'expired'] else 500
         
-        # Get the response
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        latest_message = messages.data[0]
-        response_text = latest_message.content[0].text.value
+        thread_id = run_result['thread_id']
+        response_text = run_result['response']
+        run_stats = run_result['run_stats']
         
-        # Get user's accessible projects for context
-        accessible_projects = access_control.get_user_accessible_projects(user_id, user_role)
+        accessible_projects = access['projects']
         
-        return jsonify({
+        result = {
             "success": True,
             "thread_id": thread_id,
             "response": response_text,
             "user_role": user_role,
             "accessible_projects": accessible_projects,
-            "vector_stores_queried": len(accessible_stores)
-        })
+            "vector_stores_queried": len(accessible_stores),
+            "run_stats": run_stats
+        }
+        if cache_key:
+            # The thread belongs to this user's conversation; a cache hit starts a new one
+            answer_cache.put('alien_gpt', cache_key, dict(result, thread_id=None))
+        
+        return jsonify(result)
     
     except Exception as e:
         print(f"❌ AlienGPT error: {e}")
@@ -183,9 +172,10 @@ def status():
         user_id = g.user.get('id')
         user_role = g.user.get('role')
         
-        # Get accessible projects
-        accessible_projects = access_control.get_user_accessible_projects(user_id, user_role)
-        accessible_stores = access_control.get_accessible_vector_stores(user_id, user_role)
+        # Get accessible projects and stores
+        access = access_control.get_access_snapshot(user_id, user_role)
+        accessible_projects = access['projects']
+        accessible_stores = access['stores']
         
         return jsonify({
             "available": True,
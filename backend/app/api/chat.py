@@ -5,6 +5,8 @@ AlienGPT Chat API - Interactive AI assistant for project queries
 from flask import Blueprint, jsonify, request, g
 from app.api.auth import require_auth, require_role
 from app.core.supabase import db
+from app.services.openai_service import get_openai_client
+from app.services import answer_cache, context_builder, conversation_store, project_snapshot, request_coalescer
 import openai
 import json
 from datetime import datetime, timedelta
@@ -12,76 +14,15 @@ from datetime import datetime, timedelta
 chat_api = Blueprint('chat_api', __name__)
 
 
-def get_openai_client():
-    """Get OpenAI client with API key from settings."""
-    try:
-        result = db.table("app_settings").select("value").eq("key", "OPENAI_API_KEY").execute()
-        if result.data and result.data[0].get('value'):
-            return openai.OpenAI(api_key=result.data[0]['value'])
-    except:
-        pass
-    return None
-
-
-def build_project_context():
-    """Build comprehensive context from all projects - includes ALL fields"""
-    projects = db.table("projects").select("*").execute()
-    
-    context_lines = []
-    for p in projects.data:
-        # Calculate migration progress if checklist exists
-        migration_info = ""
-        if p.get('migration_checklist'):
-            checklist = p['migration_checklist']
-            if isinstance(checklist, dict):
-                total = len(checklist)
-                completed = sum(1 for v in checklist.values() if v)
-                migration_info = f"\n- Migration Progress: {completed}/{total} tasks completed"
-                incomplete = [k for k, v in checklist.items() if not v]
-                if incomplete:
-                    migration_info += f"\n- Pending Migration Tasks: {', '.join(incomplete[:5])}"  # Limit to 5
-        
-        # Format communication methods
-        comm_via = p.get('last_communication_via', [])
-        comm_methods = ', '.join(comm_via) if comm_via else 'N/A'
-        
-        # Build comprehensive project info with ALL fields
-        context_lines.append(f"""
-Project: {p.get('client_name')}
-- Status: {p.get('category', 'Unknown')}
-- PM (Owner): {p.get('owner', 'Unassigned')}
-- Developer: {p.get('developer', 'Unassigned')}
-- Status Notes: {p.get('status_detail', 'No update')}
-- Blocker: {p.get('blocker', 'None')}
-- Last Updated: {p.get('last_updated_at', 'N/A')}
-- Last Contact Date: {p.get('last_contact_date', 'N/A')}
-- Next Call Date: {p.get('next_call', 'N/A')}
-- Last Communication Via: {comm_methods}
-- Launch Date (Internal): {p.get('launch_date_internal', 'N/A')}
-- Launch Date (Public): {p.get('launch_date_public', 'N/A')}
-- Live URL: {p.get('live_url', 'N/A')}
-- Shopify URL: {p.get('shopify_url', 'N/A')}
-- Shopline URL: {p.get('shopline_url', 'N/A')}
-- Shopline Preview Password: {p.get('shopline_preview_pass', 'N/A')}
-- Other URL: {p.get('other_url', 'N/A')}
-- Merchant Name: {p.get('merchant_name', 'N/A')}
-- Merchant Email: {p.get('merchant_email', 'N/A')}
-- Internal Messages Count: {p.get('comm_count_internal', 0)}
-- External Messages Count: {p.get('comm_count_external', 0)}
-- Meetings Count: {p.get('comm_count_meetings', 0)}
-- Slack Channel (Internal): {p.get('channel_id_internal', 'N/A')}
-- Slack Channel (External): {p.get('channel_id_external', 'N/A')}
-- Sync Status: {p.get('sync_status', 'N/A')}
-- Last PM Sync: {p.get('last_sync_pm', 'N/A')}
-- Last Internal Sync: {p.get('last_sync_internal', 'N/A')}
-- Last External Sync: {p.get('last_sync_external', 'N/A')}
-- Last Email Sync: {p.get('last_sync_emails', 'N/A')}{migration_info}
-""")
-    
-    return "\n".join(context_lines)
+def build_project_context(projects, question):
+    """
+    Build a compact table of the projects and fields relevant to the question,
+    kept under the context token budget (no passwords or Slack IDs)
+    """
+    return context_builder.build_project_table(projects, question, cells=project_snapshot.get_cells())
 
 
-def build_communication_context():
+def build_communication_context(projects):
     """Build context from recent communication logs"""
     cutoff = (datetime.now() - timedelta(days=14)).isoformat()
     logs = db.table("communication_logs").select("*")\
@@ -90,12 +31,11 @@ def build_communication_context():
         .limit(50)\
         .execute()
     
+    project_names = {p['id']: p.get('client_name') for p in projects}
+    
     context_lines = []
     for log in logs.data:
-        project_id = log.get('project_id')
-        # Get project name
-        proj = db.table("projects").select("client_name").eq("id", project_id).execute()
-        project_name = proj.data[0]['client_name'] if proj.data else 'Unknown'
+        project_name = project_names.get(log.get('project_id'), 'Unknown')
         
         context_lines.append(f"""
 Communication for {project_name}:
@@ -113,10 +53,15 @@ Communication for {project_name}:
 @require_role('superadmin', 'internal')
 def send_message():
     """
-    Send a message to AlienGPT and get AI response
+    Send a message to AlienGPT and get AI response.
+    The conversation is kept server-side: the first answer returns a
+    conversation_id, pass it with the next message to continue. Requests
+    with a "history" list (older clients) are answered from that history
+    and nothing is stored.
     """
     data = request.json
     user_message = data.get('message', '')
+    conversation_id = data.get('conversation_id')
     conversation_history = data.get('history', [])
     
     if not user_message:
@@ -127,9 +72,31 @@ def send_message():
     if not client:
         return jsonify({"error": "OpenAI API key not configured"}), 400
     
+    # Load the server-side conversation (summary + recent turns); a new one is
+    # created with the first answer
+    conversation = None
+    if conversation_id:
+        try:
+            conversation = conversation_store.get(conversation_id, g.user.get('id'))
+        except Exception as e:
+            # Answering without the earlier turns (or starting a new conversation)
+            # would silently drop the context the client is relying on
+            print(f"[CHAT] Conversation store unavailable: {e}")
+            return jsonify({"error": "Conversation history is temporarily unavailable, please try again"}), 503
+        if not conversation:
+            return jsonify({"error": "Conversation not found"}), 404
+    keep_conversation = 'history' not in data
+    
+    if conversation:
+        history = conversation_store.history_messages(conversation)
+    else:
+        history = [{"role": msg.get("role"), "content": msg.get("content")} for msg in conversation_history[-10:]]
+    
     # Build context
-    project_context = build_project_context()
-    comm_context = build_communication_context()
+    projects = project_snapshot.get_projects()
+    project_context, context_stats = build_project_context(projects, user_message)
+    comm_context = build_communication_context(projects)
+    print(f"[CHAT] Project context: {context_stats['tokens']} tokens for {context_stats['projects_included']}/{context_stats['projects_total']} projects ({context_stats['tokens_saved']} saved)")
     
     system_prompt = f"""You are AlienGPT, an AI assistant for the Alien Portal project management system.
 You have access to comprehensive project data including:
@@ -137,12 +104,13 @@ You have access to comprehensive project data including:
 - Communication history (Slack, email, meetings) with message counts
 - Migration checklists and progress tracking
 - Launch dates (internal and public) and all URLs (Live, Shopify, Shopline, Other)
-- Store credentials (Shopline preview passwords)
 - Merchant information (name, email)
 - Contact dates and scheduled calls
-- Slack channel IDs (internal and external)
 - Sync status and last sync timestamps
-- All project metadata and history
+
+The project data below is a pipe-delimited table (first row is the header).
+It contains the projects relevant to the question; if a project or detail is
+missing, say so rather than guessing.
 
 CRITICAL FORMATTING RULES:
 1. When showing project data, ALWAYS use properly formatted markdown tables
@@ -171,7 +139,7 @@ EXAMPLE RESPONSE FORMAT:
 - Most blockers are client-related
 - Bule needs support with API integration"
 
-Current Project Data:
+Current Project Data ({context_stats['projects_included']} of {context_stats['projects_total']} projects):
 {project_context}
 
 Recent Communications (last 14 days):
@@ -179,36 +147,81 @@ Recent Communications (last 14 days):
 
 Be helpful, professional, and comprehensive. ALWAYS use proper markdown tables for data. When asked about migration or specific project details, include ALL relevant information from the project data."""
     
+    def remember(ai_message):
+        """Store the exchange; returns the conversation fields for the response."""
+        try:
+            if conversation:
+                updated = conversation_store.add_exchange(conversation, user_message, ai_message)
+            elif keep_conversation:
+                updated = conversation_store.create(g.user.get('id'), user_message, ai_message)
+            else:
+                return {}
+            return {"conversation_id": updated['id'], "memory_stats": conversation_store.get_stats(updated)}
+        except Exception as e:
+            print(f"[CHAT] Could not store conversation turn: {e}")
+            return {"conversation_id": conversation['id']} if conversation else {}
+    
+    # Fresh questions (no history) are answered from cache while the data is unchanged
+    cache_key = None
+    if not history:
+        cache_key = answer_cache.make_key(
+            'chat', user_message, g.user.get('role'),
+            answer_cache.fingerprint([project_snapshot.get_version(), comm_context])
+        )
+        cached = answer_cache.get('chat', cache_key)
+        if cached:
+            return jsonify({
+                "success": True,
+                "message": cached['message'],
+                "timestamp": datetime.now().isoformat(),
+                "cached": True,
+                "context_stats": context_stats,
+                **remember(cached['message'])
+            })
+    
     # Build messages
     messages = [{"role": "system", "content": system_prompt}]
     
-    # Add conversation history (limit to last 10 messages)
-    for msg in conversation_history[-10:]:
-        messages.append({
-            "role": msg.get("role"),
-            "content": msg.get("content")
-        })
+    # Add conversation history: rolling summary plus the recent turns
+    messages.extend(history)
     
     # Add current user message
     messages.append({"role": "user", "content": user_message})
     
-    try:
-        print(f"[CHAT] Processing message: {user_message[:50]}...")
-        
+    # Identical questions asked at the same time share one completion
+    coalesce_key = request_coalescer.make_key(
+        'chat',
+        {"message": answer_cache.normalize_question(user_message), "history": messages[1:-1]},
+        g.user.get('role'),
+        [project_snapshot.get_version(), answer_cache.fingerprint(comm_context)]
+    )
+    
+    def complete():
         response = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=messages,
             temperature=0.7,
             max_tokens=2000
         )
+        return {"message": response.choices[0].message.content}
+    
+    try:
+        print(f"[CHAT] Processing message: {user_message[:50]}...")
+        
+        result, coalesced = request_coalescer.run(coalesce_key, complete)
+        ai_message = result['message']
+        print(f"[CHAT] Response {'shared from an identical request' if coalesced else 'generated'} ({len(ai_message)} chars)")
         
-        ai_message = response.choices[0].message.content
-        print(f"[CHAT] Response generated ({len(ai_message)} chars)")
+        if cache_key:
+            answer_cache.put('chat', cache_key, {"message": ai_message})
         
         return jsonify({
             "success": True,
             "message": ai_message,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "coalesced": coalesced,
+            "context_stats": context_stats,
+            **remember(ai_message)
         })
         
     except openai.AuthenticationError as e:
@@ -222,9 +235,24 @@ Be helpful, professional, and comprehensive. ALWAYS use proper markdown tables f
         return jsonify({"error": f"Failed to process message: {str(e)}"}), 500
 
 
+@chat_api.route('/cache/stats', methods=['GET'])
+@require_auth
+@require_role('superadmin', 'internal')
+def get_cache_stats():
+    """Answer cache hit ratios (AlienGPT chat, /api/ai/chat, AlienGPT assistant) and request coalescing counts"""
+    return jsonify(dict(answer_cache.get_stats(), coalescing=request_coalescer.get_stats()))
+
+
 @chat_api.route('/clear', methods=['POST'])
 @require_auth
 @require_role('superadmin', 'internal')
 def clear_conversation():
-    """Clear conversation history"""
+    """Clear conversation history (deletes the server-side conversation if one is given)"""
+    conversation_id = (request.get_json(silent=True) or {}).get('conversation_id')
+    if conversation_id:
+        try:
+            conversation_store.delete(conversation_id, g.user.get('id'))
+        except Exception as e:
+            print(f"[CHAT] Could not delete conversation {conversation_id}: {e}")
+            return jsonify({"error": f"Failed to clear conversation: {str(e)}"}), 500
     return jsonify({"success": True, "message": "Conversation cleared"})
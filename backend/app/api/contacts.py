@@ -4,6 +4,7 @@ Contacts API endpoints
 from flask import Blueprint, request, jsonify
 from app.core.supabase import db
 from app.api.auth import require_auth, require_role
+from app.services import contacts_service
 
 contacts_api = Blueprint('contacts_api', __name__)
 
@@ -11,31 +12,27 @@ contacts_api = Blueprint('contacts_api', __name__)
 @contacts_api.route('/contacts', methods=['GET'])
 @require_auth
 def get_contacts():
-    """Get all contacts with project associations."""
+    """
+    Get contacts with project associations.
+    Supports limit, cursor, q and fields query params for paginated listing;
+    associations are only loaded for the contacts returned.
+    """
     try:
-        # Get all contacts
-        contacts_result = db.table('contacts').select('*').order('name').execute()
-        contacts = contacts_result.data or []
+        args = request.args
+        if not any(k in args for k in ('limit', 'cursor', 'q', 'fields')):
+            contacts_result = db.table('contacts').select(', '.join(contacts_service.CONTACT_FIELDS)).order('name').execute()
+            return jsonify(contacts_service.attach_project_ids(contacts_result.data or []))
         
-        # Get all contact-project associations
-        assoc_result = db.table('contact_projects')\
-            .select('contact_id, project_id')\
-            .execute()
-        associations = assoc_result.data or []
-        
-        # Build a map of contact_id -> [project_ids]
-        contact_projects = {}
-        for assoc in associations:
-            contact_id = assoc['contact_id']
-            if contact_id not in contact_projects:
-                contact_projects[contact_id] = []
-            contact_projects[contact_id].append(assoc['project_id'])
-        
-        # Add project_ids to each contact
-        for contact in contacts:
-            contact['project_ids'] = contact_projects.get(contact['id'], [])
-        
-        return jsonify(contacts)
+        page = contacts_service.list_contacts(
+            limit=args.get('limit', contacts_service.DEFAULT_PAGE_SIZE),
+            cursor=args.get('cursor'),
+            q=args.get('q'),
+            fields=args.get('fields')
+        )
+        contacts_service.attach_project_ids(page['data'])
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching contacts: {e}")
         return jsonify({"error": str(e)}), 500
@@ -10,20 +10,53 @@ from datetime import datetime, timedelta
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from app.core.config import settings
+from app.services import slack_directory, contacts_service
+from app.services.slack_utils import fetch_members_for_channels
+import time
 
 contacts_api = Blueprint('contacts_api', __name__)
 
 
+def classify_contact_role(email: str) -> str:
+    """Categorize a contact by email domain."""
+    email_lower = (email or '').lower()
+    if '@powercommerce.com' in email_lower or '@flyrank.com' in email_lower:
+        return 'Internal'
+    if '@shopline.com' in email_lower:
+        return 'Shopline Team'
+    return 'Merchant'
+
+
 @contacts_api.route('', methods=['GET'])
 @require_auth
 def get_contacts():
     """
-    Get all contacts.
+    Get contacts.
     Accessible by all authenticated users.
+    
+    Query params (any of them switches to a paginated response):
+    - limit: Page size (default 50, max 200)
+    - cursor: next_cursor from the previous page
+    - q: Search over name, email and company
+    - fields: Comma-separated columns to return (id and name always included)
+    
+    Without query params the full list is returned as a plain array.
     """
     try:
-        result = db.table("contacts").select("*").order("name").execute()
-        return jsonify(result.data or [])
+        args = request.args
+        if not any(k in args for k in ('limit', 'cursor', 'q', 'fields')):
+            result = db.table("contacts").select(", ".join(contacts_service.CONTACT_FIELDS)).order("name").execute()
+            return jsonify(result.data or [])
+        
+        page = contacts_service.list_contacts(
+            limit=args.get('limit', contacts_service.DEFAULT_PAGE_SIZE),
+            cursor=args.get('cursor'),
+            q=args.get('q'),
+            fields=args.get('fields')
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -215,97 +248,79 @@ def scan_slack_channels():
     - @powercommerce.com, @flyrank.com -> Internal
     - @shopline.com -> Shopline Team (External)
     - Others -> Merchant (Stakeholders)
+    
+    Channel members are fetched concurrently, profiles come from the cached
+    Slack directory and all contacts are written with a single upsert.
     """
+    timings = {}
+    start_time = time.time()
+    
     try:
-        slack_client = WebClient(token=settings.SLACK_BOT_TOKEN)
-        
-        # Get all projects with Slack channels
+        # Phase 1: Get all projects with Slack channels and their members
+        phase_start = time.time()
         projects_result = db.table("projects").select("id, client_name, channel_id_internal, channel_id_external").execute()
         projects = projects_result.data or []
         
+        channel_ids = []
+        for project in projects:
+            channel_ids.extend([project.get('channel_id_internal'), project.get('channel_id_external')])
+        
         print(f"[SCAN] Scanning {len(projects)} projects for channel members")
         
-        # Collect all unique Slack user IDs from channels
+        members_by_channel = fetch_members_for_channels(channel_ids)
         all_user_ids = set()
+        for member_ids in members_by_channel.values():
+            all_user_ids.update(member_ids)
         
-        for project in projects:
-            # Scan internal channel
-            if project.get('channel_id_internal'):
-                try:
-                    members_response = slack_client.conversations_members(channel=project['channel_id_internal'])
-                    all_user_ids.update(members_response['members'])
-                    print(f"[SCAN] {project['client_name']} internal: {len(members_response['members'])} members")
-                except Exception as e:
-                    print(f"[SCAN] Error scanning internal channel for {project['client_name']}: {e}")
+        timings['channels_ms'] = int((time.time() - phase_start) * 1000)
+        print(f"[SCAN] Found {len(all_user_ids)} unique Slack users across {len(members_by_channel)} channels")
+        
+        # Phase 2: Resolve profiles from the shared directory
+        phase_start = time.time()
+        contacts_by_email = {}
+        skipped_count = 0
+        
+        for user_id in all_user_ids:
+            user = slack_directory.get_user(user_id)
+            
+            # Skip bots, deleted users and users without an email
+            if not user or user['is_bot'] or user['deleted'] or not user['email']:
+                skipped_count += 1
+                continue
             
-            # Scan external channel
-            if project.get('channel_id_external'):
-                try:
-                    members_response = slack_client.conversations_members(channel=project['channel_id_external'])
-                    all_user_ids.update(members_response['members'])
-                    print(f"[SCAN] {project['client_name']} external: {len(members_response['members'])} members")
-                except Exception as e:
-                    print(f"[SCAN] Error scanning external channel for {project['client_name']}: {e}")
+            email = user['email']
+            contacts_by_email[email] = {
+                "name": user['real_name'],
+                "email": email,
+                "role": classify_contact_role(email),
+                "slack_user_id": user_id
+            }
         
-        print(f"[SCAN] Found {len(all_user_ids)} unique Slack users across all channels")
+        timings['profiles_ms'] = int((time.time() - phase_start) * 1000)
         
-        # Get user info for all discovered users
+        # Phase 3: Create or update every discovered contact in one round-trip
+        phase_start = time.time()
         created_count = 0
         updated_count = 0
-        skipped_count = 0
         
-        for user_id in all_user_ids:
-            try:
-                user_info = slack_client.users_info(user=user_id)
-                user = user_info['user']
-                
-                # Skip bots and deleted users
-                if user.get('is_bot') or user.get('deleted'):
-                    skipped_count += 1
-                    continue
-                
-                email = user.get('profile', {}).get('email')
-                name = user.get('real_name') or user.get('name')
-                
-                if not email:
-                    skipped_count += 1
-                    continue
-                
-                # Categorize by email domain
-                email_lower = email.lower()
-                if '@powercommerce.com' in email_lower or '@flyrank.com' in email_lower:
-                    role = 'Internal'
-                elif '@shopline.com' in email_lower:
-                    role = 'Shopline Team'
+        if contacts_by_email:
+            result = db.table("contacts").upsert(
+                list(contacts_by_email.values()),
+                on_conflict="email"
+            ).execute()
+            
+            # Fresh rows get created_at == updated_at from the same statement;
+            # existing rows keep their original created_at
+            for row in result.data or []:
+                if row.get('created_at') == row.get('updated_at'):
+                    created_count += 1
                 else:
-                    role = 'Merchant'
-                
-                # Check if contact already exists
-                existing = db.table("contacts").select("id").eq("email", email).execute()
-                
-                if existing.data:
-                    # Update existing contact
-                    db.table("contacts").update({
-                        "slack_user_id": user_id,
-                        "role": role
-                    }).eq("email", email).execute()
                     updated_count += 1
-                    print(f"[SCAN] Updated: {name} ({email}) -> {role}")
-                else:
-                    # Create new contact
-                    db.table("contacts").insert({
-                        "name": name,
-                        "email": email,
-                        "role": role,
-                        "slack_user_id": user_id,
-                        "notes": "Auto-discovered from Slack channels"
-                    }).execute()
-                    created_count += 1
-                    print(f"[SCAN] Created: {name} ({email}) -> {role}")
-                
-            except Exception as e:
-                print(f"[SCAN] Error processing user {user_id}: {e}")
-                skipped_count += 1
+        
+        timings['upsert_ms'] = int((time.time() - phase_start) * 1000)
+        timings['total_ms'] = int((time.time() - start_time) * 1000)
+        
+        print(f"[SCAN] Created {created_count}, updated {updated_count}, skipped {skipped_count} in {timings['total_ms']}ms")
         
         return jsonify({
             "success": True,
@@ -313,7 +328,8 @@ def scan_slack_channels():
             "created": created_count,
             "updated": updated_count,
             "skipped": skipped_count,
-            "total_users": len(all_user_ids)
+            "total_users": len(all_user_ids),
+            "timings": timings
         })
     except Exception as e:
         print(f"[SCAN] Error: {str(e)}")
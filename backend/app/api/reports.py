@@ -6,6 +6,8 @@ Generates executive reports using OpenAI assistants.
 from flask import Blueprint, jsonify, request, g
 from app.api.auth import require_auth, require_role
 from app.core.supabase import db
+from app.services.openai_service import get_openai_client
+from app.services import project_snapshot, request_coalescer
 import openai
 import json
 import re
@@ -17,17 +19,6 @@ from datetime import datetime, timedelta, timezone
 reports_api = Blueprint('reports_api', __name__)
 
 
-def get_openai_client():
-    """Get OpenAI client with API key from settings."""
-    try:
-        result = db.table("app_settings").select("value").eq("key", "OPENAI_API_KEY").execute()
-        if result.data and result.data[0].get('value'):
-            return openai.OpenAI(api_key=result.data[0]['value'])
-    except:
-        pass
-    return None
-
-
 def generate_report_id():
     """Generate a unique 4-character alphanumeric report ID."""
     max_attempts = 10
@@ -50,9 +41,8 @@ def generate_report_id():
 
 
 def get_project_data():
-    """Fetch all project data for reports."""
-    projects = db.table("projects").select("*").execute()
-    return projects.data
+    """Fetch all project data for reports (from the shared project snapshot)."""
+    return project_snapshot.get_projects()
 
 
 def get_recent_logs(project_id, days=7):
@@ -250,7 +240,20 @@ def generate_report():
         traceback.print_exc()
         return jsonify({"error": f"Failed to prepare report data: {str(e)}"}), 500
     
-    try:
+    # Identical report requests in flight at the same time share one generation
+    coalesce_key = request_coalescer.make_key(
+        'report',
+        {
+            "report_type": report_type,
+            "project_ids": sorted(project_ids or []),
+            "stages": sorted(stages) if stages else None,
+            "excluded_projects": sorted(excluded_projects or [])
+        },
+        g.user.get('role'),
+        project_snapshot.get_version()
+    )
+    
+    def generate():
         # Generate report using OpenAI
         print(f"[REPORTS] Generating {report_type} report for {len(projects)} projects")
         print(f"[REPORTS] Context length: {len(context)} chars")
@@ -294,13 +297,23 @@ def generate_report():
             print(f"[REPORTS] Warning: Failed to save report to database: {db_error}")
             # Continue anyway - don't fail the request if DB save fails
         
+        return {
+            "report_id": report_id,
+            "generated_at": generated_at,
+            "content": report_content
+        }
+    
+    try:
+        report, coalesced = request_coalescer.run(coalesce_key, generate)
+        
         return jsonify({
             "success": True,
-            "report_id": report_id,
+            "report_id": report['report_id'],
             "report_type": report_type,
-            "generated_at": generated_at,
+            "generated_at": report['generated_at'],
             "project_count": len(projects),
-            "content": report_content
+            "content": report['content'],
+            "coalesced": coalesced
         })
         
     except openai.AuthenticationError as e:
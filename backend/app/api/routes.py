@@ -17,6 +17,7 @@ slack_client = WebClient(token=settings.SLACK_BOT_TOKEN)
 # ---------------------------------------------------------
 
 from app.services.slack_utils import resolve_slack_user_name, extract_message_content
+from app.services import project_snapshot
 
 def resolve_slack_user(slack_user_id):
     """
@@ -156,12 +157,13 @@ def map_channel():
         if not res.data:
             # Create new project/partnership
             print(f"   Creating new {'partnership' if is_partnership else 'project'}: {client}")
-            db.table("projects").insert({
+            created = db.table("projects").insert({
                 "client_name": client,
                 field_to_update: c_id,
                 "status_overview": "Initialized via Scanner",
                 "is_partnership": is_partnership
             }).execute()
+            project_ids = [p['id'] for p in created.data or []]
         else:
             # Update existing
             print(f"   Updating existing: {client} -> {field_to_update}={c_id}, is_partnership={is_partnership}")
@@ -169,6 +171,10 @@ def map_channel():
                 field_to_update: c_id,
                 "is_partnership": is_partnership
             }).eq("client_name", client).execute()
+            project_ids = [p['id'] for p in res.data]
+        
+        for project_id in project_ids:
+            project_snapshot.refresh_project(project_id)
             
         return jsonify({"success": True, "message": f"Mapped {c_id} to {client}"})
     except Exception as e:
@@ -255,6 +261,8 @@ def bulk_map_channels():
                     "is_partnership": is_partnership
                 }).eq("client_name", final_name).execute()
         
+        project_snapshot.invalidate_all()
+        
         return jsonify({"success": True, "count": len(channel_ids)})
     except Exception as e:
         print(f"❌ bulk_map_channels error: {e}")
@@ -484,6 +492,7 @@ def update_project_report(project_id):
         # 5. EXECUTE SAVE
         # If this fails, the 'except' block below will print the REAL reason.
         db.table("projects").update(final_payload).eq("id", project_id).execute()
+        project_snapshot.refresh_project(project_id)
         
         # 6. SEND SLACK NOTIFICATION IF REQUESTED
         if send_slack:
@@ -628,6 +637,7 @@ def delete_project(project_id):
     try:
         # Delete project from database
         admin_db.table("projects").delete().eq("id", project_id).execute()
+        project_snapshot.refresh_project(project_id)
         
         return jsonify({"success": True, "message": "Project deleted successfully"})
     except Exception as e:
@@ -692,6 +702,7 @@ def add_project_stakeholder(project_id):
             "role": role,
             "added_by": g.user['id']
         }).execute()
+        project_snapshot.refresh_project(project_id)  # stakeholders feed AlienGPT access
         
         return jsonify(result.data[0]), 201
     except Exception as e:
@@ -708,6 +719,7 @@ def remove_project_stakeholder(project_id, contact_id):
     """
     try:
         db.table("project_stakeholders").delete().eq("project_id", project_id).eq("contact_id", contact_id).execute()
+        project_snapshot.refresh_project(project_id)  # stakeholders feed AlienGPT access
         return jsonify({"success": True, "message": "Stakeholder removed"})
     except Exception as e:
         print(f"Error removing stakeholder: {e}")
@@ -721,54 +733,50 @@ def sync_project_stakeholders(project_id):
     """
     Auto-sync stakeholders from project's Slack channels.
     """
-    from slack_sdk import WebClient
-    from app.core.config import settings
+    from app.services import stakeholder_sync_service
     
     try:
-        slack_client = WebClient(token=settings.SLACK_BOT_TOKEN)
-        
         # Get project channels
-        project = db.table("projects").select("channel_id_internal, channel_id_external").eq("id", project_id).execute()
+        project = db.table("projects").select("id, channel_id_internal, channel_id_external").eq("id", project_id).execute()
         if not project.data:
             return jsonify({"error": "Project not found"}), 404
         
-        project_data = project.data[0]
-        all_user_ids = set()
+        result = stakeholder_sync_service.sync_stakeholders(project.data, added_by=g.user['id'])
         
-        # Get members from both channels
-        for channel_key in ['channel_id_internal', 'channel_id_external']:
-            channel_id = project_data.get(channel_key)
-            if channel_id:
-                try:
-                    members_response = slack_client.conversations_members(channel=channel_id)
-                    all_user_ids.update(members_response['members'])
-                except Exception as e:
-                    print(f"Error fetching channel members: {e}")
+        return jsonify({
+            "success": True,
+            "message": f"Synced {result['added']} stakeholders from channels ({result['skipped']} already linked)",
+            "added": result['added'],
+            "skipped": result['skipped'],
+            "unmatched": result['unmatched']
+        })
+    except Exception as e:
+        print(f"Error syncing stakeholders: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/projects/sync-stakeholders', methods=['POST'])
+@require_auth
+@require_role('superadmin', 'internal')
+def sync_all_project_stakeholders():
+    """
+    Auto-sync stakeholders for every project from their Slack channels.
+    """
+    from app.services import global_sync_service
+    
+    try:
+        user_id = g.user.get('id')
+        user_name = g.user.get('full_name') or g.user.get('email', 'Unknown')
         
-        # Find contacts with these Slack IDs
-        added_count = 0
-        for user_id in all_user_ids:
-            contact = db.table("contacts").select("id").eq("slack_user_id", user_id).execute()
-            if contact.data:
-                contact_id = contact.data[0]['id']
-                # Add to stakeholders (ignore if already exists)
-                try:
-                    db.table("project_stakeholders").insert({
-                        "project_id": project_id,
-                        "contact_id": contact_id,
-                        "added_by": g.user['id']
-                    }).execute()
-                    added_count += 1
-                except:
-                    pass  # Already exists
+        result = global_sync_service.sync_all_stakeholders(user_id, user_name)
         
         return jsonify({
             "success": True,
-            "message": f"Synced {added_count} stakeholders from channels",
-            "added": added_count
+            "message": f"Synced {result['added']} stakeholders across {result['projects']} projects ({result['skipped']} already linked)",
+            **result
         })
     except Exception as e:
-        print(f"Error syncing stakeholders: {e}")
+        print(f"Error syncing all stakeholders: {e}")
         return jsonify({"error": str(e)}), 500
 
 @api.route('/projects/<project_id>/logs', methods=['GET'])
@@ -830,8 +838,11 @@ def get_slack_users():
 def get_channel_members(project_id):
     """
     Fetch members from project's internal/external Slack channels.
+    Served from cached membership snapshots and the shared Slack directory.
     Returns: [{ "name": "Leo", "email": "leo@example.com", "slack_id": "U123" }, ...]
     """
+    from app.services import channel_members, slack_directory
+    
     try:
         # Get project channels
         project = db.table("projects").select("channel_id_internal, channel_id_external").eq("id", project_id).execute()
@@ -841,44 +852,29 @@ def get_channel_members(project_id):
         channel_internal = project.data[0].get("channel_id_internal")
         channel_external = project.data[0].get("channel_id_external")
         
+        snapshots = channel_members.get_members_for_channels([channel_internal, channel_external])
+        
         members = []
         seen_ids = set()
         
-        # Fetch members from both channels
+        # Preserve channel order: internal members first, then external
         for channel_id in [channel_internal, channel_external]:
-            if not channel_id:
-                continue
-            
-            try:
-                response = slack_client.conversations_members(channel=channel_id)
-                member_ids = response.get("members", [])
+            for user_id in sorted(snapshots.get(channel_id, set())):
+                if user_id in seen_ids:
+                    continue
+                seen_ids.add(user_id)
                 
-                for user_id in member_ids:
-                    if user_id in seen_ids:
-                        continue
-                    seen_ids.add(user_id)
-                    
-                    # Get user info
-                    user_info = slack_client.users_info(user=user_id)
-                    user = user_info.get("user", {})
-                    profile = user.get("profile", {})
-                    
-                    # Skip bots
-                    if user.get("is_bot"):
-                        continue
-                    
-                    real_name = user.get("real_name") or profile.get("real_name") or user.get("name") or "Unknown"
-                    email = profile.get("email") or ""
-                    
-                    members.append({
-                        "slack_id": user_id,
-                        "name": real_name,
-                        "email": email
-                    })
-                    
-            except SlackApiError as e:
-                print(f"Error fetching members from {channel_id}: {e}")
-                continue
+                user = slack_directory.get_user(user_id)
+                
+                # Skip bots and unresolvable users
+                if not user or user["is_bot"]:
+                    continue
+                
+                members.append({
+                    "slack_id": user_id,
+                    "name": user["real_name"],
+                    "email": user["email"]
+                })
         
         return jsonify(members)
         
@@ -911,6 +907,7 @@ def create_project():
         
         result = db.table("projects").insert(project_data).execute()
         project_id = result.data[0]['id'] if result.data else None
+        project_snapshot.refresh_project(project_id)
 
         return jsonify({
             "success": True, 
@@ -973,6 +970,7 @@ def create_project():
         
         result = db.table("projects").insert(project_data).execute()
         project_id = result.data[0]['id'] if result.data else None
+        project_snapshot.refresh_project(project_id)
 
         return jsonify({
             "success": True, 
@@ -1003,31 +1001,46 @@ def ai_chat():
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
         
+        # All projects from the shared snapshot (no table scan per question)
+        from app.services import answer_cache, project_query
+        projects = project_snapshot.get_projects()
+        
+        # Counting/listing questions are answered exactly from the snapshot, without the LLM
+        routed = project_query.answer(user_message, projects, project_snapshot.get_version())
+        if routed:
+            return jsonify({
+                "response": routed['response'],
+                "success": True,
+                "routed": True,
+                "intent": routed['intent']
+            })
+        
+        # Same question over an unchanged snapshot -> cached answer
+        user_role = (getattr(g, 'user', None) or {}).get('role')
+        cache_key = answer_cache.make_key('ai_chat', user_message, user_role, project_snapshot.get_version())
+        cached = answer_cache.get('ai_chat', cache_key)
+        if cached:
+            return jsonify({
+                "response": cached['response'],
+                "success": True,
+                "cached": True
+            })
+        
         # Initialize OpenAI client
         client = OpenAI(api_key=settings.OPENAI_API_KEY)
         
-        # Fetch ALL projects with all relevant fields
-        projects = db.table("projects").select("*").execute().data
-        
         # Count projects by owner
         owner_counts = {}
         for p in projects:
             owner = p.get('owner') or 'Unassigned'
             owner_counts[owner] = owner_counts.get(owner, 0) + 1
         
-        # Format all projects as detailed context
-        projects_list = []
-        for p in projects:
-            proj_info = f"- {p['client_name']}: Stage={p.get('category', 'Unknown')}, PM/Owner={p.get('owner') or 'Unassigned'}, Developer={p.get('developer') or 'Unassigned'}"
-            if p.get('status_detail'):
-                proj_info += f", Latest Status: {p['status_detail'][:150]}"
-            if p.get('blocker'):
-                proj_info += f", BLOCKER: {p['blocker']}"
-            if p.get('live_url'):
-                proj_info += f", Live: {p['live_url']}"
-            projects_list.append(proj_info)
-        
-        projects_context = "\n".join(projects_list)
+        # Relevant projects as a compact table under the token budget
+        from app.services import context_builder
+        projects_context, context_stats = context_builder.build_project_table(
+            projects, user_message, cells=project_snapshot.get_cells()
+        )
+        print(f"🤖 AI Chat context: {context_stats['tokens']} tokens for {context_stats['projects_included']}/{context_stats['projects_total']} projects ({context_stats['tokens_saved']} saved)")
         
         # Owner counts summary
         counts_summary = ", ".join([f"{name}: {count} projects" for name, count in owner_counts.items()])
@@ -1045,12 +1058,12 @@ PROJECT COUNTS BY PM/OWNER:
 
 TOTAL PROJECTS: {len(projects)}
 
-ALL PROJECTS (complete list):
+RELEVANT PROJECTS ({context_stats['projects_included']} of {len(projects)}, pipe-delimited, first row is the header):
 {projects_context}
 
 IMPORTANT INSTRUCTIONS:
 1. When asked "how many projects does X have", count ALL projects where owner contains that name (case-insensitive)
-2. List every matching project by name when giving counts
+2. List every matching project by name when giving counts (use the counts above for totals)
 3. Be precise with numbers - count carefully
 4. If a project has a blocker, highlight it
 5. Use the actual data above, don't make up information
@@ -1069,10 +1082,12 @@ Answer concisely and accurately. If you're unsure, say so."""
         )
         
         ai_response = response.choices[0].message.content
+        answer_cache.put('ai_chat', cache_key, {"response": ai_response})
         
         return jsonify({
             "response": ai_response,
-            "success": True
+            "success": True,
+            "context_stats": context_stats
         })
         
     except Exception as e:
@@ -6,9 +6,13 @@ Superadmin-only access to manage API keys and app configuration.
 from flask import Blueprint, jsonify, request, g
 from app.api.auth import require_auth, require_role
 from app.core.supabase import db, admin_db
+from app.services import channel_members, openai_service, project_snapshot
 
 settings_api = Blueprint('settings_api', __name__)
 
+# Rows of app_settings that are bookkeeping, not configuration
+INTERNAL_SETTING_KEYS = ('TEAM_MEMBERS', project_snapshot.VERSION_SETTING_KEY, channel_members.VERSION_SETTING_KEY)
+
 
 @settings_api.route('/', methods=['GET'])
 @require_auth
@@ -24,8 +28,8 @@ def get_all_settings():
         # Process settings - mask ALL values for security
         settings = []
         for s in result.data:
-            # Skip internal settings like TEAM_MEMBERS
-            if s.get('key') == 'TEAM_MEMBERS':
+            # Skip internal settings like TEAM_MEMBERS and the snapshot/membership versions
+            if s.get('key') in INTERNAL_SETTING_KEYS:
                 continue
                 
             # Mask all API-related settings
@@ -122,6 +126,9 @@ def update_setting(key):
                 "updated_at": "now()"
             }).eq("key", key).execute()
         
+        if key == 'OPENAI_API_KEY':
+            openai_service.invalidate_openai_client()
+        
         return jsonify({"success": True, "message": f"Setting '{key}' updated"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -134,6 +141,10 @@ def delete_setting(key):
     """Delete a setting."""
     try:
         admin_db.table("app_settings").delete().eq("key", key).execute()
+        
+        if key == 'OPENAI_API_KEY':
+            openai_service.invalidate_openai_client()
+        
         return jsonify({"success": True, "message": f"Setting '{key}' deleted"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -5,7 +5,7 @@ Handles global sync operations and activity log retrieval.
 """
 from flask import Blueprint, jsonify, request, g
 from app.api.auth import require_auth, require_role
-from app.services import global_sync_service, activity_logger
+from app.services import global_sync_service, activity_logger, vector_store_gc
 
 sync_api = Blueprint('sync_api', __name__)
 
@@ -41,6 +41,34 @@ def global_sync():
         return jsonify({'error': str(e)}), 500
 
 
+@sync_api.route('/sync/gc', methods=['POST'])
+@require_auth
+@require_role('superadmin')
+def vector_store_gc_run():
+    """
+    Garbage-collect superseded vector store files and orphaned stores/assistants.
+    Dry run by default; pass {"dry_run": false} to actually delete, and
+    {"sweep_by_name": true} to also collect unreferenced project-named stores.
+    """
+    try:
+        user_id = g.user.get('id')
+        user_name = g.user.get('full_name') or g.user.get('email', 'Unknown')
+        body = request.get_json(silent=True) or {}
+        dry_run = body.get('dry_run', True) is not False
+        sweep_by_name = body.get('sweep_by_name') is True
+        
+        report = vector_store_gc.run_gc(user_id, user_name, dry_run=dry_run, sweep_by_name=sweep_by_name)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Dry run completed' if dry_run else 'Garbage collection completed',
+            'data': report
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @sync_api.route('/logs', methods=['GET'])
 @require_auth
 @require_role('superadmin')
@@ -249,6 +249,18 @@ def handle_reaction(event):
         }).eq("id", log_entry["id"]).execute()
         print(f"✅ Reaction '{reaction}' recorded")
 
+@bolt_app.event("member_joined_channel")
+def handle_member_joined(event):
+    """Keep cached channel membership snapshots current in every worker."""
+    from app.services import channel_members
+    channel_members.member_joined(event.get("channel"), event.get("user"))
+
+@bolt_app.event("member_left_channel")
+def handle_member_left(event):
+    """Keep cached channel membership snapshots current in every worker."""
+    from app.services import channel_members
+    channel_members.member_left(event.get("channel"), event.get("user"))
+
 # --- FLASK ROUTE ---
 @webhooks.route("/slack/events", methods=["POST"])
 def slack_events():
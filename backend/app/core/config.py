@@ -10,6 +10,21 @@ class Settings:
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") # Required for bypassing RLS
     SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN")
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+    # Local retrieval backend: on-disk index location and embedder ("openai" or "hashing")
+    LOCAL_RETRIEVAL_DIR = os.environ.get("LOCAL_RETRIEVAL_DIR", "data/local_retrieval")
+    LOCAL_RETRIEVAL_EMBEDDER = os.environ.get("LOCAL_RETRIEVAL_EMBEDDER", "openai")
+    # Max tokens of project data placed in AI chat prompts
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+    # Share in-flight AI requests across gunicorn workers (needs migration 030)
+    REQUEST_COALESCING_SHARED = os.environ.get("REQUEST_COALESCING_SHARED", "false").lower() == "true"
+    # Initialize new projects with one source-tagged vector store instead of 4 stores + 4 assistants (needs migration 031)
+    AI_CONSOLIDATED_LAYOUT = os.environ.get("AI_CONSOLIDATED_LAYOUT", "false").lower() == "true"
+    # Initialize and sync a project's AI knowledge on its first chat instead of in global sync
+    AI_LAZY_INIT = os.environ.get("AI_LAZY_INIT", "false").lower() == "true"
+    # Chats on a project whose knowledge is older than this trigger a background incremental sync
+    AI_FRESHNESS_SLA_MINUTES = int(os.environ.get("AI_FRESHNESS_SLA_MINUTES", "60"))
+    # In lazy mode, global sync only refreshes projects chatted with this recently (needs migration 033)
+    AI_ACTIVE_WINDOW_DAYS = int(os.environ.get("AI_ACTIVE_WINDOW_DAYS", "7"))
 
 # This is the variable your app is looking for:
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,206 @@
+# backend/app/services/ai_warmup.py
+"""
+Lazy, on-demand AI initialization and sync (AI_LAZY_INIT).
+
+A project's AI resources are created and filled by its first chat, in the
+background, while the chat answers "warming up". After that, a chat on a
+project whose last sync is older than AI_FRESHNESS_SLA_MINUTES is served
+right away and triggers an incremental sync in the background. Chats stamp
+last_ai_chat_at (migration 033); global sync only refreshes projects with a
+chat in the last AI_ACTIVE_WINDOW_DAYS (see sync_skip_reason).
+
+Warm-ups are deduplicated per worker and, through a row in the
+inflight_requests table (migration 030), across workers.
+"""
+from app.core.config import settings
+from app.core.supabase import db, admin_db
+from app.services import project_ai
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+import threading
+
+# Background warm-ups running at once per worker
+WARMUP_MAX_WORKERS = 4
+
+# A warm-up lock older than this is presumed dead and can be taken over
+WARMUP_TIMEOUT_SECONDS = 15 * 60
+
+# Suggested client retry delay while a project warms up
+WARMUP_RETRY_AFTER_SECONDS = 30
+
+# last_ai_chat_at is rewritten at most this often per project
+CHAT_STAMP_INTERVAL = timedelta(minutes=10)
+
+_lock = threading.Lock()
+_running: set = set()  # project IDs warming up in this worker
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lock_key(project_id: str) -> str:
+    return f"ai_warmup:{project_id}"
+
+
+def _parse_stamp(value) -> Optional[datetime]:
+    """A timestamp column as an aware datetime (naive stamps are taken as UTC)."""
+    if not value:
+        return None
+    try:
+        stamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return stamp if stamp.tzinfo else stamp.replace(tzinfo=timezone.utc)
+
+
+def _last_sync(project: Dict) -> Optional[datetime]:
+    """Oldest of the project's sync stamps."""
+    stamps = [_parse_stamp(project.get(column)) for column in ('last_sync_internal', 'last_sync_external')]
+    if None in stamps:
+        return None
+    return min(stamps)
+
+
+def is_ready(project: Dict) -> bool:
+    """Usable for chat and synced at least once."""
+    return project_ai.is_usable(project) and _last_sync(project) is not None
+
+
+def is_stale(project: Dict) -> bool:
+    last_sync = _last_sync(project)
+    return last_sync is None or _now() - last_sync > timedelta(minutes=settings.AI_FRESHNESS_SLA_MINUTES)
+
+
+def is_active(project: Dict) -> bool:
+    """Chatted with in the last AI_ACTIVE_WINDOW_DAYS."""
+    last_chat = _parse_stamp(project.get('last_ai_chat_at'))
+    return last_chat is not None and _now() - last_chat <= timedelta(days=settings.AI_ACTIVE_WINDOW_DAYS)
+
+
+def sync_skip_reason(project: Dict) -> Optional[str]:
+    """
+    Why lazy-mode global sync leaves a project alone (None: sync it).
+    Only projects in use and behind the freshness SLA are synced; chats
+    keep the others fresh on demand.
+    """
+    if not project_ai.is_usable(project):
+        return "AI not initialized yet (lazy mode)"
+    if not is_active(project):
+        return f"no AI chat in the last {settings.AI_ACTIVE_WINDOW_DAYS} days (lazy mode)"
+    if not is_stale(project):
+        return "knowledge is within the freshness SLA (lazy mode)"
+    return None
+
+
+def _record_chat(project: Dict) -> None:
+    """Stamp last_ai_chat_at, at most every CHAT_STAMP_INTERVAL."""
+    last_chat = _parse_stamp(project.get('last_ai_chat_at'))
+    if last_chat and _now() - last_chat < CHAT_STAMP_INTERVAL:
+        return
+    try:
+        db.table("projects").update({"last_ai_chat_at": _now().isoformat()}).eq("id", project['id']).execute()
+    except Exception as e:
+        print(f"⚠️ Could not record AI chat for {project['id']}: {e}")
+
+
+def is_warming(project_id: str) -> bool:
+    """Whether this worker is warming the project up."""
+    with _lock:
+        return project_id in _running
+
+
+def _acquire_shared(project_id: str) -> bool:
+    """Cross-worker lock row; if the table is unavailable, fall back to the per-worker guard."""
+    key = _lock_key(project_id)
+    try:
+        admin_db.table("inflight_requests").delete().eq("key", key).lt("expires_at", _now().isoformat()).execute()
+        admin_db.table("inflight_requests").insert({
+            "key": key,
+            "status": "running",
+            "expires_at": (_now() + timedelta(seconds=WARMUP_TIMEOUT_SECONDS)).isoformat()
+        }).execute()
+        return True
+    except Exception:
+        pass
+    try:
+        return not admin_db.table("inflight_requests").select("key").eq("key", key).execute().data
+    except Exception as e:
+        print(f"⚠️ Warm-up lock unavailable for {project_id}: {e}")
+        return True
+
+
+def _release_shared(project_id: str) -> None:
+    try:
+        admin_db.table("inflight_requests").delete().eq("key", _lock_key(project_id)).execute()
+    except Exception as e:
+        print(f"⚠️ Could not release warm-up lock for {project_id}: {e}")
+
+
+def _warm_up(project_id: str) -> None:
+    try:
+        if not _acquire_shared(project_id):
+            return  # another worker is on it
+        try:
+            project = db.table("projects").select("*").eq("id", project_id).execute().data
+            if not project:
+                return
+            project = project[0]
+            # Re-check: another worker may have finished just before we got the lock
+            if project_ai.is_initialized(project) and is_ready(project) and not is_stale(project):
+                return
+
+            print(f"🔥 Warming up AI for {project.get('client_name')}")
+            db.table("projects").update({"sync_status": "syncing"}).eq("id", project_id).execute()
+            if not project_ai.is_initialized(project):
+                project.update(project_ai.initialize_project(project))
+            counts, uploaded = project_ai.sync_knowledge(project)
+            print(f"✅ AI ready for {project.get('client_name')}: {sum(len(f) for f in uploaded.values())} shard(s) uploaded")
+        except Exception as e:
+            print(f"❌ AI warm-up failed for {project_id}: {e}")
+            db.table("projects").update({"sync_status": "error"}).eq("id", project_id).execute()
+        finally:
+            _release_shared(project_id)
+    finally:
+        with _lock:
+            _running.discard(project_id)
+
+
+def schedule(project_id: str) -> bool:
+    """
+    Start a background warm-up (initialize if needed, then sync) unless one
+    is already running in this worker.
+
+    Returns:
+        True if a warm-up was started
+    """
+    global _executor
+    with _lock:
+        if project_id in _running:
+            return False
+        _running.add(project_id)
+        if _executor is None:
+            # Created on first use, after gunicorn has forked the worker
+            _executor = ThreadPoolExecutor(max_workers=WARMUP_MAX_WORKERS, thread_name_prefix="ai-warmup")
+    _executor.submit(_warm_up, project_id)
+    return True
+
+
+def ensure_ready(project: Dict) -> bool:
+    """
+    Check a project before a chat and schedule background work as needed.
+
+    Returns:
+        True if the chat can be answered now (possibly from slightly stale
+        knowledge while a refresh runs), False while the project warms up
+    """
+    _record_chat(project)
+    if not is_ready(project):
+        schedule(project['id'])
+        return False
+    if is_stale(project) or not project_ai.is_initialized(project):
+        # Refresh, or complete a project that predates the PM and email resources
+        schedule(project['id'])
+    return True
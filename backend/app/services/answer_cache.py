@@ -0,0 +1,111 @@
+# backend/app/services/answer_cache.py
+"""
+In-process cache for AI answers to repeated questions.
+Entries are keyed by endpoint, normalized question, user role and a
+fingerprint of the data the answer was generated from, so any change to
+that data produces a new key and stale answers are never served.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional
+import hashlib
+import json
+import re
+import threading
+import time
+
+# Answers are reused for at most this long even if the data is unchanged
+ANSWER_CACHE_TTL_SECONDS = 10 * 60
+
+# Least recently used answers are evicted beyond this many entries
+ANSWER_CACHE_MAX_ENTRIES = 500
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, Dict]" = OrderedDict()  # key -> {"value", "expires_at", "namespace"}
+_stats: Dict[str, Dict[str, int]] = {}  # namespace -> {"hits", "misses"}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    question = re.sub(r'\s+', ' ', (question or '').strip().lower())
+    return question.rstrip('?!. ')
+
+
+def fingerprint(data) -> str:
+    """Stable hash of any JSON-serializable data (rows, prompt context, IDs)."""
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def make_key(namespace: str, question: str, role: str, data_fingerprint: str) -> str:
+    return fingerprint([namespace, normalize_question(question), role or '', data_fingerprint])
+
+
+def _count(namespace: str, field: str) -> None:
+    _stats.setdefault(namespace, {'hits': 0, 'misses': 0})[field] += 1
+
+
+def get(namespace: str, key: str) -> Optional[Dict]:
+    """
+    Look up a cached answer.
+
+    Returns:
+        The cached value, or None on a miss or expired entry
+    """
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry['expires_at'] > time.time():
+            _entries.move_to_end(key)
+            _count(namespace, 'hits')
+            return entry['value']
+
+        if entry:
+            del _entries[key]
+        _count(namespace, 'misses')
+        return None
+
+
+def put(namespace: str, key: str, value: Dict) -> None:
+    """Store an answer, evicting the least recently used entries if full."""
+    with _lock:
+        _entries[key] = {
+            'value': value,
+            'expires_at': time.time() + ANSWER_CACHE_TTL_SECONDS,
+            'namespace': namespace
+        }
+        _entries.move_to_end(key)
+        while len(_entries) > ANSWER_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def clear() -> None:
+    """Drop every cached answer (statistics are kept)."""
+    with _lock:
+        _entries.clear()
+
+
+def get_stats() -> Dict:
+    """Hit/miss counts and hit ratio per endpoint and overall."""
+    with _lock:
+        namespaces = {}
+        total_hits = total_misses = 0
+        for namespace, counts in _stats.items():
+            lookups = counts['hits'] + counts['misses']
+            namespaces[namespace] = {
+                'hits': counts['hits'],
+                'misses': counts['misses'],
+                'hit_ratio': round(counts['hits'] / lookups, 3) if lookups else 0.0,
+                'entries': sum(1 for e in _entries.values() if e['namespace'] == namespace)
+            }
+            total_hits += counts['hits']
+            total_misses += counts['misses']
+
+        lookups = total_hits + total_misses
+        return {
+            'entries': len(_entries),
+            'max_entries': ANSWER_CACHE_MAX_ENTRIES,
+            'ttl_seconds': ANSWER_CACHE_TTL_SECONDS,
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_ratio': round(total_hits / lookups, 3) if lookups else 0.0,
+            'namespaces': namespaces
+        }
@@ -0,0 +1,245 @@
+# backend/app/services/assistant_registry.py
+"""
+Registry of shared OpenAI assistants persisted in app_settings.
+Each entry stores the assistant ID together with a hash of its
+configuration, so every gunicorn worker reuses the same assistant, and a
+changed configuration updates it in place instead of creating a new one.
+"""
+from app.core.supabase import admin_db
+from app.services import openai_service
+from typing import Callable, Dict, List, Optional, TypeVar
+from datetime import datetime, timezone
+import hashlib
+import json
+import openai
+import threading
+import time
+
+# A creation lock older than this is assumed abandoned by a crashed worker
+LOCK_STALE_SECONDS = 60
+
+# How long a worker waits for another worker's create/update to finish
+LOCK_WAIT_SECONDS = 30
+LOCK_POLL_SECONDS = 0.5
+
+# Marks registry rows in app_settings (see get_registered_assistants)
+REGISTRY_DESCRIPTION_PREFIX = "Registered assistant:"
+
+_lock = threading.Lock()
+_assistants: Dict[str, Dict] = {}  # registry key -> {"assistant_id", "config_hash"}
+
+T = TypeVar('T')
+
+
+def config_hash(name: str, instructions: str, model: str, tools: List[Dict]) -> str:
+    """Version of an assistant configuration."""
+    payload = json.dumps([name, instructions, model, tools], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _read_entry(key: str) -> Optional[Dict]:
+    result = admin_db.table("app_settings").select("value").eq("key", key).execute()
+    if not result.data or not result.data[0].get('value'):
+        return None
+    try:
+        return json.loads(result.data[0]['value'])
+    except (TypeError, ValueError):
+        return None
+
+
+def _write_entry(key: str, entry: Dict, description: str) -> None:
+    admin_db.table("app_settings").upsert({
+        "key": key,
+        "value": json.dumps(entry),
+        "is_secret": False,
+        "description": description
+    }, on_conflict="key").execute()
+
+
+def _acquire_lock(key: str) -> bool:
+    """
+    Take the cross-worker lock row for a registry key.
+    Relies on app_settings.key being unique: only one insert can succeed.
+    """
+    lock_key = f"{key}_LOCK"
+    try:
+        admin_db.table("app_settings").insert({
+            "key": lock_key,
+            "value": datetime.now(timezone.utc).isoformat(),
+            "is_secret": False,
+            "description": "Assistant registry lock (internal)"
+        }).execute()
+        return True
+    except Exception:
+        pass
+
+    # Break locks left behind by a worker that died mid-create
+    result = admin_db.table("app_settings").select("value").eq("key", lock_key).execute()
+    if result.data:
+        try:
+            held_since = datetime.fromisoformat(result.data[0]['value'])
+            if (datetime.now(timezone.utc) - held_since).total_seconds() > LOCK_STALE_SECONDS:
+                admin_db.table("app_settings").delete().eq("key", lock_key).eq("value", result.data[0]['value']).execute()
+        except (TypeError, ValueError):
+            admin_db.table("app_settings").delete().eq("key", lock_key).execute()
+    return False
+
+
+def _release_lock(key: str) -> None:
+    admin_db.table("app_settings").delete().eq("key", f"{key}_LOCK").execute()
+
+
+def _create_or_update(client, existing: Optional[Dict], name: str, instructions: str, model: str, tools: List[Dict]) -> str:
+    if existing and existing.get('assistant_id'):
+        try:
+            client.beta.assistants.update(
+                existing['assistant_id'],
+                name=name,
+                instructions=instructions,
+                model=model,
+                tools=tools
+            )
+            print(f"♻️ Updated assistant {existing['assistant_id']} ({name})")
+            return existing['assistant_id']
+        except openai.NotFoundError:
+            # Deleted on the OpenAI side: fall through and create a new one. Any
+            # other error (rate limit, 5xx, network) is raised, since creating
+            # a replacement for an assistant that still exists would leak it
+            print(f"⚠️ Assistant {existing['assistant_id']} no longer exists, creating a new one")
+
+    assistant = client.beta.assistants.create(
+        name=name,
+        instructions=instructions,
+        model=model,
+        tools=tools
+    )
+    print(f"✅ Created assistant {assistant.id} ({name})")
+    return assistant.id
+
+
+def ensure_assistant(key: str, name: str, instructions: str, model: str, tools: List[Dict]) -> str:
+    """
+    Get the assistant registered under key, creating or updating it as needed.
+
+    Fast path is an in-process lookup; a cold worker does one app_settings
+    read. Only when the assistant is missing or its configuration changed
+    does one worker (holding the lock row) call OpenAI while the others wait
+    for the registry entry to appear.
+
+    Args:
+        key: app_settings key of the registry entry (e.g. ALIEN_GPT_ASSISTANT)
+        name, instructions, model, tools: Desired assistant configuration
+
+    Returns:
+        Assistant ID
+    """
+    wanted = config_hash(name, instructions, model, tools)
+
+    cached = _assistants.get(key)
+    if cached and cached['config_hash'] == wanted:
+        return cached['assistant_id']
+
+    with _lock:
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while True:
+            entry = _read_entry(key)
+            if entry and entry.get('config_hash') == wanted:
+                _assistants[key] = entry
+                return entry['assistant_id']
+
+            if _acquire_lock(key):
+                break
+            if time.monotonic() >= deadline:
+                raise Exception(f"Timed out waiting for another worker to provision {name}")
+            time.sleep(LOCK_POLL_SECONDS)
+
+        try:
+            # Another worker may have finished while we were acquiring the lock
+            entry = _read_entry(key)
+            if not entry or entry.get('config_hash') != wanted:
+                client = openai_service.get_openai_client()
+                if not client:
+                    raise Exception("OpenAI client not configured - check API key in settings")
+                assistant_id = _create_or_update(client, entry, name, instructions, model, tools)
+                entry = {
+                    "assistant_id": assistant_id,
+                    "name": name,
+                    "config_hash": wanted,
+                    "updated_at": datetime.now(timezone.utc).isoformat()
+                }
+                _write_entry(key, entry, f"{REGISTRY_DESCRIPTION_PREFIX} {name} (internal)")
+        finally:
+            _release_lock(key)
+
+        _assistants[key] = entry
+        return entry['assistant_id']
+
+
+def forget(key: str, assistant_id: str) -> None:
+    """
+    Drop a registered assistant that no longer exists upstream, in this
+    worker and in the registry (only if the entry still points at it), so
+    the next ensure_assistant() creates a new one.
+    """
+    with _lock:
+        cached = _assistants.get(key)
+        if cached and cached.get('assistant_id') == assistant_id:
+            _assistants.pop(key, None)
+
+    result = admin_db.table("app_settings").select("value").eq("key", key).execute()
+    if not result.data:
+        return
+    raw = result.data[0]['value']
+    try:
+        entry = json.loads(raw)
+    except (TypeError, ValueError):
+        return
+    if entry.get('assistant_id') == assistant_id:
+        # Conditional on the value, so a replacement another worker just wrote survives
+        admin_db.table("app_settings").delete().eq("key", key).eq("value", raw).execute()
+        print(f"🗑️ Forgot deleted assistant {assistant_id} ({key})")
+
+
+def call_with_assistant(key: str, resolve: Callable[[], str], fn: Callable[[str], T]) -> T:
+    """
+    Call fn with the registered assistant's ID. If OpenAI reports that the
+    assistant no longer exists (e.g. deleted by the garbage collector),
+    forget it, resolve again (which recreates it) and retry once.
+
+    Args:
+        key: Registry key of the assistant
+        resolve: Returns the assistant ID (normally a wrapper around ensure_assistant)
+        fn: The call to make with the assistant ID
+    """
+    assistant_id = resolve()
+    try:
+        return fn(assistant_id)
+    except openai.NotFoundError as e:
+        # A missing thread is the caller's problem; only a missing assistant is ours
+        if assistant_id not in str(e):
+            raise
+        forget(key, assistant_id)
+        return fn(resolve())
+
+
+def get_registered_assistants() -> List[Dict]:
+    """All registry entries (used by the garbage collector to spot leaked duplicates)."""
+    result = admin_db.table("app_settings").select("value").like(
+        "description", f"{REGISTRY_DESCRIPTION_PREFIX}%"
+    ).execute()
+    entries = []
+    for row in result.data or []:
+        try:
+            entries.append(json.loads(row['value']))
+        except (TypeError, ValueError):
+            continue
+    return entries
+
+
+def invalidate(key: str = None) -> None:
+    """Drop the in-process copy of one entry (or all), forcing a registry read."""
+    with _lock:
+        if key:
+            _assistants.pop(key, None)
+        else:
+            _assistants.clear()
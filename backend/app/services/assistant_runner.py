@@ -0,0 +1,202 @@
+# backend/app/services/assistant_runner.py
+"""
+Asyncio runner for OpenAI assistant conversations.
+One background event loop per worker drives every thread/run lifecycle
+with the async OpenAI client, so waiting on a run costs a coroutine
+instead of a blocked thread. Flask views call the synchronous facade
+run_assistant(), which blocks only the calling request thread.
+"""
+from openai import AsyncOpenAI
+from app.services import openai_service
+from app.services.openai_service import (
+    AssistantRunError,
+    RUN_POLL_INITIAL_SECONDS,
+    RUN_POLL_MAX_SECONDS,
+    RUN_POLL_BACKOFF,
+    RUN_DEADLINE_SECONDS
+)
+from typing import Dict, Optional
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+# Runs driven at once per worker; further requests queue on the semaphore
+MAX_CONCURRENT_RUNS = 64
+
+# Extra wait over the run deadline before the caller gives up on the loop
+RESULT_MARGIN_SECONDS = 20
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_start_lock = threading.Lock()
+_clients: Dict[str, AsyncOpenAI] = {}  # API key hash -> async client (used on the loop only)
+
+
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    """Start the worker's event loop thread on first use (after gunicorn forks)."""
+    global _loop, _semaphore
+    with _start_lock:
+        if _loop is None or not _loop.is_running():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            threading.Thread(target=run_loop, name="assistant-runner", daemon=True).start()
+            ready.wait()
+            _semaphore = asyncio.run_coroutine_threadsafe(_make_semaphore(), loop).result()
+            _loop = loop
+        return _loop
+
+
+async def _make_semaphore() -> asyncio.Semaphore:
+    return asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+
+
+def _async_client(api_key: str) -> AsyncOpenAI:
+    """Async client for the current API key; a rotated key replaces it (called on the loop)."""
+    key_hash = openai_service._key_hash(api_key)
+    if key_hash not in _clients:
+        _clients.clear()
+        _clients[key_hash] = AsyncOpenAI(api_key=api_key)
+    return _clients[key_hash]
+
+
+async def _cancel(client: AsyncOpenAI, thread_id: str, run_id: str) -> None:
+    try:
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as e:
+        print(f"⚠️ Could not cancel run {run_id}: {e}")
+
+
+async def _run(client: AsyncOpenAI, assistant_id: str, thread_id: Optional[str], message: str,
+               deadline_seconds: float, start_time: float) -> Dict:
+    poll_count = 0
+    run = None
+
+    def stats(status):
+        return {
+            "status": status,
+            "poll_count": poll_count,
+            "wait_ms": int((time.time() - start_time) * 1000)
+        }
+
+    def timeout_error():
+        return AssistantRunError(
+            f"Assistant run timed out after {deadline_seconds}s",
+            status="timeout",
+            stats=stats("timeout")
+        )
+
+    # Time spent queued for a slot counts toward the deadline
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), deadline_seconds - (time.time() - start_time))
+    except asyncio.TimeoutError:
+        raise timeout_error()
+
+    try:
+        # One request starts the run: a new thread with the message, or the
+        # message appended to an existing thread
+        if thread_id:
+            run = await client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                additional_messages=[{"role": "user", "content": message}]
+            )
+        else:
+            run = await client.beta.threads.create_and_run(
+                assistant_id=assistant_id,
+                thread={"messages": [{"role": "user", "content": message}]}
+            )
+            thread_id = run.thread_id
+
+        # Poll with backoff; sleeping here yields the loop to other runs
+        delay = RUN_POLL_INITIAL_SECONDS
+        while run.status in ['queued', 'in_progress', 'cancelling']:
+            remaining = deadline_seconds - (time.time() - start_time)
+            if remaining <= 0:
+                await _cancel(client, thread_id, run.id)
+                raise timeout_error()
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * RUN_POLL_BACKOFF, RUN_POLL_MAX_SECONDS)
+            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+            poll_count += 1
+
+        if run.status == 'requires_action':
+            # Our assistants only use file_search, so there is no tool output to submit
+            await _cancel(client, thread_id, run.id)
+            raise AssistantRunError(
+                "Assistant run requested a tool call that is not supported",
+                status="requires_action",
+                stats=stats("requires_action")
+            )
+
+        if run.status != 'completed':
+            # failed, expired, cancelled, incomplete
+            detail = getattr(run, 'last_error', None) or getattr(run, 'incomplete_details', None)
+            error = f"Assistant run {run.status}"
+            if detail:
+                error += f": {getattr(detail, 'message', None) or getattr(detail, 'reason', None) or detail}"
+            raise AssistantRunError(error, status=run.status, stats=stats(run.status))
+
+        # Get the response produced by this run
+        messages = await client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id)
+        return {
+            "thread_id": thread_id,
+            "response": messages.data[0].content[0].text.value,
+            "run_stats": stats("completed")
+        }
+    except asyncio.CancelledError:
+        # The caller gave up (see run_assistant): stop the run upstream too
+        if run is not None and run.status in ['queued', 'in_progress']:
+            await _cancel(client, thread_id, run.id)
+        raise
+    finally:
+        _semaphore.release()
+
+
+def run_assistant(assistant_id: str, thread_id: Optional[str], message: str,
+                  deadline_seconds: float = RUN_DEADLINE_SECONDS) -> Dict:
+    """
+    Run one assistant turn on the shared event loop and wait for the result.
+
+    Args:
+        assistant_id: Assistant ID
+        thread_id: Existing thread ID (None to start a new thread)
+        message: User message
+        deadline_seconds: Hard limit on the run's wait time, including time
+            queued for a slot
+
+    Returns:
+        Dict with thread_id, response and run_stats
+
+    Raises:
+        AssistantRunError: If the run does not complete (see openai_service)
+    """
+    start_time = time.time()
+    # Key lookup may hit the database, so it happens here rather than on the loop
+    client = openai_service.get_openai_client()
+    if not client:
+        raise Exception("OpenAI client not configured - check API key in settings")
+    api_key = client.api_key
+    loop = _ensure_loop()
+
+    async def start():
+        return await _run(_async_client(api_key), assistant_id, thread_id, message, deadline_seconds, start_time)
+
+    future = asyncio.run_coroutine_threadsafe(start(), loop)
+    try:
+        # Margin over the run deadline for the create/list round-trips
+        return future.result(timeout=deadline_seconds + RESULT_MARGIN_SECONDS - (time.time() - start_time))
+    except concurrent.futures.TimeoutError:
+        # Cancels the coroutine, which cancels the run upstream
+        future.cancel()
+        raise AssistantRunError(
+            f"Assistant run timed out after {deadline_seconds}s",
+            status="timeout",
+            stats={"status": "timeout", "poll_count": None, "wait_ms": int((time.time() - start_time) * 1000)}
+        )
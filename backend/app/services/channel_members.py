@@ -0,0 +1,192 @@
+# backend/app/services/channel_members.py
+"""
+In-memory Slack channel membership snapshots.
+Each channel's member list is fetched once, kept for a TTL and patched
+incrementally from member_joined_channel / member_left_channel events.
+
+Slack delivers each event to one gunicorn worker. That worker patches its
+own snapshot and appends the channel to a change log in app_settings
+(CHANNEL_MEMBERS_VERSION); the other workers poll that key every few
+seconds and drop their snapshots of the changed channels, which are
+fetched again on the next read.
+"""
+from app.core.supabase import db
+from app.services.slack_utils import fetch_members_for_channels
+from typing import Dict, Iterable, Optional, Set, Tuple
+import json
+import threading
+import time
+
+VERSION_SETTING_KEY = "CHANNEL_MEMBERS_VERSION"
+
+# Full refresh interval, a safety net for missed events
+CHANNEL_MEMBERS_TTL_SECONDS = 15 * 60
+
+# How often a worker checks the shared version for events received elsewhere
+CHANNEL_MEMBERS_POLL_SECONDS = 5
+
+# Change log entries kept in app_settings; workers further behind drop every snapshot
+CHANGE_LOG_SIZE = 100
+
+# Compare-and-swap attempts when workers publish at the same time
+PUBLISH_RETRIES = 5
+
+_lock = threading.Lock()
+_snapshots: Dict[str, Dict] = {}  # channel_id -> {"members": set, "fetched_at": float}
+_version: Optional[int] = None  # shared version this worker has caught up to
+_checked_at = 0.0
+
+
+def _read_shared_value() -> Tuple[Optional[str], Dict]:
+    """The raw app_settings value (None if the row is missing) and its parsed state."""
+    result = db.table("app_settings").select("value").eq("key", VERSION_SETTING_KEY).execute()
+    if not result.data:
+        return None, {"version": 0, "changes": []}
+    raw = result.data[0]['value']
+    try:
+        return raw, json.loads(raw)
+    except (TypeError, ValueError):
+        return raw, {"version": 0, "changes": []}
+
+
+def _publish(channel_id: str) -> int:
+    """
+    Append a changed channel to the shared log, with compare-and-swap on the
+    value (see project_snapshot._publish) so concurrent events aren't lost.
+
+    Returns:
+        The new version
+    """
+    for _ in range(PUBLISH_RETRIES):
+        raw, shared = _read_shared_value()
+        version = shared['version'] + 1
+        value = json.dumps({
+            "version": version,
+            "changes": (shared.get('changes', []) + [{"version": version, "channel_id": channel_id}])[-CHANGE_LOG_SIZE:]
+        })
+
+        if raw is None:
+            try:
+                db.table("app_settings").insert({
+                    "key": VERSION_SETTING_KEY,
+                    "value": value,
+                    "is_secret": False,
+                    "description": "Slack channel membership version (internal)"
+                }).execute()
+                return version
+            except Exception:
+                continue  # another worker created the row first
+
+        result = db.table("app_settings").update({"value": value})\
+            .eq("key", VERSION_SETTING_KEY).eq("value", raw).execute()
+        if result.data:
+            return version
+
+    raise Exception(f"Could not publish channel membership version after {PUBLISH_RETRIES} attempts")
+
+
+def _catch_up() -> None:
+    """
+    Drop snapshots of channels whose membership changed in another worker.
+    The app_settings read happens outside _lock; on failure the TTL still
+    bounds staleness.
+    """
+    global _version, _checked_at
+    with _lock:
+        now = time.time()
+        if now - _checked_at < CHANNEL_MEMBERS_POLL_SECONDS:
+            return
+        _checked_at = now
+        since = _version
+
+    try:
+        shared = _read_shared_value()[1]
+    except Exception as e:
+        print(f"⚠️ Could not read channel membership version: {e}")
+        return
+
+    with _lock:
+        if _version != since or shared['version'] == since:
+            return
+        if since is not None:
+            changes = [c for c in shared.get('changes', []) if c['version'] > since]
+            oldest = min((c['version'] for c in shared.get('changes', [])), default=shared['version'])
+            if shared['version'] < since or oldest > since + 1:
+                _snapshots.clear()  # fell behind the change log
+            else:
+                for change in changes:
+                    _snapshots.pop(change['channel_id'], None)
+        _version = shared['version']
+
+
+def get_members_for_channels(channel_ids: Iterable[str]) -> Dict[str, Set[str]]:
+    """
+    Get member IDs for several channels, refreshing only missing or stale snapshots.
+
+    Args:
+        channel_ids: Slack channel IDs
+
+    Returns:
+        Dict of channel_id -> set of member IDs (channels that failed to load are omitted)
+    """
+    channel_ids = [c for c in dict.fromkeys(channel_ids) if c]
+    _catch_up()
+    now = time.time()
+
+    with _lock:
+        stale = [
+            c for c in channel_ids
+            if c not in _snapshots or now - _snapshots[c]["fetched_at"] >= CHANNEL_MEMBERS_TTL_SECONDS
+        ]
+
+    if stale:
+        fetched = fetch_members_for_channels(stale)
+        with _lock:
+            for channel_id, member_ids in fetched.items():
+                _snapshots[channel_id] = {"members": set(member_ids), "fetched_at": time.time()}
+
+    with _lock:
+        return {c: set(_snapshots[c]["members"]) for c in channel_ids if c in _snapshots}
+
+
+def get_channel_member_ids(channel_id: str) -> Set[str]:
+    """Get member IDs for a single channel from its snapshot."""
+    return get_members_for_channels([channel_id]).get(channel_id, set())
+
+
+def _apply_event(channel_id: str, user_id: str, joined: bool) -> None:
+    global _version
+    with _lock:
+        snapshot = _snapshots.get(channel_id)
+        if snapshot is not None:
+            if joined:
+                snapshot["members"].add(user_id)
+            else:
+                snapshot["members"].discard(user_id)
+    try:
+        version = _publish(channel_id)
+    except Exception as e:
+        print(f"⚠️ Could not publish membership change for {channel_id}: {e}")
+        return
+    with _lock:
+        if _version == version - 1:
+            _version = version  # already applied here; don't drop our own snapshot
+
+
+def member_joined(channel_id: str, user_id: str) -> None:
+    """Apply a member_joined_channel event here and tell the other workers."""
+    _apply_event(channel_id, user_id, True)
+
+
+def member_left(channel_id: str, user_id: str) -> None:
+    """Apply a member_left_channel event here and tell the other workers."""
+    _apply_event(channel_id, user_id, False)
+
+
+def invalidate_channel(channel_id: str = None) -> None:
+    """Drop one channel's snapshot, or all snapshots when no channel is given."""
+    with _lock:
+        if channel_id:
+            _snapshots.pop(channel_id, None)
+        else:
+            _snapshots.clear()
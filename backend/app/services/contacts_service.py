@@ -0,0 +1,127 @@
+# backend/app/services/contacts_service.py
+"""
+Contact listing service.
+Cursor-paginated, projected and searchable contact queries shared by the contacts APIs.
+"""
+from app.core.supabase import db
+from typing import Dict, List, Optional
+import base64
+import json
+import re
+
+# Columns clients may request via ?fields= (search_vector is internal)
+CONTACT_FIELDS = ['id', 'name', 'email', 'phone', 'company', 'role', 'slack_user_id', 'notes', 'created_at', 'updated_at']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Keep IN (...) filters well under PostgREST URL length limits
+LOOKUP_CHUNK_SIZE = 200
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    Turn a ?fields= value into a safe column list.
+    id and name are always included because the cursor is built from them.
+    """
+    if not fields:
+        return list(CONTACT_FIELDS)
+
+    requested = [f.strip() for f in fields.split(',')]
+    columns = ['id', 'name'] + [f for f in requested if f in CONTACT_FIELDS and f not in ('id', 'name')]
+    return list(dict.fromkeys(columns))
+
+
+def encode_cursor(contact: Dict) -> str:
+    """Encode the (name, id) sort key of the last row on a page."""
+    raw = json.dumps([contact['name'], contact['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if malformed."""
+    try:
+        name, contact_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return name, contact_id
+
+
+def _quote(value: str) -> str:
+    """Quote a value for use inside a PostgREST or=(...) filter."""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def build_search_query(q: str) -> Optional[str]:
+    """
+    Build a prefix tsquery from free text, e.g. "leo fly" -> "leo:* & fly:*".
+    Only word, @, ., + and - characters survive so users cannot inject operators.
+    """
+    terms = re.findall(r"[\w@.+-]+", (q or '').lower())
+    if not terms:
+        return None
+    return ' & '.join(f"{term}:*" for term in terms)
+
+
+def list_contacts(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    fields: Optional[str] = None
+) -> Dict:
+    """
+    Fetch one page of contacts ordered by name.
+
+    Args:
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: Opaque cursor from the previous page's next_cursor
+        q: Free-text search over name, email and company
+        fields: Comma-separated column projection
+
+    Returns:
+        Dict with data (list of contacts) and next_cursor (None on the last page)
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    columns = parse_fields(fields)
+
+    query = db.table("contacts").select(", ".join(columns))
+
+    search = build_search_query(q)
+    if search:
+        query = query.filter("search_vector", "fts(simple)", search)
+
+    if cursor:
+        name, contact_id = decode_cursor(cursor)
+        query = query.or_(f"name.gt.{_quote(name)},and(name.eq.{_quote(name)},id.gt.{_quote(contact_id)})")
+
+    # Fetch one extra row to know whether another page exists
+    result = query.order("name").order("id").limit(limit + 1).execute()
+    rows = result.data or []
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "data": rows,
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None
+    }
+
+
+def attach_project_ids(contacts: List[Dict]) -> List[Dict]:
+    """Add project_ids to each contact, loading associations only for these contacts."""
+    contact_ids = [c['id'] for c in contacts]
+    project_ids = {contact_id: [] for contact_id in contact_ids}
+
+    for i in range(0, len(contact_ids), LOOKUP_CHUNK_SIZE):
+        chunk = contact_ids[i:i + LOOKUP_CHUNK_SIZE]
+        assoc_result = db.table('contact_projects')\
+            .select('contact_id, project_id')\
+            .in_('contact_id', chunk)\
+            .execute()
+        for assoc in assoc_result.data or []:
+            project_ids[assoc['contact_id']].append(assoc['project_id'])
+
+    for contact in contacts:
+        contact['project_ids'] = project_ids.get(contact['id'], [])
+
+    return contacts
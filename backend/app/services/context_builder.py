@@ -0,0 +1,260 @@
+# backend/app/services/context_builder.py
+"""
+Token-budgeted project context for the AI chat prompts.
+Picks the projects and fields a question is about (by name, owner,
+developer or stage mentions, falling back to recency) and packs them into a
+compact pipe-delimited table that stays under a token budget. Credentials
+and Slack IDs never reach the prompt.
+"""
+from app.core.config import settings
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import math
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional
+    _encoding = None
+
+# Always shown for every included project
+CORE_FIELDS = [
+    ('client_name', 'project'),
+    ('category', 'stage'),
+    ('owner', 'pm'),
+    ('developer', 'dev'),
+    ('blocker', 'blocker'),
+    ('status_detail', 'status'),
+    ('last_updated_at', 'updated')
+]
+
+# Extra columns, added when the question mentions one of the keywords
+OPTIONAL_FIELDS = [
+    (('launch', 'date', 'eta', 'when', 'schedule'), [('launch_date_internal', 'launch_int'), ('launch_date_public', 'launch_pub'), ('eta_pc', 'eta_pc'), ('eta_sl', 'eta_sl')]),
+    (('url', 'link', 'site', 'store', 'domain'), [('live_url', 'live_url'), ('shopify_url', 'shopify_url'), ('shopline_url', 'shopline_url'), ('other_url', 'other_url')]),
+    (('merchant', 'client contact', 'email'), [('merchant_name', 'merchant'), ('merchant_email', 'merchant_email')]),
+    (('contact', 'call', 'meeting', 'communicat', 'message', 'talk', 'spoke'), [('last_contact_date', 'last_contact'), ('next_call', 'next_call'), ('last_communication_via', 'via'), ('comm_count_internal', 'msgs_int'), ('comm_count_external', 'msgs_ext'), ('comm_count_meetings', 'meetings')]),
+    (('migration', 'checklist', 'task', 'progress'), [('migration_checklist', 'migration')]),
+    (('sync',), [('sync_status', 'sync'), ('last_sync_internal', 'sync_int'), ('last_sync_external', 'sync_ext'), ('last_sync_pm', 'sync_pm'), ('last_sync_emails', 'sync_email')])
+]
+
+# Everything the old prompt dumped for each project (used to report savings)
+LEGACY_FIELDS = [f for f, _ in CORE_FIELDS] + [f for _, group in OPTIONAL_FIELDS for f, _ in group] + [
+    'shopline_preview_pass', 'channel_id_internal', 'channel_id_external'
+]
+
+# Stage names as used by the frontend, with the words people use for them
+STAGE_KEYWORDS = [
+    ('Almost Ready', ('almost ready', 'almost')),
+    ('Stuck / On Hold', ('stuck', 'on hold', 'blocked', 'blocker')),
+    ('Launched', ('launched', 'live')),
+    ('Ready', ('ready',)),
+    ('New / In Progress', ('in progress', 'new project', 'onboarding', 'new'))
+]
+
+MAX_CELL_CHARS = 120
+
+# Words of client names that say nothing about which client is meant
+GENERIC_NAME_WORDS = {'the', 'and', 'shop', 'store', 'stores', 'official', 'online', 'inc', 'ltd', 'llc',
+                      'group', 'brand', 'brands', 'global', 'studio', 'company'}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise ~4 characters per token."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def has_blocker(project: Dict) -> bool:
+    """Whether the project's blocker field holds an actual blocker."""
+    blocker = str(project.get('blocker') or '').strip().lower()
+    return blocker not in ('', 'none', 'no', 'n/a', 'false')
+
+
+def _format_cell(field: str, value) -> str:
+    if field == 'migration_checklist':
+        if not isinstance(value, dict) or not value:
+            return ''
+        done = sum(1 for v in value.values() if v)
+        pending = [k for k, v in value.items() if not v][:5]
+        value = f"{done}/{len(value)} done" + (f"; pending: {', '.join(pending)}" if pending else '')
+    elif isinstance(value, list):
+        value = ', '.join(str(v) for v in value)
+    elif value is None:
+        return ''
+
+    text = re.sub(r'\s+', ' ', str(value)).replace('|', '/').strip()
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS - 1] + '…'
+    return text
+
+
+def format_cells(project: Dict) -> Dict[str, str]:
+    """Preformat every column the builder can emit for one project."""
+    fields = [f for f, _ in CORE_FIELDS] + [f for _, group in OPTIONAL_FIELDS for f, _ in group]
+    return {field: _format_cell(field, project.get(field)) for field in fields}
+
+
+def _recency(project: Dict) -> float:
+    """Seconds since epoch of the last update (0 when unknown)."""
+    value = project.get('last_updated_at') or project.get('created_at')
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _mentions(question: str, words: set, name: str) -> bool:
+    """True if the question mentions a person's name, or any of its words longer than 2 letters."""
+    name = (name or '').lower().strip()
+    if not name:
+        return False
+    if name in question:
+        return True
+    return any(len(w) > 2 and w in words for w in _WORD_RE.findall(name))
+
+
+def _mentions_project(question: str, words: set, name: str, shared: set) -> bool:
+    """
+    True if the question names a project: its whole name (as words), one
+    distinctive word of it (4+ letters, in no other project name, not a
+    generic word), or at least two of its words. Short, generic or shared
+    words alone ("shop", "blue") would pull in unrelated projects.
+    """
+    name_words = _WORD_RE.findall((name or '').lower())
+    if not name_words:
+        return False
+    if re.search(r'\b' + r'\W+'.join(map(re.escape, name_words)) + r'\b', question):
+        return True
+    hits = {w for w in name_words if len(w) > 2 and w in words and w not in GENERIC_NAME_WORDS}
+    if any(len(w) > 3 and w not in shared for w in hits):
+        return True
+    return len(hits) >= 2
+
+
+def match_stage(question: str, words: set, ignore: Tuple[str, ...] = ()) -> Optional[str]:
+    """First stage whose keywords the (lowercased) question uses, skipping keywords in ignore."""
+    for stage, keywords in STAGE_KEYWORDS:
+        if any((k in question) if ' ' in k else (k in words) for k in keywords if k not in ignore):
+            return stage
+    return None
+
+
+def score_projects(projects: List[Dict], question: str) -> List[Tuple[float, Dict]]:
+    """
+    Score projects by relevance to the question.
+    Direct mentions (project name, PM, developer, stage) outrank recency.
+
+    Returns:
+        (score, project) pairs; score >= 1 means the project was matched
+    """
+    question = (question or '').lower()
+    words = set(_WORD_RE.findall(question))
+
+    stage = match_stage(question, words)
+    stages = [stage] if stage else []
+    wants_blockers = any(k in question for k in ('block', 'stuck', 'issue', 'problem'))
+
+    # Words in more than one project name don't identify a project on their own
+    name_word_counts = {}
+    for p in projects:
+        for w in set(_WORD_RE.findall((p.get('client_name') or '').lower())):
+            name_word_counts[w] = name_word_counts.get(w, 0) + 1
+    shared = {w for w, n in name_word_counts.items() if n > 1}
+
+    newest = max((_recency(p) for p in projects), default=0.0) or 1.0
+    scored = []
+    for p in projects:
+        score = 0.0
+        if _mentions_project(question, words, p.get('client_name'), shared):
+            score += 10
+        if _mentions(question, words, p.get('owner')) or _mentions(question, words, p.get('developer')):
+            score += 5
+        if p.get('category') in stages:
+            score += 5
+        if wants_blockers and has_blocker(p):
+            score += 3
+        # Recency breaks ties and orders unmatched projects
+        score += _recency(p) / newest * 0.5
+        scored.append((score, p))
+
+    scored.sort(key=lambda sp: sp[0], reverse=True)
+    return scored
+
+
+def select_fields(question: str) -> List[Tuple[str, str]]:
+    """Core columns plus the optional groups the question asks about."""
+    question = (question or '').lower()
+    fields = list(CORE_FIELDS)
+    for keywords, group in OPTIONAL_FIELDS:
+        if any(k in question for k in keywords):
+            fields.extend(f for f in group if f not in fields)
+    return fields
+
+
+def _legacy_tokens(projects: List[Dict]) -> int:
+    """Approximate size of the old one-block-per-project dump of every field."""
+    text = "\n".join(
+        f"- {field}: {p.get(field, 'N/A')}" for p in projects for field in LEGACY_FIELDS
+    )
+    return count_tokens(text)
+
+
+def build_project_table(projects: List[Dict], question: str, token_budget: int = None,
+                        cells: Dict[str, Dict[str, str]] = None) -> Tuple[str, Dict]:
+    """
+    Build a compact project table for a question under a token budget.
+
+    If the question matches specific projects, only those are included;
+    otherwise projects are packed most recent first until the budget is used.
+
+    Args:
+        projects: Project rows
+        question: The user's question
+        token_budget: Max tokens for the table (default: settings.CONTEXT_TOKEN_BUDGET)
+        cells: Preformatted cells per project ID (e.g. from project_snapshot)
+
+    Returns:
+        (table text, stats with tokens used/saved and projects included/total)
+    """
+    token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    fields = select_fields(question)
+    scored = score_projects(projects, question)
+
+    matched = [p for score, p in scored if score >= 1]
+    candidates = matched or [p for _, p in scored]
+
+    header = " | ".join(label for _, label in fields)
+    lines = [header]
+    used = count_tokens(header)
+    for p in candidates:
+        row_cells = (cells or {}).get(p.get('id')) or format_cells(p)
+        line = " | ".join(row_cells[field] for field, _ in fields)
+        line_tokens = count_tokens(line) + 1
+        if used + line_tokens > token_budget:
+            break
+        lines.append(line)
+        used += line_tokens
+
+    included = len(lines) - 1
+    if included < len(candidates):
+        lines.append(f"({len(candidates) - included} more matching projects omitted for length)")
+
+    table = "\n".join(lines)
+    tokens = count_tokens(table)
+    legacy = _legacy_tokens(projects)
+
+    return table, {
+        'tokens': tokens,
+        'tokens_full': legacy,
+        'tokens_saved': max(legacy - tokens, 0),
+        'projects_included': included,
+        'projects_matched': len(matched),
+        'projects_total': len(projects),
+        'token_budget': token_budget,
+        'tokenizer': 'tiktoken' if _encoding is not None else 'estimate'
+    }
@@ -0,0 +1,164 @@
+# backend/app/services/conversation_store.py
+"""
+Server-side memory for AlienGPT chat conversations (migration 032).
+
+Each conversation keeps a rolling summary plus its most recent turns.
+Once the verbatim turns pass SUMMARY_TRIGGER_TOKENS, everything but the
+last RECENT_TURNS_KEPT turns is folded into the summary with one small
+completion, so long sessions send the model a bounded history.
+"""
+from app.core.supabase import admin_db
+from app.services import context_builder
+from app.services.openai_service import get_openai_client
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Verbatim history size (tokens) that triggers summarization
+SUMMARY_TRIGGER_TOKENS = 1500
+
+# Turns (user or assistant messages) always kept verbatim
+RECENT_TURNS_KEPT = 4
+
+SUMMARY_MAX_TOKENS = 400
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# Attempts to append an exchange when concurrent sends race on one conversation
+APPEND_RETRIES = 3
+
+COLUMNS = "id, user_id, summary, turns, turn_count"
+
+
+def get(conversation_id: str, user_id: str) -> Optional[Dict]:
+    """A conversation owned by the user, or None."""
+    result = admin_db.table("chat_conversations").select(COLUMNS)\
+        .eq("id", conversation_id).eq("user_id", user_id).execute()
+    return result.data[0] if result.data else None
+
+
+def create(user_id: str, user_message: str, assistant_message: str) -> Dict:
+    """Start a conversation with its first exchange (created once there is an answer to keep)."""
+    turns = [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": assistant_message}
+    ]
+    result = admin_db.table("chat_conversations").insert({
+        "user_id": user_id,
+        "summary": "",
+        "turns": turns,
+        "turn_count": len(turns)
+    }).execute()
+    return result.data[0]
+
+
+def delete(conversation_id: str, user_id: str) -> bool:
+    result = admin_db.table("chat_conversations").delete()\
+        .eq("id", conversation_id).eq("user_id", user_id).execute()
+    return bool(result.data)
+
+
+def history_messages(conversation: Dict) -> List[Dict]:
+    """Messages to place between the system prompt and the new question."""
+    messages = []
+    if conversation.get('summary'):
+        messages.append({
+            "role": "system",
+            "content": f"Summary of the earlier part of this conversation:\n{conversation['summary']}"
+        })
+    messages.extend({"role": t["role"], "content": t["content"]} for t in conversation.get('turns') or [])
+    return messages
+
+
+def _turns_tokens(turns: List[Dict]) -> int:
+    return sum(context_builder.count_tokens(t.get("content") or "") + 4 for t in turns)
+
+
+def _summarize(summary: str, turns: List[Dict]) -> str:
+    """Fold turns into the existing summary with one completion."""
+    client = get_openai_client()
+    if not client:
+        raise Exception("OpenAI client not configured - check API key in settings")
+
+    transcript = "\n\n".join(f"{t['role'].upper()}: {t['content']}" for t in turns)
+    response = client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": (
+                "You maintain the running summary of a conversation between a user and AlienGPT, "
+                "an assistant for a project management portal. Merge the new messages into the "
+                "existing summary. Keep project names, people, numbers, dates, decisions and open "
+                "questions; drop pleasantries and formatting. Reply with the updated summary only."
+            )},
+            {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
+        ],
+        temperature=0.2,
+        max_tokens=SUMMARY_MAX_TOKENS
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _compact(conversation: Dict) -> Dict:
+    """Summarize older turns once the verbatim history is over the threshold."""
+    turns = conversation.get('turns') or []
+    if _turns_tokens(turns) <= SUMMARY_TRIGGER_TOKENS or len(turns) <= RECENT_TURNS_KEPT:
+        return conversation
+
+    older, recent = turns[:-RECENT_TURNS_KEPT], turns[-RECENT_TURNS_KEPT:]
+    try:
+        summary = _summarize(conversation.get('summary') or '', older)
+    except Exception as e:
+        # Keep the turns verbatim and try again after the next message
+        print(f"⚠️ Could not summarize conversation {conversation['id']}: {e}")
+        return conversation
+
+    # Only if no exchange was added meanwhile; otherwise the next one compacts
+    result = admin_db.table("chat_conversations").update({
+        "summary": summary,
+        "turns": recent,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }).eq("id", conversation['id']).eq("turn_count", conversation.get('turn_count') or 0).execute()
+    if not result.data:
+        return conversation
+    print(f"🧠 Summarized {len(older)} turn(s) of conversation {conversation['id']}")
+    return dict(conversation, summary=summary, turns=recent)
+
+
+def add_exchange(conversation: Dict, user_message: str, assistant_message: str) -> Dict:
+    """
+    Append a question and its answer, then compact if needed.
+
+    The write is conditional on turn_count, so two sends racing on one
+    conversation cannot drop each other's turns: the loser reloads and
+    appends again.
+
+    Returns:
+        The updated conversation
+    """
+    for _ in range(APPEND_RETRIES):
+        turns = (conversation.get('turns') or []) + [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": assistant_message}
+        ]
+        turn_count = (conversation.get('turn_count') or 0) + 2
+        result = admin_db.table("chat_conversations").update({
+            "turns": turns,
+            "turn_count": turn_count,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", conversation['id']).eq("turn_count", conversation.get('turn_count') or 0).execute()
+        if result.data:
+            return _compact(dict(conversation, turns=turns, turn_count=turn_count))
+
+        conversation = get(conversation['id'], conversation['user_id'])
+        if not conversation:
+            raise Exception("Conversation was deleted")
+    raise Exception(f"Could not append to conversation after {APPEND_RETRIES} attempts")
+
+
+def get_stats(conversation: Dict) -> Dict:
+    """Sizes of what the conversation sends upstream."""
+    turns = conversation.get('turns') or []
+    return {
+        "turns_total": conversation.get('turn_count') or 0,
+        "turns_verbatim": len(turns),
+        "history_tokens": _turns_tokens(turns) + context_builder.count_tokens(conversation.get('summary') or ''),
+        "summarized": bool(conversation.get('summary'))
+    }
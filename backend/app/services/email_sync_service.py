@@ -33,6 +33,7 @@ def sync_emails(project_id: str, last_sync: Optional[str] = None) -> List[Dict]:
         for email in emails.data:
             email_data.append({
                 'type': 'email',
+                'id': email.get('id'),
                 'content': f"""From: {email.get('from_email', 'Unknown')}
 To: {email.get('to_email', 'Unknown')}
 Date: {email.get('created_at', 'Unknown')}
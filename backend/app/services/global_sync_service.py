@@ -4,7 +4,7 @@ Global sync service for syncing all projects at once.
 Syncs contacts, Slack IDs, stakeholders, and AI knowledge bases.
 """
 from app.core.supabase import db
-from app.services import slack_sync_service, openai_service, activity_logger, pm_sync_service, email_sync_service
+from app.services import activity_logger, slack_directory, stakeholder_sync_service, knowledge_service, project_ai, ai_warmup
 from slack_sdk import WebClient
 from app.core.config import settings
 from typing import Dict, List
@@ -130,22 +130,29 @@ def sync_all_slack_ids(user_id: str, user_name: str) -> Dict:
     
     try:
         # Get all contacts without Slack IDs
-        contacts = db.table("contacts").select("id, email").is_("slack_user_id", "null").execute()
+        contacts = db.table("contacts").select("id, name, email").is_("slack_user_id", "null").execute()
         
-        matched = 0
+        # Match against the shared workspace directory (one paginated users.list,
+        # cached across runs) instead of one users.lookupByEmail call per contact
+        email_index = slack_directory.get_email_index()
         
+        matches = []
         for contact in contacts.data:
-            try:
-                # Try to find user by email
-                result = slack_client.users_lookupByEmail(email=contact['email'])
-                if result.get('ok'):
-                    slack_user_id = result['user']['id']
-                    db.table("contacts").update({
-                        "slack_user_id": slack_user_id
-                    }).eq("id", contact['id']).execute()
-                    matched += 1
-            except:
-                pass
+            slack_user_id = email_index.get((contact.get('email') or '').strip().lower())
+            if slack_user_id:
+                matches.append({
+                    "id": contact['id'],
+                    "name": contact['name'],
+                    "email": contact['email'],
+                    "slack_user_id": slack_user_id
+                })
+        
+        # Apply all matches in one batched write (name/email are carried along
+        # so the upsert rows satisfy the NOT NULL and UNIQUE constraints)
+        if matches:
+            db.table("contacts").upsert(matches, on_conflict="id").execute()
+        
+        matched = len(matches)
         
         duration_ms = int((time.time() - start_time) * 1000)
         
@@ -167,6 +174,48 @@ def sync_all_slack_ids(user_id: str, user_name: str) -> Dict:
         raise
 
 
+def sync_all_stakeholders(user_id: str, user_name: str) -> Dict:
+    """
+    Link contacts to every project based on Slack channel membership.
+    
+    Returns:
+        Dict with counts of added/skipped stakeholder links
+    """
+    start_time = time.time()
+    
+    try:
+        projects = db.table("projects").select("id, channel_id_internal, channel_id_external").execute()
+        
+        result = stakeholder_sync_service.sync_stakeholders(projects.data, added_by=user_id)
+        
+        summary = {
+            'added': result['added'],
+            'skipped': result['skipped'],
+            'unmatched': result['unmatched'],
+            'channels_scanned': result['channels_scanned'],
+            'projects': len(projects.data)
+        }
+        
+        duration_ms = int((time.time() - start_time) * 1000)
+        
+        activity_logger.log_activity(
+            user_id=user_id,
+            user_name=user_name,
+            action_type='sync_stakeholders',
+            resource_type='global',
+            status='success',
+            details=summary,
+            duration_ms=duration_ms
+        )
+        
+        return summary
+    
+    except Exception as e:
+        duration_ms = int((time.time() - start_time) * 1000)
+        activity_logger.log_error(user_id, user_name, 'sync_stakeholders', e, 'global', duration_ms=duration_ms)
+        raise
+
+
 def sync_all_ai_knowledge(user_id: str, user_name: str) -> Dict:
     """
     Sync AI knowledge bases for all projects.
@@ -212,126 +261,38 @@ def sync_all_ai_knowledge(user_id: str, user_name: str) -> Dict:
         
         log_line(f"\n🚀 Starting AI sync for {total_projects} projects...", log_id)
         
+        # Auto-initialize (or finish initializing) AI for every project that
+        # needs it, concurrently, before syncing. In lazy mode projects are
+        # initialized by their first chat instead (see ai_warmup)
+        pending = [p for p in projects.data if not project_ai.is_initialized(p)]
+        init_errors = {}
+        if pending and settings.AI_LAZY_INIT:
+            log_line(f"💤 Lazy AI mode: leaving {len(pending)} uninitialized project(s) for their first chat", log_id)
+        elif pending:
+            log_line(f"🤖 Auto-initializing AI for {len(pending)} project(s)...", log_id)
+            for project_id, outcome in project_ai.initialize_projects(pending).items():
+                if isinstance(outcome, Exception):
+                    init_errors[project_id] = outcome
+                else:
+                    initialized += 1
+            log_line(f"✅ Initialized AI for {initialized}/{len(pending)} project(s)", log_id)
+        
         for idx, project in enumerate(projects.data, 1):
             project_name = project.get('client_name', 'Unknown')
             
             log_line(f"\n🔄 Processing {idx}/{total_projects}: {project_name}", log_id)
             
             try:
-                # Check if AI is initialized
-                if not project.get('internal_assistant_id'):
-                    # Auto-initialize AI for this project (4 vector stores)
-                    log_line(f"🤖 Auto-initializing AI (4 stores) for project: {project_name}", log_id)
-                    
-                    # Create 4 vector stores
-                    internal_store_id = openai_service.create_vector_store(
-                        name=f"{project_name} - Internal",
-                        description=f"Internal Slack communications for {project_name}"
-                    )
-                    
-                    external_store_id = openai_service.create_vector_store(
-                        name=f"{project_name} - External",
-                        description=f"External Slack communications for {project_name}"
-                    )
-                    
-                    pm_store_id = openai_service.create_vector_store(
-                        name=f"{project_name} - Internal-Project-Management",
-                        description=f"PM data: notes, blockers, updates, URLs, launch dates for {project_name}"
-                    )
-                    
-                    email_store_id = openai_service.create_vector_store(
-                        name=f"{project_name} - Emails",
-                        description=f"Email communications for {project_name}"
-                    )
-                    
-                    # Create 4 assistants with STRICT project-specific instructions
-                    internal_assistant_id = openai_service.create_assistant(
-                        name=f"{project_name} - Internal Assistant",
-                        instructions=f"""You are an AI assistant EXCLUSIVELY for the {project_name} project.
-
-IMPORTANT RULES:
-1. You can ONLY answer questions about {project_name}. 
-2. If asked about ANY other project, respond: "I only have access to {project_name} data. I cannot answer about other projects."
-3. If the question is unclear or ambiguous, ASK clarifying questions before answering.
-4. ONLY use information from your assigned knowledge base (internal Slack communications for {project_name}).
-5. Always cite the source (date, person, channel) when providing information.
-6. If you don't have information, say "I don't have that information in my knowledge base" - NEVER make up answers.
-
-Your knowledge base contains: Internal team Slack communications for {project_name}.
-
-Be helpful, professional, and always verify you're answering about the correct project.""",
-                        vector_store_id=internal_store_id
-                    )
-                    
-                    external_assistant_id = openai_service.create_assistant(
-                        name=f"{project_name} - External Assistant",
-                        instructions=f"""You are an AI assistant EXCLUSIVELY for the {project_name} project.
-
-IMPORTANT RULES:
-1. You can ONLY answer questions about {project_name}.
-2. If asked about ANY other project, respond: "I only have access to {project_name} data. I cannot answer about other projects."
-3. If the question is unclear or ambiguous, ASK clarifying questions before answering.
-4. ONLY use information from your assigned knowledge base (external Slack communications for {project_name}).
-5. Always cite the source (date, person, channel) when providing information.
-6. If you don't have information, say "I don't have that information in my knowledge base" - NEVER make up answers.
-
-Your knowledge base contains: External Slack communications with clients and Shopline team for {project_name}.
-
-Be professional, client-focused, and always verify you're answering about the correct project.""",
-                        vector_store_id=external_store_id
-                    )
-                    
-                    pm_assistant_id = openai_service.create_assistant(
-                        name=f"{project_name} - PM Assistant",
-                        instructions=f"""You are an AI assistant EXCLUSIVELY for the {project_name} project.
-
-IMPORTANT RULES:
-1. You can ONLY answer questions about {project_name}.
-2. If asked about ANY other project, respond: "I only have access to {project_name} data. I cannot answer about other projects."
-3. If the question is unclear or ambiguous, ASK clarifying questions before answering.
-4. ONLY use information from your assigned knowledge base (PM data for {project_name}).
-5. Always cite specific dates, PM names, and report details when providing information.
-6. If you don't have information, say "I don't have that information in my knowledge base" - NEVER make up answers.
-
-Your knowledge base contains: PM notes, blockers, updates, URLs, launch dates, and all PM inputs for {project_name}.
-
-Be detailed, reference specific dates and updates, and always verify you're answering about the correct project.""",
-                        vector_store_id=pm_store_id
-                    )
-                    
-                    email_assistant_id = openai_service.create_assistant(
-                        name=f"{project_name} - Email Assistant",
-                        instructions=f"""You are an AI assistant EXCLUSIVELY for the {project_name} project.
-
-IMPORTANT RULES:
-1. You can ONLY answer questions about {project_name}.
-2. If asked about ANY other project, respond: "I only have access to {project_name} data. I cannot answer about other projects."
-3. If the question is unclear or ambiguous, ASK clarifying questions before answering.
-4. ONLY use information from your assigned knowledge base (emails for {project_name}).
-5. Always cite the email sender, date, and subject when providing information.
-6. If you don't have information, say "I don't have that information in my knowledge base" - NEVER make up answers.
-
-Your knowledge base contains: Email communications for {project_name}.
-
-Be professional, reference specific emails, and always verify you're answering about the correct project.""",
-                        vector_store_id=email_store_id
-                    )
-                    
-                    # Update project with all IDs
-                    db.table("projects").update({
-                        "internal_vector_store_id": internal_store_id,
-                        "external_vector_store_id": external_store_id,
-                        "pm_vector_store_id": pm_store_id,
-                        "email_vector_store_id": email_store_id,
-                        "internal_assistant_id": internal_assistant_id,
-                        "external_assistant_id": external_assistant_id,
-                        "pm_assistant_id": pm_assistant_id,
-                        "email_assistant_id": email_assistant_id,
-                        "sync_status": "initialized"
-                    }).eq("id", project['id']).execute()
-                    
-                    initialized += 1
-                    log_line(f"✅ Initialized 4 vector stores for {project_name}", log_id)
+                if project['id'] in init_errors:
+                    # Created resources are kept; the next sync resumes from them
+                    raise Exception(f"AI initialization failed: {init_errors[project['id']]}")
+                
+                reason = ai_warmup.sync_skip_reason(project) if settings.AI_LAZY_INIT else None
+                if reason:
+                    log_line(f"⚠️  Skipped {project_name}: {reason}", log_id)
+                    skipped += 1
+                    skipped_details.append({"project": project_name, "reason": reason})
+                    continue
                 
                 # Check if project has any channels configured
                 has_internal_channel = bool(project.get('channel_id_internal'))
@@ -345,70 +306,35 @@ Be professional, reference specific emails, and always verify you're answering a
                     skipped_details.append({"project": project_name, "reason": reason})
                     continue
                 
-                # Track if any data was synced
-                data_synced = False
-                
-                # Now sync messages (whether just initialized or already existed)
-                # Sync internal channel
-                internal_messages = slack_sync_service.sync_internal_channel(project['id'])
-                if internal_messages:
-                    # Refresh project data to get vector store IDs
-                    updated_project = db.table("projects").select("internal_vector_store_id").eq("id", project['id']).execute()
-                    openai_service.upload_messages_to_vector_store(
-                        updated_project.data[0]['internal_vector_store_id'],
-                        internal_messages
-                    )
-                    log_line(f"📤 Uploaded {len(internal_messages)} internal messages for {project_name}", log_id)
-                    data_synced = True
+                # Refresh project data to get vector store IDs (may have just been initialized)
+                current = db.table("projects").select("*").eq("id", project['id']).execute().data[0]
                 
-                # Sync external channel
-                external_messages = slack_sync_service.sync_external_channel(project['id'])
-                if external_messages:
-                    updated_project = db.table("projects").select("external_vector_store_id").eq("id", project['id']).execute()
-                    openai_service.upload_messages_to_vector_store(
-                        updated_project.data[0]['external_vector_store_id'],
-                        external_messages
-                    )
-                    log_line(f"📤 Uploaded {len(external_messages)} external messages for {project_name}", log_id)
-                    data_synced = True
+                # Upload changed month shards for every source and stamp the sync time
+                counts, uploaded = project_ai.sync_knowledge(current)
                 
-                # Sync PM data
-                pm_data = pm_sync_service.sync_pm_data(project['id'])
-                if pm_data:
-                    updated_project = db.table("projects").select("pm_vector_store_id").eq("id", project['id']).execute()
-                    if updated_project.data and updated_project.data[0].get('pm_vector_store_id'):
-                        pm_text = pm_sync_service.format_pm_data_for_upload(pm_data)
-                        openai_service.upload_text_to_vector_store(
-                            updated_project.data[0]['pm_vector_store_id'],
-                            pm_text,
-                            f"{project_name}_pm_data.txt"
-                        )
-                        log_line(f"📋 Uploaded PM data for {project_name}", log_id)
-                        data_synced = True
+                source_labels = {
+                    'internal': ('📤', 'internal messages'),
+                    'external': ('📤', 'external messages'),
+                    'pm': ('📋', 'PM entries'),
+                    'email': ('📧', 'emails')
+                }
+                if project_ai.uses_consolidated_layout(current):
+                    # Every source shares one store
+                    shards = sum(len(file_ids) for file_ids in uploaded.values())
+                    if shards:
+                        covered = ", ".join(f"{counts.get(source, 0)} {label}" for source, (_, label) in source_labels.items())
+                        log_line(f"📤 Uploaded {shards} changed shard(s) covering {covered} for {project_name}", log_id)
+                else:
+                    for source, (icon, label) in source_labels.items():
+                        shards = len(uploaded.get(current.get(knowledge_service.SOURCE_STORES[source]), []))
+                        if shards:
+                            log_line(f"{icon} Uploaded {shards} changed shard(s) covering {counts.get(source, 0)} {label} for {project_name}", log_id)
                 
-                # Sync emails
-                emails = email_sync_service.sync_emails(project['id'])
-                if emails:
-                    updated_project = db.table("projects").select("email_vector_store_id").eq("id", project['id']).execute()
-                    if updated_project.data and updated_project.data[0].get('email_vector_store_id'):
-                        email_text = email_sync_service.format_emails_for_upload(emails)
-                        openai_service.upload_text_to_vector_store(
-                            updated_project.data[0]['email_vector_store_id'],
-                            email_text,
-                            f"{project_name}_emails.txt"
-                        )
-                        log_line(f"📧 Uploaded {len(emails)} emails for {project_name}", log_id)
-                        data_synced = True
+                # Track if any data was synced
+                data_synced = bool(uploaded)
                 
                 # Determine if we should count as synced or skipped
                 if data_synced:
-                    # Update timestamps
-                    db.table("projects").update({
-                        "last_sync_internal": time.strftime('%Y-%m-%dT%H:%M:%S'),
-                        "last_sync_external": time.strftime('%Y-%m-%dT%H:%M:%S'),
-                        "sync_status": "synced"
-                    }).eq("id", project['id']).execute()
-                    
                     synced += 1
                     log_line(f"✅ Synced {project_name}", log_id)
                 else:
@@ -462,7 +388,7 @@ Be professional, reference specific emails, and always verify you're answering a
 
 def run_global_sync(user_id: str, user_name: str) -> Dict:
     """
-    Run full global sync: contacts, Slack IDs, and AI knowledge.
+    Run full global sync: contacts, Slack IDs, stakeholders, and AI knowledge.
     
     Returns:
         Dict with summary of all sync operations
@@ -476,7 +402,10 @@ def run_global_sync(user_id: str, user_name: str) -> Dict:
         # 2. Sync Slack IDs
         slack_ids_result = sync_all_slack_ids(user_id, user_name)
         
-        # 3. Sync AI knowledge
+        # 3. Sync stakeholders
+        stakeholders_result = sync_all_stakeholders(user_id, user_name)
+        
+        # 4. Sync AI knowledge
         ai_result = sync_all_ai_knowledge(user_id, user_name)
         
         duration_ms = int((time.time() - start_time) * 1000)
@@ -490,6 +419,7 @@ def run_global_sync(user_id: str, user_name: str) -> Dict:
             details={
                 'contacts': contacts_result,
                 'slack_ids': slack_ids_result,
+                'stakeholders': stakeholders_result,
                 'ai': ai_result,
                 'total_duration_ms': duration_ms
             },
@@ -500,6 +430,7 @@ def run_global_sync(user_id: str, user_name: str) -> Dict:
             'success': True,
             'contacts': contacts_result,
             'slack_ids': slack_ids_result,
+            'stakeholders': stakeholders_result,
             'ai': ai_result,
             'duration_ms': duration_ms
         }
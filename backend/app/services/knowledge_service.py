@@ -0,0 +1,202 @@
+# backend/app/services/knowledge_service.py
+"""
+Knowledge document builder for AI vector stores.
+Splits each project's Slack, PM and email data into shards by source and
+calendar month. Every shard has a stable doc_key ("shard:<source>:<YYYY-MM>"),
+so the upload registry only re-uploads shards whose content changed.
+Shards are tagged with a "source" attribute, which is what separates the
+sources in a project's consolidated store (see project_ai).
+"""
+from app.services import slack_sync_service, pm_sync_service, email_sync_service, vector_store_registry, openai_service
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import re
+
+SHARD_PREFIX = "shard:"
+
+# Source -> project column holding its vector store
+SOURCE_STORES = {
+    'internal': 'internal_vector_store_id',
+    'external': 'external_vector_store_id',
+    'pm': 'pm_vector_store_id',
+    'email': 'email_vector_store_id'
+}
+
+# Project column holding the consolidated store shared by every source
+CONSOLIDATED_STORE_COLUMN = 'ai_vector_store_id'
+
+
+def store_for(project: Dict, source: str) -> Optional[str]:
+    """Vector store for a source: the consolidated store if the project has one."""
+    return project.get(CONSOLIDATED_STORE_COLUMN) or project.get(SOURCE_STORES[source])
+
+
+def _document(project: Dict, store_id: str, source: str, doc_key: str, filename: str, content: str) -> Dict:
+    return {
+        'project_id': project['id'],
+        'store_id': store_id,
+        'source': source,
+        'doc_key': doc_key,
+        'filename': filename,
+        'content': content,
+        'attributes': {'source': source}
+    }
+
+
+def month_key(timestamp) -> str:
+    """Calendar month ("YYYY-MM") of an ISO timestamp or datetime."""
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime('%Y-%m')
+    try:
+        return datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).strftime('%Y-%m')
+    except ValueError:
+        return 'undated'
+
+
+def shard_key(source: str, period: str) -> str:
+    """Stable document identity of a shard."""
+    return f"{SHARD_PREFIX}{source}:{period}"
+
+
+def _slug(name: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', (name or 'project').lower()).strip('_') or 'project'
+
+
+def _month_start(iso_timestamp: str) -> str:
+    """First instant of the month containing iso_timestamp, as an ISO string."""
+    ts = datetime.fromisoformat(iso_timestamp.replace('Z', '+00:00'))
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
+
+
+def _group_by_month(entries: List[Dict]) -> Dict[str, List[Dict]]:
+    shards = {}
+    for entry in sorted(entries, key=lambda e: str(e.get('timestamp', ''))):
+        shards.setdefault(month_key(entry.get('timestamp')), []).append(entry)
+    return shards
+
+
+def _has_shards(registered: Dict, store_id: str, source: str) -> bool:
+    prefix = shard_key(source, '')
+    return any(s == store_id and key.startswith(prefix) for s, key in registered)
+
+
+def build_slack_documents(project: Dict, source: str, store_id: str, registered: Dict) -> Tuple[List[Dict], int]:
+    """
+    Build monthly Slack shards for one channel.
+
+    Only months from the last sync onwards are rebuilt (fetching from the start
+    of that month so the shard is complete). A store with no Slack shards yet
+    gets a full backfill.
+
+    Returns:
+        (documents, number of messages fetched)
+    """
+    channel_id = project.get(f'channel_id_{source}')
+    if not channel_id or not store_id:
+        return [], 0
+
+    last_sync = project.get(f'last_sync_{source}')
+    if last_sync and _has_shards(registered, store_id, source):
+        since = _month_start(last_sync)
+    else:
+        since = None
+
+    messages = slack_sync_service.fetch_channel_messages(channel_id, since)
+
+    documents = [
+        _document(
+            project, store_id, source, shard_key(source, period),
+            f"{_slug(project.get('client_name'))}_{source}_slack_{period}.txt",
+            openai_service.format_messages_for_upload(shard)
+        )
+        for period, shard in _group_by_month(messages).items()
+    ]
+    return documents, len(messages)
+
+
+def build_pm_documents(project: Dict, store_id: str) -> Tuple[List[Dict], int]:
+    """
+    Build PM shards: one profile shard plus one shard per month of reports.
+
+    Returns:
+        (documents, number of PM entries)
+    """
+    if not store_id:
+        return [], 0
+
+    pm_data = pm_sync_service.sync_pm_data(project['id'])
+    profile = [e for e in pm_data if e['type'] == 'project_info']
+    reports = [e for e in pm_data if e['type'] != 'project_info']
+
+    slug = _slug(project.get('client_name'))
+    documents = []
+    if profile:
+        documents.append(_document(
+            project, store_id, 'pm', shard_key('pm', 'profile'),
+            f"{slug}_pm_profile.txt",
+            pm_sync_service.format_pm_data_for_upload(profile)
+        ))
+    for period, shard in _group_by_month(reports).items():
+        documents.append(_document(
+            project, store_id, 'pm', shard_key('pm', period),
+            f"{slug}_pm_{period}.txt",
+            pm_sync_service.format_pm_data_for_upload(shard)
+        ))
+    return documents, len(pm_data)
+
+
+def build_email_documents(project: Dict, store_id: str) -> Tuple[List[Dict], int]:
+    """
+    Build monthly email shards.
+
+    Returns:
+        (documents, number of emails)
+    """
+    if not store_id:
+        return [], 0
+
+    emails = email_sync_service.sync_emails(project['id'])
+
+    slug = _slug(project.get('client_name'))
+    documents = [
+        _document(
+            project, store_id, 'email', shard_key('email', period),
+            f"{slug}_emails_{period}.txt",
+            email_sync_service.format_emails_for_upload(shard)
+        )
+        for period, shard in _group_by_month(emails).items()
+    ]
+    return documents, len(emails)
+
+
+def build_project_documents(project: Dict, sources: Optional[List[str]] = None) -> Tuple[List[Dict], Dict[str, int]]:
+    """
+    Build all knowledge shards for a project.
+
+    Args:
+        project: Project row including channel IDs, vector store IDs (per source
+            or consolidated) and last_sync_* fields
+        sources: Subset of internal, external, pm, email (default: all)
+
+    Returns:
+        (documents ready for openai_service.upload_documents, per-source item counts)
+    """
+    sources = sources or list(SOURCE_STORES)
+    registered = vector_store_registry.get_documents(
+        store_for(project, s) for s in sources
+    )
+
+    documents = []
+    counts = {}
+    for source in sources:
+        store_id = store_for(project, source)
+        if source in ('internal', 'external'):
+            docs, count = build_slack_documents(project, source, store_id, registered)
+        elif source == 'pm':
+            docs, count = build_pm_documents(project, store_id)
+        else:
+            docs, count = build_email_documents(project, store_id)
+        documents.extend(docs)
+        counts[source] = count
+
+    return documents, counts
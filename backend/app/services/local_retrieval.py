@@ -0,0 +1,540 @@
+# backend/app/services/local_retrieval.py
+"""
+Local retrieval backend for project AI chat.
+Embeds a project's communication logs, PM history and emails into a
+per-project NumPy matrix, answers questions with a vectorized cosine top-k
+search plus a single chat completion, and persists the matrix as a
+memory-mapped file that is appended to incrementally.
+
+Passages are keyed by their source record (log, PM report, email, project
+info); a record whose text changed replaces its passage. Chats never update
+the index themselves: a stale index is refreshed in the background.
+"""
+from app.core.config import settings
+from app.core.supabase import db
+from app.services import pm_sync_service, email_sync_service, openai_service
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# Passages per question and the completion model that answers from them
+DEFAULT_TOP_K = 8
+CHAT_MODEL = "gpt-4o-mini"
+
+# Incremental updates re-read this far behind the last sync, since Slack
+# messages are stored with their original timestamp and can arrive late
+SYNC_OVERLAP = timedelta(days=1)
+
+# Long passages are cut before embedding
+MAX_PASSAGE_CHARS = 4000
+
+# Index layout version; indexes written by an older layout are rebuilt
+INDEX_FORMAT = 2
+
+# Replaced passages leave dead rows; the matrix is compacted once they outnumber
+# the live ones (and there are at least this many)
+COMPACT_MIN_DEAD_ROWS = 50
+
+# Background index updates running at once per worker
+UPDATE_MAX_WORKERS = 2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder (no network, no model).
+    Good enough for keyword-style retrieval and stable across runs, which
+    makes it the embedder for tests and for deployments without OpenAI.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            # Unigrams plus bigrams
+            for token in tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]:
+                digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _normalize(vectors)
+
+
+class OpenAIEmbedder:
+    """Embedder backed by the OpenAI embeddings endpoint."""
+
+    BATCH_SIZE = 256
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536):
+        self.model = model
+        self.dim = dim
+        self.name = model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        client = openai_service.get_openai_client()
+        if not client:
+            raise Exception("OpenAI client not configured - check API key in settings")
+
+        vectors = []
+        for i in range(0, len(texts), self.BATCH_SIZE):
+            response = client.embeddings.create(model=self.model, input=texts[i:i + self.BATCH_SIZE])
+            vectors.extend(item.embedding for item in response.data)
+        return _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def get_embedder():
+    """Embedder selected by the LOCAL_RETRIEVAL_EMBEDDER setting ("openai" or "hashing")."""
+    if settings.LOCAL_RETRIEVAL_EMBEDDER == 'hashing':
+        return HashingEmbedder()
+    return OpenAIEmbedder()
+
+
+def collect_passages(project_id: str, since: Optional[str] = None) -> List[Dict]:
+    """
+    Gather retrievable passages for a project.
+
+    Slack logs keep their own visibility; PM history and emails are
+    internal-only, matching the internal assistants that used to serve them.
+    Keys identify the source record, so an edited record replaces its
+    passage instead of adding a second one.
+
+    Args:
+        project_id: Project ID
+        since: ISO timestamp; only passages created at or after it are returned
+            (the project info passage is always returned)
+
+    Returns:
+        List of {key, text, visibility, timestamp}
+    """
+    passages = []
+
+    logs_query = db.table("communication_logs").select(
+        "id, content, sender_name, source, visibility, created_at"
+    ).eq("project_id", project_id)
+    if since:
+        logs_query = logs_query.gte("created_at", since)
+
+    for log in logs_query.order("created_at", desc=False).execute().data or []:
+        if not log.get('content'):
+            continue
+        passages.append({
+            'key': f"log:{log['id']}",
+            'text': f"[{log.get('created_at')}] {log.get('sender_name', 'Unknown')} ({log.get('source', 'slack')}): {log['content']}",
+            'visibility': log.get('visibility') or 'internal',
+            'timestamp': log.get('created_at')
+        })
+
+    for prefix, entries in [
+        ('pm', pm_sync_service.sync_pm_data(project_id, since)),
+        ('email', email_sync_service.sync_emails(project_id, since))
+    ]:
+        for entry in entries:
+            passages.append({
+                'key': f"{prefix}:{entry['id']}",
+                'text': entry['content'],
+                'visibility': 'internal',
+                'timestamp': entry.get('timestamp')
+            })
+
+    return passages
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a stored timestamp (naive ones, from older indexes, are taken as UTC)."""
+    if not value:
+        return None
+    try:
+        stamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return stamp if stamp.tzinfo else stamp.replace(tzinfo=timezone.utc)
+
+
+class ProjectIndex:
+    """
+    On-disk embedding index for one project and embedder.
+
+    Layout under LOCAL_RETRIEVAL_DIR/<project_id>/<embedder>/:
+        vectors-<n>.f32 - float32 rows, appended in place, read through
+                          np.memmap; compaction writes the next <n>
+        meta.json       - passage keys, texts, visibility, the vectors file
+                          and the last sync time
+    Row i belongs to keys[i]; a replaced passage's row is marked dead.
+
+    The cached index is shared by request threads and the background
+    updater. Published metadata and vectors are never edited in place: an
+    update works on a copy from edit() and save() publishes the result with
+    one reference swap, so a search always sees a matching pair.
+    """
+
+    def __init__(self, project_id: str, embedder):
+        self.embedder = embedder
+        self.path = os.path.join(settings.LOCAL_RETRIEVAL_DIR, str(project_id), embedder.name.replace('/', '_'))
+        self.meta_path = os.path.join(self.path, 'meta.json')
+        self._state = (self._empty_meta(), np.zeros((0, embedder.dim), dtype=np.float32))
+        self._loaded_mtime = None
+
+    @staticmethod
+    def _empty_meta() -> Dict:
+        return {'format': INDEX_FORMAT, 'vectors_file': 'vectors-0.f32', 'keys': [], 'passages': [], 'synced_at': None}
+
+    @staticmethod
+    def _live_count(meta: Dict) -> int:
+        return sum(1 for p in meta['passages'] if not p.get('dead'))
+
+    @property
+    def meta(self) -> Dict:
+        """Published metadata (read-only)."""
+        return self._state[0]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._state[1]
+
+    @property
+    def live_count(self) -> int:
+        return self._live_count(self.meta)
+
+    def _vectors_path(self, meta: Dict) -> str:
+        return os.path.join(self.path, meta['vectors_file'])
+
+    def load(self) -> None:
+        """(Re)load the index if another worker or thread changed it on disk."""
+        if not os.path.exists(self.meta_path):
+            return
+        mtime = os.path.getmtime(self.meta_path)
+        if mtime == self._loaded_mtime:
+            return
+
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        if meta.get('format') != INDEX_FORMAT:
+            # Older layout (passages keyed by content): start over
+            meta = self._empty_meta()
+        count = len(meta['keys'])
+        if count:
+            vectors = np.memmap(self._vectors_path(meta), dtype=np.float32, mode='r', shape=(count, self.embedder.dim))
+        else:
+            vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._state = (meta, vectors)
+        self._loaded_mtime = mtime
+
+    def edit(self, rebuild: bool = False) -> Dict:
+        """Working copy of the metadata for upsert()/compact()/save() (empty for a rebuild)."""
+        if rebuild:
+            return self._empty_meta()
+        meta = self.meta
+        return dict(meta, keys=list(meta['keys']), passages=list(meta['passages']))
+
+    def upsert(self, meta: Dict, passages: List[Dict]) -> Tuple[int, int]:
+        """
+        Embed and append new passages and passages whose text changed; the
+        rows they replace are marked dead.
+
+        Args:
+            meta: Working copy from edit()
+            passages: Passages from collect_passages()
+
+        Returns:
+            (passages added, passages replaced)
+        """
+        live = {key: i for i, key in enumerate(meta['keys']) if not meta['passages'][i].get('dead')}
+        new = {}
+        for passage in passages:
+            passage = dict(passage, hash=_text_hash(passage['text']))
+            i = live.get(passage['key'])
+            if i is not None and meta['passages'][i].get('hash') == passage['hash']:
+                continue
+            new[passage['key']] = passage  # the last version of a key wins
+
+        if not new:
+            return 0, 0
+
+        new = list(new.values())
+        vectors = self.embedder.embed([p['text'][:MAX_PASSAGE_CHARS] for p in new])
+        # Rows go to disk before the metadata that makes them visible;
+        # rows left over from an interrupted update are cut off first
+        with open(self._vectors_path(meta), 'ab') as f:
+            f.truncate(len(meta['keys']) * self.embedder.dim * 4)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+        replaced = 0
+        for p in new:
+            i = live.get(p['key'])
+            if i is not None:
+                meta['passages'][i] = {'dead': True}
+                replaced += 1
+        meta['keys'].extend(p['key'] for p in new)
+        meta['passages'].extend(
+            {'text': p['text'], 'visibility': p['visibility'], 'timestamp': p.get('timestamp'), 'hash': p['hash']}
+            for p in new
+        )
+        return len(new) - replaced, replaced
+
+    def compact(self, meta: Dict) -> Optional[str]:
+        """
+        Drop dead rows into a new vectors file if they outnumber the live ones.
+
+        Returns:
+            The replaced vectors file, for save() to remove, or None
+        """
+        live_count = self._live_count(meta)
+        dead = len(meta['keys']) - live_count
+        if dead < COMPACT_MIN_DEAD_ROWS or dead <= live_count:
+            return None
+
+        keep = [i for i, p in enumerate(meta['passages']) if not p.get('dead')]
+        old_path = self._vectors_path(meta)
+        vectors = np.memmap(old_path, dtype=np.float32, mode='r', shape=(len(meta['keys']), self.embedder.dim))
+        generation = int(re.search(r'(\d+)', meta['vectors_file']).group(1)) + 1
+        meta['vectors_file'] = f"vectors-{generation}.f32"
+        with open(self._vectors_path(meta), 'wb') as f:
+            f.write(np.ascontiguousarray(vectors[keep], dtype=np.float32).tobytes())
+        del vectors
+        meta['keys'] = [meta['keys'][i] for i in keep]
+        meta['passages'] = [meta['passages'][i] for i in keep]
+        return old_path
+
+    def save(self, meta: Dict, synced_at: str, obsolete: Optional[str] = None) -> None:
+        """Write the working copy to disk and publish it."""
+        meta['synced_at'] = synced_at
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        if obsolete:
+            # Readers that still map it keep their view until they reload
+            os.remove(obsolete)
+        self._loaded_mtime = None
+        self.load()
+
+    def is_fresh(self, max_age: timedelta) -> bool:
+        synced_at = _parse_time(self.meta.get('synced_at'))
+        return synced_at is not None and datetime.now(timezone.utc) - synced_at < max_age
+
+    def search(self, query_vector: np.ndarray, k: int, visibility: str) -> List[Dict]:
+        """
+        Cosine top-k over the whole matrix (rows and query are unit length).
+        External searches only see external passages; dead rows are skipped.
+        """
+        meta, vectors = self._state
+        if not len(meta['keys']):
+            return []
+
+        scores = np.asarray(vectors @ query_vector, dtype=np.float32)
+        allowed = np.fromiter(
+            (not p.get('dead') and (visibility == 'internal' or p['visibility'] == 'external')
+             for p in meta['passages']),
+            dtype=bool, count=len(scores)
+        )
+        scores = np.where(allowed, scores, -np.inf)
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [dict(meta['passages'][i], score=float(scores[i])) for i in top]
+
+
+_indexes_lock = threading.Lock()
+_indexes: Dict[tuple, ProjectIndex] = {}
+_update_locks: Dict[tuple, threading.Lock] = {}
+_running: set = set()  # index keys updating in the background in this worker
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_index(project_id: str, embedder=None) -> ProjectIndex:
+    """Get the (cached) index for a project and embedder, reloading if stale."""
+    embedder = embedder or get_embedder()
+    key = (str(project_id), embedder.name)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ProjectIndex(project_id, embedder)
+            _update_locks[key] = threading.Lock()
+    index.load()
+    return index
+
+
+def _freshness() -> timedelta:
+    return timedelta(minutes=settings.AI_FRESHNESS_SLA_MINUTES)
+
+
+def update_index(project_id: str, embedder=None, rebuild: bool = False,
+                 max_age: Optional[timedelta] = None) -> Dict:
+    """
+    Bring a project's index up to date with new or changed logs, PM entries
+    and emails.
+
+    Threads in a worker share one lock per index; gunicorn workers
+    serialize on a lock file next to the index.
+
+    Args:
+        project_id: Project ID
+        embedder: Embedder to use (default: get_embedder())
+        rebuild: Drop the index and embed everything again
+        max_age: Skip the update if the index was synced more recently than
+            this (checked under the lock, so queued updates don't repeat it)
+
+    Returns:
+        Dict with added, replaced and total (live) passage counts
+    """
+    embedder = embedder or get_embedder()
+    index = get_index(project_id, embedder)
+    key = (str(project_id), embedder.name)
+    added = replaced = 0
+
+    with _update_locks[key]:
+        os.makedirs(index.path, exist_ok=True)
+        with open(os.path.join(index.path, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if rebuild:
+                    # Searches keep using the mapped old files until save() swaps in the new index
+                    for name in os.listdir(index.path):
+                        if name.endswith('.f32') or name == 'meta.json':
+                            os.remove(os.path.join(index.path, name))
+                index.load()
+
+                if rebuild or max_age is None or not index.is_fresh(max_age):
+                    meta = index.edit(rebuild)
+                    synced_at = _parse_time(meta.get('synced_at'))
+                    since = (synced_at - SYNC_OVERLAP).isoformat() if synced_at else None
+
+                    started_at = datetime.now(timezone.utc).isoformat()
+                    added, replaced = index.upsert(meta, collect_passages(project_id, since))
+                    index.save(meta, started_at, index.compact(meta))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    return {'added': added, 'replaced': replaced, 'total': index.live_count}
+
+
+def _update_in_background(project_id: str, embedder) -> None:
+    key = (str(project_id), embedder.name)
+    try:
+        stats = update_index(project_id, embedder, max_age=_freshness())
+        if stats['added'] or stats['replaced']:
+            print(f"🗂️ Local index for {project_id}: {stats['added']} added, {stats['replaced']} replaced")
+    except Exception as e:
+        print(f"❌ Local index update failed for {project_id}: {e}")
+    finally:
+        with _indexes_lock:
+            _running.discard(key)
+
+
+def schedule_update(project_id: str, embedder=None) -> bool:
+    """
+    Update the project's index in the background unless this worker already is.
+
+    Returns:
+        True if an update was started
+    """
+    global _executor
+    embedder = embedder or get_embedder()
+    key = (str(project_id), embedder.name)
+    with _indexes_lock:
+        if key in _running:
+            return False
+        _running.add(key)
+        if _executor is None:
+            # Created on first use, after gunicorn has forked the worker
+            _executor = ThreadPoolExecutor(max_workers=UPDATE_MAX_WORKERS, thread_name_prefix="local-index")
+    _executor.submit(_update_in_background, project_id, embedder)
+    return True
+
+
+def ensure_fresh(project_id: str, embedder=None) -> bool:
+    """
+    Check a project's index before a chat and refresh it in the background
+    when it is older than AI_FRESHNESS_SLA_MINUTES.
+
+    Returns:
+        True if the index can answer now (possibly slightly stale), False
+        while its first build is running
+    """
+    embedder = embedder or get_embedder()
+    index = get_index(project_id, embedder)
+    if not index.is_fresh(_freshness()):
+        schedule_update(project_id, embedder)
+    return index.meta.get('synced_at') is not None
+
+
+def answer_question(project_id: str, client_name: str, question: str, visibility: str = 'external', k: int = DEFAULT_TOP_K) -> Dict:
+    """
+    Answer a project question from the local index with one chat completion.
+    The index is used as it is; see ensure_fresh() for keeping it current.
+
+    Returns:
+        Dict with response, sources and retrieval_stats
+    """
+    start_time = time.time()
+    embedder = get_embedder()
+
+    index = get_index(project_id, embedder)
+    search_start = time.time()
+    hits = index.search(embedder.embed([question])[0], k, visibility)
+    search_ms = int((time.time() - search_start) * 1000)
+
+    context = "\n\n".join(f"[{i + 1}] {hit['text'][:MAX_PASSAGE_CHARS]}" for i, hit in enumerate(hits))
+    audience = "the internal team" if visibility == 'internal' else "the client and partner teams"
+
+    client = openai_service.get_openai_client()
+    if not client:
+        raise Exception("OpenAI client not configured - check API key in settings")
+
+    completion_start = time.time()
+    response = client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[
+            {"role": "system", "content": f"""You are an AI assistant for the {client_name} project, answering for {audience}.
+Answer using only the numbered project excerpts below. If they do not contain the answer, say so.
+Be professional, concise, and helpful.
+
+PROJECT EXCERPTS:
+{context or 'No excerpts available.'}"""},
+            {"role": "user", "content": question}
+        ],
+        temperature=0.3
+    )
+    completion_ms = int((time.time() - completion_start) * 1000)
+
+    return {
+        'response': response.choices[0].message.content,
+        'sources': [
+            {'timestamp': hit.get('timestamp'), 'score': round(hit['score'], 4), 'excerpt': hit['text'][:200]}
+            for hit in hits
+        ],
+        'retrieval_stats': {
+            'embedder': embedder.name,
+            'passages_indexed': index.live_count,
+            'indexed_at': index.meta.get('synced_at'),
+            'search_ms': search_ms,
+            'completion_ms': completion_ms,
+            'total_ms': int((time.time() - start_time) * 1000)
+        }
+    }
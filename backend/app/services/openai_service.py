@@ -5,19 +5,76 @@ Handles creation, updates, and chat interactions with project-specific AI assist
 """
 from openai import OpenAI
 from app.core.supabase import db
+from app.services import vector_store_registry
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import threading
+import time
+
+
+# Re-read the key from app_settings at most this often, so a key changed
+# through another worker is picked up without a query on every call
+OPENAI_KEY_RECHECK_SECONDS = 300
+
+# Concurrent file uploads per upload_documents() call
+UPLOAD_MAX_WORKERS = 8
+
+# Assistant run polling: start fast, back off, give up before gunicorn's 120s timeout
+RUN_POLL_INITIAL_SECONDS = 0.25
+RUN_POLL_MAX_SECONDS = 2.0
+RUN_POLL_BACKOFF = 1.5
+RUN_DEADLINE_SECONDS = 90
+
+_client_lock = threading.Lock()
+_client: Optional[OpenAI] = None
+_client_key_hash: Optional[str] = None
+_key_checked_at = 0.0
+
+
+def _key_hash(api_key: str) -> str:
+    """Fingerprint an API key so the raw value is never used as a cache key."""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
 
 
 def get_openai_client():
-    """Get OpenAI client with API key from database settings."""
-    try:
-        result = db.table("app_settings").select("value").eq("key", "OPENAI_API_KEY").execute()
-        if result.data and result.data[0].get('value'):
-            return OpenAI(api_key=result.data[0]['value'])
-    except Exception as e:
-        print(f"❌ Failed to get OpenAI API key from database: {e}")
-    return None
+    """
+    Get the shared OpenAI client with API key from database settings.
+    
+    The client (and its HTTP connection pool) is cached per key version and
+    only rebuilt when the OPENAI_API_KEY setting changes.
+    """
+    global _client, _client_key_hash, _key_checked_at
+    
+    with _client_lock:
+        if time.time() - _key_checked_at < OPENAI_KEY_RECHECK_SECONDS:
+            return _client
+        
+        try:
+            result = db.table("app_settings").select("value").eq("key", "OPENAI_API_KEY").execute()
+            api_key = result.data[0].get('value') if result.data else None
+        except Exception as e:
+            print(f"❌ Failed to get OpenAI API key from database: {e}")
+            # Keep serving the last known client until the next check
+            return _client
+        
+        _key_checked_at = time.time()
+        
+        if not api_key:
+            _client, _client_key_hash = None, None
+        elif _key_hash(api_key) != _client_key_hash:
+            _client = OpenAI(api_key=api_key)
+            _client_key_hash = _key_hash(api_key)
+        
+        return _client
+
+
+def invalidate_openai_client() -> None:
+    """Force the next get_openai_client() call to re-read the key from app_settings."""
+    global _key_checked_at
+    with _client_lock:
+        _key_checked_at = 0.0
 
 
 def create_vector_store(name: str, description: str) -> str:
@@ -42,73 +99,199 @@ def create_vector_store(name: str, description: str) -> str:
     return vector_store.id
 
 
-def upload_messages_to_vector_store(store_id: str, messages: List[Dict]) -> None:
-    """
-    Upload Slack messages to a vector store.
-    
-    Args:
-        store_id: Vector store ID
-        messages: List of formatted Slack messages
-    """
-    from io import BytesIO
-    
-    client = get_openai_client()
-    if not client:
-        raise Exception("OpenAI client not configured - check API key in settings")
-    
-    # Format messages as text content
-    content = "\n\n---\n\n".join([
+def format_messages_for_upload(messages: List[Dict]) -> str:
+    """Format Slack messages as a single text document."""
+    return "\n\n---\n\n".join([
         f"**{msg['user']}** ({msg['timestamp']})\n{msg['text']}"
         for msg in messages
     ])
+
+
+def _create_file(client, filename: str, content: str) -> str:
+    """Upload text content as an assistants file and return its ID."""
+    from io import BytesIO
     
-    # Create a file-like object from the content
     file_obj = BytesIO(content.encode('utf-8'))
-    file_obj.name = 'slack_messages.txt'
+    file_obj.name = filename
     
-    # Create a file from the content
     file = client.files.create(
         file=file_obj,
         purpose='assistants'
     )
-    
-    # Add file to vector store
-    client.vector_stores.files.create(
-        vector_store_id=store_id,
-        file_id=file.id
-    )
+    return file.id
+
+
+def _remove_file(client, store_id: str, file_id: str) -> None:
+    """Detach a file from a vector store and delete it (best effort)."""
+    try:
+        client.vector_stores.files.delete(file_id=file_id, vector_store_id=store_id)
+    except Exception as e:
+        print(f"⚠️ Could not detach file {file_id} from {store_id}: {e}")
+    try:
+        client.files.delete(file_id)
+    except Exception as e:
+        print(f"⚠️ Could not delete file {file_id}: {e}")
 
 
-def upload_text_to_vector_store(store_id: str, text_content: str, filename: str) -> None:
+def _delete_unattached_file(client, file_id: str) -> None:
+    try:
+        client.files.delete(file_id)
+    except Exception as e:
+        print(f"⚠️ Could not delete file {file_id}: {e}")
+
+
+def upload_documents(documents: List[Dict], wait: bool = False) -> Dict[str, List[str]]:
     """
-    Upload text content to a vector store.
+    Upload many text documents to one or more vector stores in parallel.
+    
+    Documents with a doc_key are deduplicated against the upload registry:
+    unchanged content (same SHA-256) is skipped, and changed content replaces
+    the previously uploaded file instead of being added next to it.
+    
+    Files are created concurrently, then attached with one file batch per
+    vector store and attribute set (also concurrently).
     
     Args:
-        store_id: Vector store ID
-        text_content: Text content to upload
-        filename: Name for the file
+        documents: List of dicts with store_id, filename, content and optionally
+            doc_key (logical document identity), project_id and attributes
+            (file attributes for file_search filters, e.g. {"source": "pm"})
+        wait: Block until the vector stores have finished indexing the batches
+        
+    Returns:
+        Dict of store_id -> uploaded file IDs (skipped documents are not included)
     """
-    from io import BytesIO
+    documents = [d for d in documents if d.get('store_id') and d.get('content')]
+    
+    # Drop documents whose content is already in the store
+    registered = vector_store_registry.get_documents(
+        d['store_id'] for d in documents if d.get('doc_key')
+    )
+    pending = []
+    for doc in documents:
+        if doc.get('doc_key'):
+            doc = {**doc, 'content_hash': vector_store_registry.content_hash(doc['content'])}
+            existing = registered.get((doc['store_id'], doc['doc_key']))
+            if existing and existing['content_hash'] == doc['content_hash']:
+                continue
+        pending.append(doc)
+    
+    if not pending:
+        return {}
     
     client = get_openai_client()
     if not client:
         raise Exception("OpenAI client not configured - check API key in settings")
     
-    # Create a file-like object from the content
-    file_obj = BytesIO(text_content.encode('utf-8'))
-    file_obj.name = filename
+    workers = min(UPLOAD_MAX_WORKERS, len(pending))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        file_ids = list(executor.map(
+            lambda d: _create_file(client, d['filename'], d['content']),
+            pending
+        ))
     
-    # Create a file from the content
-    file = client.files.create(
-        file=file_obj,
-        purpose='assistants'
-    )
+    files_by_store = {}
+    batches = {}  # (store_id, attributes JSON) -> file IDs
+    for doc, file_id in zip(pending, file_ids):
+        files_by_store.setdefault(doc['store_id'], []).append(file_id)
+        attributes = json.dumps(doc.get('attributes') or {}, sort_keys=True)
+        batches.setdefault((doc['store_id'], attributes), []).append(file_id)
     
-    # Add file to vector store
-    client.vector_stores.files.create(
-        vector_store_id=store_id,
-        file_id=file.id
-    )
+    # Point the registry at the new files before attaching them, so a GC run
+    # never finds an attached file without its registry row
+    registry_rows = []
+    replaced = []
+    for doc, file_id in zip(pending, file_ids):
+        if not doc.get('doc_key'):
+            continue
+        registry_rows.append({
+            'project_id': doc.get('project_id'),
+            'store_id': doc['store_id'],
+            'doc_key': doc['doc_key'],
+            'file_id': file_id,
+            'content_hash': doc['content_hash'],
+            'filename': doc['filename']
+        })
+        existing = registered.get((doc['store_id'], doc['doc_key']))
+        if existing:
+            replaced.append((doc['store_id'], existing['file_id']))
+    
+    vector_store_registry.record_documents(registry_rows)
+    
+    def attach(batch_key):
+        store_id, attributes = batch_key
+        params = {"vector_store_id": store_id, "file_ids": batches[batch_key]}
+        if attributes != '{}':
+            params["attributes"] = json.loads(attributes)
+        try:
+            if wait:
+                batch = client.vector_stores.file_batches.create_and_poll(**params)
+                if batch.status != 'completed':
+                    print(f"⚠️ File batch {batch.id} for {store_id} finished as {batch.status}")
+            else:
+                client.vector_stores.file_batches.create(**params)
+        except Exception as e:
+            return e
+        return None
+    
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_MAX_WORKERS, len(batches))) as executor:
+        errors = dict(zip(batches, executor.map(attach, batches)))
+    failed = {f for key, error in errors.items() if error for f in batches[key]}
+    
+    if failed:
+        # Roll the registry back for documents that were not attached: the
+        # previous file stays current, new documents are uploaded again next sync
+        rollback = []
+        for row in registry_rows:
+            if row['file_id'] not in failed:
+                continue
+            existing = registered.get((row['store_id'], row['doc_key']))
+            if existing:
+                rollback.append({k: existing.get(k) for k in row})
+            else:
+                rollback.append({**row, 'content_hash': ''})
+        vector_store_registry.record_documents(rollback)
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_MAX_WORKERS, len(failed))) as executor:
+            list(executor.map(lambda f: _delete_unattached_file(client, f), failed))
+        raise next(error for error in errors.values() if error)
+    
+    if replaced:
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_MAX_WORKERS, len(replaced))) as executor:
+            list(executor.map(lambda r: _remove_file(client, *r), replaced))
+    
+    return files_by_store
+
+
+def upload_messages_to_vector_store(store_id: str, messages: List[Dict], wait: bool = False) -> None:
+    """
+    Upload Slack messages to a vector store.
+    
+    Args:
+        store_id: Vector store ID
+        messages: List of formatted Slack messages
+        wait: Block until the vector store has indexed the file
+    """
+    upload_documents([{
+        'store_id': store_id,
+        'filename': 'slack_messages.txt',
+        'content': format_messages_for_upload(messages)
+    }], wait=wait)
+
+
+def upload_text_to_vector_store(store_id: str, text_content: str, filename: str, wait: bool = False) -> None:
+    """
+    Upload text content to a vector store.
+    
+    Args:
+        store_id: Vector store ID
+        text_content: Text content to upload
+        filename: Name for the file
+        wait: Block until the vector store has indexed the file
+    """
+    upload_documents([{
+        'store_id': store_id,
+        'filename': filename,
+        'content': text_content
+    }], wait=wait)
 
 
 def create_assistant(
@@ -147,60 +330,43 @@ def create_assistant(
     return assistant.id
 
 
+class AssistantRunError(Exception):
+    """Raised when an assistant run ends in a non-completed state or times out."""
+    
+    def __init__(self, message: str, status: str, stats: Optional[Dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.stats = stats or {}
+
+
 def chat_with_assistant(
     assistant_id: str,
     thread_id: Optional[str],
-    message: str
+    message: str,
+    deadline_seconds: float = RUN_DEADLINE_SECONDS
 ) -> Dict:
     """
     Send a message to an assistant and get a response.
     
+    The run is driven by assistant_runner's event loop, which polls it with
+    adaptive backoff (quick at first, up to RUN_POLL_MAX_SECONDS) and cancels
+    it at the deadline; only the calling request thread waits.
+    
     Args:
         assistant_id: Assistant ID
         thread_id: Existing thread ID (None to create new)
         message: User message
+        deadline_seconds: Hard limit on the run's wait time
         
     Returns:
-        Dict with thread_id and response
+        Dict with thread_id, response and run_stats (status, poll_count, wait_ms)
+        
+    Raises:
+        AssistantRunError: If the run fails, expires, is cancelled, needs tool
+            output we don't provide, or misses the deadline
     """
-    client = get_openai_client()
-    if not client:
-        raise Exception("OpenAI client not configured - check API key in settings")
-    
-    # Create or use existing thread
-    if not thread_id:
-        thread = client.beta.threads.create()
-        thread_id = thread.id
-    
-    # Add message to thread
-    client.beta.threads.messages.create(
-        thread_id=thread_id,
-        role="user",
-        content=message
-    )
-    
-    # Run the assistant
-    run = client.beta.threads.runs.create(
-        thread_id=thread_id,
-        assistant_id=assistant_id
-    )
-    
-    # Wait for completion
-    while run.status in ['queued', 'in_progress']:
-        run = client.beta.threads.runs.retrieve(
-            thread_id=thread_id,
-            run_id=run.id
-        )
-    
-    # Get the response
-    messages = client.beta.threads.messages.list(thread_id=thread_id)
-    latest_message = messages.data[0]
-    response_text = latest_message.content[0].text.value
-    
-    return {
-        "thread_id": thread_id,
-        "response": response_text
-    }
+    from app.services import assistant_runner  # imports this module
+    return assistant_runner.run_assistant(assistant_id, thread_id, message, deadline_seconds)
 
 
 def delete_vector_store(store_id: str) -> None:
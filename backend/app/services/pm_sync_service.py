@@ -31,6 +31,7 @@ def sync_pm_data(project_id: str, last_sync: Optional[str] = None) -> List[Dict]
     # 1. Project basic info
     pm_data.append({
         'type': 'project_info',
+        'id': 'project_info',
         'content': f"""Project: {p.get('client_name')}
 Status: {p.get('category', 'Unknown')}
 Launch Date: {p.get('launch_date', 'Not set')}
@@ -76,6 +77,7 @@ Developer: {p.get('developer', 'Not assigned')}""",
             if content_parts:
                 pm_data.append({
                     'type': 'pm_report',
+                    'id': f"report:{report.get('id')}",
                     'content': f"""Date: {report.get('created_at', 'Unknown')}
 PM: {report.get('created_by', 'Unknown')}
 
@@ -0,0 +1,345 @@
+# backend/app/services/project_ai.py
+"""
+Per-project AI resources.
+
+Two layouts exist side by side:
+  - legacy: one vector store and one assistant per source (internal,
+    external, PM, email), eight create calls per project
+  - consolidated: one vector store per project whose files carry a
+    "source" attribute; chat goes through the Responses API with a
+    file_search filter, so visibility is enforced per request and no
+    per-project assistant object is needed (one create call per project)
+
+New projects get the consolidated layout when AI_CONSOLIDATED_LAYOUT is on
+(needs migration 031). Existing projects keep their layout until re-initialized.
+"""
+from app.core.config import settings
+from app.core.supabase import db
+from app.services import openai_service, project_snapshot, knowledge_service
+from app.services.knowledge_service import CONSOLIDATED_STORE_COLUMN, SOURCE_STORES
+from app.services.openai_service import RUN_DEADLINE_SECONDS
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+import time
+
+# Name suffix of consolidated stores (also used by the garbage collector)
+CONSOLIDATED_STORE_SUFFIX = ' - Knowledge'
+
+PROJECT_AI_MODEL = "gpt-4o-mini"
+
+# Sources each chat visibility may search
+VISIBLE_SOURCES = {
+    'internal': ['internal', 'external', 'pm', 'email'],
+    'external': ['external']
+}
+
+SOURCE_DESCRIPTIONS = {
+    'internal': "internal team Slack communications",
+    'external': "external Slack communications with clients and the Shopline team",
+    'pm': "PM notes, blockers, updates, URLs, launch dates and all PM inputs",
+    'email': "email communications"
+}
+
+
+def uses_consolidated_layout(project: Dict) -> bool:
+    return bool(project.get(CONSOLIDATED_STORE_COLUMN))
+
+
+def is_initialized(project: Dict) -> bool:
+    """Whether the project has all of its AI resources in either layout."""
+    return uses_consolidated_layout(project) or all(project.get(c) for c in LEGACY_COLUMNS)
+
+
+def is_usable(project: Dict) -> bool:
+    """
+    Whether chat and sync work: a consolidated store, or at least the internal
+    and external resources. Projects initialized before the PM and email
+    stores existed have only those until global sync (or /ai/initialize)
+    completes them.
+    """
+    return uses_consolidated_layout(project) or all(project.get(c) for c in CORE_COLUMNS)
+
+
+def _strict_instructions(project_name: str, knowledge: str, contents: str, citation: str, tone: str) -> str:
+    return f"""You are an AI assistant EXCLUSIVELY for the {project_name} project.
+
+IMPORTANT RULES:
+1. You can ONLY answer questions about {project_name}.
+2. If asked about ANY other project, respond: "I only have access to {project_name} data. I cannot answer about other projects."
+3. If the question is unclear or ambiguous, ASK clarifying questions before answering.
+4. ONLY use information from your assigned knowledge base ({knowledge} for {project_name}).
+5. {citation}
+6. If you don't have information, say "I don't have that information in my knowledge base" - NEVER make up answers.
+
+Your knowledge base contains: {contents} for {project_name}.
+
+{tone} and always verify you're answering about the correct project."""
+
+
+def project_instructions(project_name: str, visibility: str) -> str:
+    """Instructions for a consolidated-layout chat at the given visibility."""
+    sources = VISIBLE_SOURCES.get(visibility, VISIBLE_SOURCES['external'])
+    contents = "; ".join(SOURCE_DESCRIPTIONS[s] for s in sources)
+    return _strict_instructions(
+        project_name,
+        contents,
+        contents[0].upper() + contents[1:],
+        "Always cite the source (date, person, channel, email subject or PM report) when providing information.",
+        "Be helpful, professional," if visibility == 'internal' else "Be professional, client-focused,"
+    )
+
+
+# Per-source resources of the legacy layout
+LEGACY_SOURCES = {
+    'internal': {
+        'store_suffix': " - Internal",
+        'store_description': "Internal Slack communications for {name}",
+        'assistant_suffix': " - Internal Assistant",
+        'knowledge': "internal Slack communications",
+        'contents': "Internal team Slack communications",
+        'citation': "Always cite the source (date, person, channel) when providing information.",
+        'tone': "Be helpful, professional,"
+    },
+    'external': {
+        'store_suffix': " - External",
+        'store_description': "External Slack communications for {name}",
+        'assistant_suffix': " - External Assistant",
+        'knowledge': "external Slack communications",
+        'contents': "External Slack communications with clients and Shopline team",
+        'citation': "Always cite the source (date, person, channel) when providing information.",
+        'tone': "Be professional, client-focused,"
+    },
+    'pm': {
+        'store_suffix': " - Internal-Project-Management",
+        'store_description': "PM data: notes, blockers, updates, URLs, launch dates for {name}",
+        'assistant_suffix': " - PM Assistant",
+        'knowledge': "PM data",
+        'contents': "PM notes, blockers, updates, URLs, launch dates, and all PM inputs",
+        'citation': "Always cite specific dates, PM names, and report details when providing information.",
+        'tone': "Be detailed, reference specific dates and updates,"
+    },
+    'email': {
+        'store_suffix': " - Emails",
+        'store_description': "Email communications for {name}",
+        'assistant_suffix': " - Email Assistant",
+        'knowledge': "emails",
+        'contents': "Email communications",
+        'citation': "Always cite the email sender, date, and subject when providing information.",
+        'tone': "Be professional, reference specific emails,"
+    }
+}
+
+LEGACY_COLUMNS = [
+    column
+    for source in LEGACY_SOURCES
+    for column in (SOURCE_STORES[source], f"{source}_assistant_id")
+]
+CORE_COLUMNS = [c for c in LEGACY_COLUMNS if c.startswith(('internal_', 'external_'))]
+
+# Columns is_initialized() / is_usable() read, for narrow selects
+AI_COLUMNS = ", ".join(LEGACY_COLUMNS + [CONSOLIDATED_STORE_COLUMN])
+
+# Projects provisioned at once by initialize_projects(); each runs up to 4 create chains
+PROVISION_MAX_WORKERS = 8
+
+
+def _record(project_id: str, column: str, resource_id: str, delete: Callable[[str], None]) -> str:
+    """
+    Save a created resource ID right away, unless another initializer already
+    filled the column; then ours is deleted and theirs is used.
+    """
+    result = db.table("projects").update({column: resource_id}).eq("id", project_id).is_(column, "null").execute()
+    if result.data:
+        return resource_id
+
+    try:
+        delete(resource_id)
+    except Exception as e:
+        print(f"⚠️ Could not delete duplicate {column} {resource_id}: {e}")
+    current = db.table("projects").select(column).eq("id", project_id).execute()
+    if not current.data or not current.data[0].get(column):
+        raise Exception(f"Could not record {column} for project {project_id}")
+    return current.data[0][column]
+
+
+def _provision_source(project: Dict, source: str) -> Dict[str, str]:
+    """Store then assistant for one source, skipping whatever already exists."""
+    spec = LEGACY_SOURCES[source]
+    project_name = project.get('client_name', 'Unknown')
+    store_column = SOURCE_STORES[source]
+    assistant_column = f"{source}_assistant_id"
+
+    store_id = project.get(store_column)
+    if not store_id:
+        store_id = _record(project['id'], store_column, openai_service.create_vector_store(
+            name=f"{project_name}{spec['store_suffix']}",
+            description=spec['store_description'].format(name=project_name)
+        ), openai_service.delete_vector_store)
+
+    assistant_id = project.get(assistant_column)
+    if not assistant_id:
+        # STRICT project-specific instructions
+        assistant_id = _record(project['id'], assistant_column, openai_service.create_assistant(
+            name=f"{project_name}{spec['assistant_suffix']}",
+            instructions=_strict_instructions(
+                project_name, spec['knowledge'], spec['contents'], spec['citation'], spec['tone']
+            ),
+            vector_store_id=store_id
+        ), openai_service.delete_assistant)
+
+    return {store_column: store_id, assistant_column: assistant_id}
+
+
+def _provision_legacy(project: Dict) -> Dict[str, str]:
+    """Four stores and four assistants, one chain per source, run concurrently."""
+    with ThreadPoolExecutor(max_workers=len(LEGACY_SOURCES)) as executor:
+        futures = [executor.submit(_provision_source, project, source) for source in LEGACY_SOURCES]
+    fields = {}
+    for future in futures:
+        fields.update(future.result())  # re-raises the first failure; finished chains stay recorded
+    return fields
+
+
+def _provision_consolidated(project: Dict) -> Dict[str, str]:
+    """One store for every source; files are tagged with their source on upload."""
+    store_id = project.get(CONSOLIDATED_STORE_COLUMN)
+    if not store_id:
+        project_name = project.get('client_name', 'Unknown')
+        store_id = _record(project['id'], CONSOLIDATED_STORE_COLUMN, openai_service.create_vector_store(
+            name=f"{project_name}{CONSOLIDATED_STORE_SUFFIX}",
+            description=f"Slack, PM and email knowledge for {project_name}, tagged by source"
+        ), openai_service.delete_vector_store)
+    return {CONSOLIDATED_STORE_COLUMN: store_id}
+
+
+def _provision(project: Dict) -> Dict[str, str]:
+    """
+    Create the project's missing AI resources and mark it initialized.
+    A partially initialized legacy project is completed in the legacy layout.
+    """
+    if any(project.get(c) for c in LEGACY_COLUMNS) or not settings.AI_CONSOLIDATED_LAYOUT:
+        fields = _provision_legacy(project)
+    else:
+        fields = _provision_consolidated(project)
+
+    db.table("projects").update({"sync_status": "initialized"}).eq("id", project['id']).execute()
+    return fields
+
+
+def initialize_project(project: Dict) -> Dict[str, str]:
+    """
+    Create the project's AI resources in the configured layout and save their IDs.
+
+    Creates run concurrently and every ID is saved as soon as it exists, so
+    calling this again after a failure resumes where it stopped.
+
+    Args:
+        project: Project row (needs id, client_name and the AI resource columns)
+
+    Returns:
+        Dict of the project's AI resource columns
+    """
+    fields = _provision(project)
+    project_snapshot.refresh_project(project['id'])
+    return fields
+
+
+def initialize_projects(projects: List[Dict]) -> Dict[str, object]:
+    """
+    Initialize many projects concurrently (bounded by PROVISION_MAX_WORKERS).
+
+    Returns:
+        Dict of project_id -> resource columns, or the exception it failed with
+    """
+    if not projects:
+        return {}
+
+    def provision(project):
+        try:
+            return _provision(project)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(PROVISION_MAX_WORKERS, len(projects))) as executor:
+        results = dict(zip([p['id'] for p in projects], executor.map(provision, projects)))
+
+    project_snapshot.refresh_projects(results)
+    return results
+
+
+def sync_knowledge(project: Dict) -> Tuple[Dict[str, int], Dict[str, List[str]]]:
+    """
+    Upload the project's changed shards for every source and stamp the sync time.
+    The stamp is written even when nothing changed: it records how fresh the
+    knowledge is (see ai_warmup).
+
+    Args:
+        project: Current project row including its AI resource columns
+
+    Returns:
+        (per-source item counts, store_id -> uploaded file IDs)
+    """
+    # Build month shards for every source that has a store, then upload the
+    # changed ones as one parallel batch
+    sources = [s for s in SOURCE_STORES if knowledge_service.store_for(project, s)]
+    documents, counts = knowledge_service.build_project_documents(project, sources=sources)
+    uploaded = openai_service.upload_documents(documents)
+
+    synced_at = datetime.now(timezone.utc).isoformat()
+    db.table("projects").update({
+        "last_sync_internal": synced_at,
+        "last_sync_external": synced_at,
+        "sync_status": "synced"
+    }).eq("id", project['id']).execute()
+    project_snapshot.refresh_project(project['id'])
+    return counts, uploaded
+
+
+def source_filter(visibility: str) -> Optional[Dict]:
+    """file_search filter for a visibility (None means every source)."""
+    sources = VISIBLE_SOURCES.get(visibility, VISIBLE_SOURCES['external'])
+    if len(sources) == len(SOURCE_DESCRIPTIONS):
+        return None
+    filters = [{"type": "eq", "key": "source", "value": s} for s in sources]
+    return filters[0] if len(filters) == 1 else {"type": "or", "filters": filters}
+
+
+def chat(project: Dict, visibility: str, message: str, previous_response_id: Optional[str] = None) -> Dict:
+    """
+    Answer a question from a consolidated-layout project store.
+
+    One Responses API call searches the project's store, restricted to the
+    sources the visibility allows; previous_response_id continues a
+    conversation (it plays the role of the legacy thread_id).
+
+    Returns:
+        Dict with thread_id (the response ID), response and run_stats
+    """
+    client = openai_service.get_openai_client()
+    if not client:
+        raise Exception("OpenAI client not configured - check API key in settings")
+
+    tool = {"type": "file_search", "vector_store_ids": [project[CONSOLIDATED_STORE_COLUMN]]}
+    filters = source_filter(visibility)
+    if filters:
+        tool["filters"] = filters
+
+    start_time = time.time()
+    response = client.with_options(timeout=RUN_DEADLINE_SECONDS).responses.create(
+        model=PROJECT_AI_MODEL,
+        instructions=project_instructions(project.get('client_name', 'Unknown'), visibility),
+        input=message,
+        tools=[tool],
+        previous_response_id=previous_response_id
+    )
+
+    return {
+        "thread_id": response.id,
+        "response": response.output_text,
+        "run_stats": {
+            "status": response.status,
+            "poll_count": 0,
+            "wait_ms": int((time.time() - start_time) * 1000)
+        }
+    }
@@ -0,0 +1,293 @@
+# backend/app/services/project_query.py
+"""
+Deterministic answers for structured questions about the project list:
+counts and lists by PM or developer, by stage, blocked projects and
+launches in a date window. They are computed from the project snapshot
+instead of asking the LLM to count rows in a prompt; anything else
+(open-ended questions, questions about one project, questions with a
+word no recognized cue accounts for) returns None and goes to the LLM.
+"""
+from app.services.context_builder import STAGE_KEYWORDS, has_blocker, match_stage
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import re
+import threading
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+COUNT_CUES = ('how many', 'number of', 'count', 'total')
+LIST_CUES = ('list', 'which', 'show', 'what projects', 'what are the', 'name the', 'give me', 'any')
+BREAKDOWN_CUES = ('per pm', 'per owner', 'per developer', 'per dev', 'each pm', 'each owner',
+                  'each developer', 'by pm', 'by owner', 'by developer', 'each person', 'per person')
+
+# Questions that need judgement or prose rather than a count
+OPEN_ENDED_CUES = ('why', 'how come', 'explain', 'summar', 'recommend', 'should', 'status of',
+                   'update on', 'tell me about', 'detail', 'what happened', 'latest')
+
+PROJECT_WORDS = {'project', 'projects', 'client', 'clients', 'account', 'accounts', 'merchant', 'merchants'}
+BLOCKER_WORDS = {'blocked', 'blocker', 'blockers', 'blocking'}
+LAUNCH_WORDS = ('launch', 'go live', 'going live', 'goes live')
+DEVELOPER_WORDS = {'developer', 'developers', 'dev', 'devs', 'develop', 'develops', 'developed', 'developing',
+                   'build', 'builds', 'building'}
+OWNER_WORDS = {'pm', 'pms', 'owner', 'owners', 'manager', 'managers', 'manage', 'manages', 'managed', 'managing',
+               'own', 'owns'}
+
+# Words that carry no filter of their own. Every other word in the question
+# must be used by a recognized cue, or the question goes to the LLM: an
+# unrecognized word ("budget", "waiting", "not", "September") is a filter or
+# attribute this router can't apply, and answering without it would look
+# exact but be wrong.
+FILLER_WORDS = {'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'do', 'does', 'did', 'have', 'has', 'there',
+                'of', 'in', 'on', 'for', 'to', 'at', 'with', 'by', 'under', 'and', 'all', 'currently', 'now',
+                'right', 'still', 'me', 'us', 'i', 'we', 'our', 'what', 'which', 'how', 'many', 'that', 'who',
+                'whose', 'stage', 'please', 'can', 'you'}
+
+# Words that never identify a person, even if they occur in a name field
+NON_NAME_WORDS = {'the', 'and', 'team', 'unassigned', 'none', 'tbd', 'not', 'set'} | PROJECT_WORDS | DEVELOPER_WORDS | OWNER_WORDS
+
+LAUNCH_FIELDS = [('launch_date_public', 'public'), ('launch_date_internal', 'internal')]
+
+# Window for "upcoming" / "soon" launch questions
+UPCOMING_DAYS = 14
+
+_lock = threading.Lock()
+_index = {'version': None, 'people': {}}
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall((text or '').lower())
+
+
+def _has_cue(question: str, words: set, cues: Tuple[str, ...]) -> bool:
+    """Phrases match anywhere, single words only as whole words ("count" is not in "account")."""
+    return any((cue in question) if ' ' in cue else (cue in words) for cue in cues)
+
+
+def _people_index(projects: List[Dict], version: str) -> Dict[str, Dict[str, set]]:
+    """field (owner/developer) -> name word -> full names containing it, cached per snapshot version."""
+    with _lock:
+        if _index['version'] == version:
+            return _index['people']
+
+    people = {'owner': {}, 'developer': {}}
+    for p in projects:
+        for field in people:
+            value = (p.get(field) or '').strip()
+            for word in _words(value):
+                if len(word) > 2 and word not in NON_NAME_WORDS:
+                    people[field].setdefault(word, set()).add(value)
+
+    with _lock:
+        _index.update(version=version, people=people)
+    return people
+
+
+def _mentioned_people(words: set, people: Dict[str, Dict[str, set]]) -> List[Tuple[str, str, set]]:
+    """
+    People the question names, as (field, label, full names) - e.g. "Leo"
+    covers both "Leo Peng" and "Leo". Name words that only narrow another
+    mentioned word ("peng" in "Leo Peng") are folded into it.
+    """
+    if words & DEVELOPER_WORDS:
+        fields = ['developer']
+    elif words & OWNER_WORDS:
+        fields = ['owner']
+    else:
+        fields = ['owner', 'developer']
+
+    hits = []
+    for word in sorted(words):
+        for field in fields:
+            if word in people[field]:
+                hits.append((field, people[field][word]))
+                break
+
+    mentioned = []
+    for field, names in hits:
+        if any(f == field and names < other for f, other in hits):
+            continue
+        if any(f == field and names == other for f, _, other in mentioned):
+            continue
+        mentioned.append((field, max(names, key=len), names))
+    return mentioned
+
+
+def _cue_words(question: str, words: set, cues) -> set:
+    """Words of the cues the question uses."""
+    return {w for cue in cues if ((cue in question) if ' ' in cue else (cue in words)) for w in _words(cue)}
+
+
+def _unused_words(q: str, words: set, stage: Optional[str], blockers: bool, window, people,
+                  people_index, wants_breakdown: bool) -> set:
+    """Words of the question that no recognized cue or filter accounts for."""
+    used = FILLER_WORDS | (words & PROJECT_WORDS)
+    used |= _cue_words(q, words, COUNT_CUES) | _cue_words(q, words, LIST_CUES) | _cue_words(q, words, BREAKDOWN_CUES)
+    if blockers:
+        used |= words & BLOCKER_WORDS
+    if stage:
+        used |= _cue_words(q, words, dict(STAGE_KEYWORDS)[stage])
+    if window:
+        used |= set(_words(window[3])) | {w for w in words if w.startswith('launch')} | _cue_words(q, words, LAUNCH_WORDS)
+    if people:
+        used |= {w for w in words for field, _, names in people if people_index[field].get(w, set()) & names}
+    # Role words only mean something next to a person, or as the breakdown field
+    if people or wants_breakdown:
+        used |= words & (OWNER_WORDS | DEVELOPER_WORDS)
+    return words - used
+
+
+def _parse_date(value) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _launch_window(question: str, today: date) -> Optional[Tuple[date, date, str, str]]:
+    """Date range a launch question asks about, if any, as (start, end, label, matched phrase)."""
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+
+    if 'today' in question:
+        return today, today, 'today', 'today'
+    if 'tomorrow' in question:
+        return today + timedelta(days=1), today + timedelta(days=1), 'tomorrow', 'tomorrow'
+    if 'next week' in question:
+        return week_start + timedelta(days=7), week_start + timedelta(days=13), 'next week', 'next week'
+    if 'this week' in question:
+        return week_start, week_start + timedelta(days=6), 'this week', 'this week'
+    if 'next month' in question:
+        return (next_month_start, (next_month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1),
+                'next month', 'next month')
+    if 'this month' in question:
+        return month_start, next_month_start - timedelta(days=1), 'this month', 'this month'
+    days = re.search(r'next (\d+) days', question)
+    if days:
+        return today, today + timedelta(days=int(days.group(1))), f"in the next {days.group(1)} days", days.group()
+    for word in ('upcoming', 'soon'):
+        if word in question:
+            return today, today + timedelta(days=UPCOMING_DAYS), f"in the next {UPCOMING_DAYS} days", word
+    return None
+
+
+def _launch_in(project: Dict, start: date, end: date) -> Optional[Tuple[date, str]]:
+    for field, label in LAUNCH_FIELDS:
+        launch = _parse_date(project.get(field))
+        if launch and start <= launch <= end:
+            return launch, label
+    return None
+
+
+def _project_line(project: Dict, blockers: bool, window) -> str:
+    parts = [project.get('category') or 'No stage', f"PM: {project.get('owner') or 'Unassigned'}"]
+    if project.get('developer'):
+        parts.append(f"Dev: {project['developer']}")
+    if window:
+        launch, label = _launch_in(project, window[0], window[1])
+        parts.append(f"launch ({label}): {launch.isoformat()}")
+    if blockers:
+        parts.append(f"blocker: {project.get('blocker')}")
+    return f"- {project.get('client_name') or 'Unnamed'} — " + "; ".join(parts)
+
+
+def _describe(stage: Optional[str], blockers: bool, window, person: Optional[Tuple[str, str, set]]) -> str:
+    text = ""
+    if blockers:
+        text += " blocked"
+    if stage:
+        text += f" in stage \"{stage}\""
+    if window:
+        text += f" launching {window[2]} ({window[0].isoformat()} to {window[1].isoformat()})"
+    if person:
+        text += f" with {'PM' if person[0] == 'owner' else 'developer'} {person[1]}"
+    return text
+
+
+def answer(question: str, projects: List[Dict], version: str, today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Answer a structured question about the project list exactly.
+
+    Args:
+        question: The user's question
+        projects: Project rows (e.g. project_snapshot.get_projects())
+        version: Snapshot version, for the cached people index
+        today: Reference date for launch windows (default: today)
+
+    Returns:
+        Dict with response (markdown) and intent, or None when the question
+        should go to the LLM
+    """
+    q = ' '.join((question or '').lower().split())
+    words = set(_words(q))
+    if not q or any(cue in q for cue in OPEN_ENDED_CUES):
+        return None
+
+    # A question about a named project needs that project's details
+    if any(len(name) > 2 and name in q for name in ((p.get('client_name') or '').lower() for p in projects)):
+        return None
+
+    today = today or date.today()
+    window = _launch_window(q, today) if any(w in q for w in LAUNCH_WORDS) else None
+    blockers = bool(words & BLOCKER_WORDS)
+    ignore = ('blocked', 'blocker') + (('live',) if window else ())
+    stage = match_stage(q, words, ignore=ignore)
+    people_index = _people_index(projects, version)
+    people = _mentioned_people(words, people_index)
+
+    wants_count = _has_cue(q, words, COUNT_CUES)
+    wants_breakdown = _has_cue(q, words, BREAKDOWN_CUES)
+    wants_list = _has_cue(q, words, LIST_CUES)
+    has_filter = bool(window or blockers or stage or people)
+
+    if not (wants_count or wants_list or wants_breakdown or window):
+        return None
+    if not (words & PROJECT_WORDS or window or blockers):
+        return None  # e.g. "how many messages did Leo send"
+    if not has_filter and not wants_breakdown and not (wants_count and words & PROJECT_WORDS):
+        return None
+    if _unused_words(q, words, stage, blockers, window, people, people_index, wants_breakdown):
+        return None
+
+    # Filters other than people
+    matched = [
+        p for p in projects
+        if (not blockers or has_blocker(p))
+        and (not stage or p.get('category') == stage)
+        and (not window or _launch_in(p, window[0], window[1]))
+    ]
+    matched.sort(key=lambda p: (p.get('client_name') or '').lower())
+
+    sections = []
+    intent = {
+        'action': 'breakdown' if wants_breakdown else 'count' if wants_count else 'list',
+        'filters': {
+            'stage': stage,
+            'blocked': blockers,
+            'launch_window': [window[0].isoformat(), window[1].isoformat()] if window else None,
+            'people': [label for _, label, _ in people]
+        }
+    }
+
+    if wants_breakdown and not people:
+        field = 'developer' if words & DEVELOPER_WORDS else 'owner'
+        counts = {}
+        for p in matched:
+            name = (p.get(field) or '').strip() or 'Unassigned'
+            counts[name] = counts.get(name, 0) + 1
+        title = 'PM' if field == 'owner' else 'developer'
+        lines = [f"**{len(matched)}** project(s){_describe(stage, blockers, window, None)} by {title}:"]
+        lines += [f"- {name}: {count}" for name, count in sorted(counts.items(), key=lambda nc: (-nc[1], nc[0]))]
+        sections.append("\n".join(lines))
+        intent['matched'] = len(matched)
+    else:
+        groups = [(person, [p for p in matched if (p.get(person[0]) or '').strip() in person[2]]) for person in people] or [(None, matched)]
+        for person, group in groups:
+            header = f"**{len(group)}** project(s){_describe(stage, blockers, window, person)}"
+            if not group:
+                sections.append(header + ".")
+                continue
+            sections.append(header + ":\n" + "\n".join(_project_line(p, blockers, window) for p in group))
+        intent['matched'] = sum(len(group) for _, group in groups)
+
+    return {'response': "\n\n".join(sections), 'intent': intent}
@@ -0,0 +1,287 @@
+# backend/app/services/project_snapshot.py
+"""
+Versioned in-process snapshot of every project row plus its preformatted
+context cells, shared by AI chat and report generation.
+
+Writers call refresh_project() for the project they touched; that reloads
+the one row locally and appends it to a change log kept in app_settings
+(PROJECT_SNAPSHOT_VERSION). Other workers poll that key every few seconds
+and reload only the projects that changed since their version.
+"""
+from app.core.supabase import db
+from app.services import context_builder
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import threading
+import time
+
+VERSION_SETTING_KEY = "PROJECT_SNAPSHOT_VERSION"
+
+# How often a worker checks the shared version for changes made elsewhere
+SNAPSHOT_POLL_SECONDS = 5
+
+# Full reload interval, a safety net for writes that skip refresh_project()
+SNAPSHOT_MAX_AGE_SECONDS = 10 * 60
+
+# Change log entries kept in app_settings; workers further behind reload fully
+CHANGE_LOG_SIZE = 100
+
+# Compare-and-swap attempts when workers publish at the same time
+PUBLISH_RETRIES = 5
+
+_lock = threading.RLock()
+_sync_lock = threading.Lock()  # one poll per worker at a time; never taken while holding _lock
+_projects: Dict[str, Dict] = {}  # project_id -> {"row": dict, "cells": dict}
+_version = 0
+_generation = 0  # bumped on every local change, including safety-net reloads
+_loaded_at = 0.0
+_checked_at = 0.0
+
+
+def _entry(row: Dict) -> Dict:
+    return {"row": row, "cells": context_builder.format_cells(row)}
+
+
+def _read_shared_value() -> Tuple[Optional[str], Dict]:
+    """The raw app_settings value (None if the row is missing) and its parsed state."""
+    result = db.table("app_settings").select("value").eq("key", VERSION_SETTING_KEY).execute()
+    if not result.data:
+        return None, {"version": 0, "changes": []}
+    raw = result.data[0]['value']
+    try:
+        return raw, json.loads(raw)
+    except (TypeError, ValueError):
+        return raw, {"version": 0, "changes": []}
+
+
+def _read_shared_state() -> Dict:
+    return _read_shared_value()[1]
+
+
+def _fetch_all() -> List[Dict]:
+    return db.table("projects").select("*").execute().data or []
+
+
+def _apply_all(rows: List[Dict], version: int) -> None:
+    """Replace the snapshot (caller holds _lock)."""
+    global _projects, _version, _loaded_at, _generation
+    _projects = {row['id']: _entry(row) for row in rows}
+    _generation += 1
+    _version = version
+    _loaded_at = time.time()
+    print(f"🗂️ Loaded project snapshot v{version}: {len(rows)} projects")
+
+
+def _fetch_rows(project_ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+    """project_id -> current row, or None if the project was deleted."""
+    project_ids = list(dict.fromkeys(p for p in project_ids if p))
+    if not project_ids:
+        return {}
+    rows = db.table("projects").select("*").in_("id", project_ids).execute().data or []
+    found = {row['id']: row for row in rows}
+    return {project_id: found.get(project_id) for project_id in project_ids}
+
+
+def _apply_rows(rows: Dict[str, Optional[Dict]]) -> None:
+    """Update or drop the given projects (caller holds _lock)."""
+    global _generation
+    if not rows:
+        return
+    _generation += 1
+    for project_id, row in rows.items():
+        if row:
+            _projects[project_id] = _entry(row)
+        else:
+            _projects.pop(project_id, None)  # deleted
+
+
+def _due(now: float) -> bool:
+    """Whether the snapshot should be loaded or checked against the shared version (caller holds _lock)."""
+    return not _loaded_at or now - _checked_at >= SNAPSHOT_POLL_SECONDS or now - _loaded_at >= SNAPSHOT_MAX_AGE_SECONDS
+
+
+def _sync() -> None:
+    """
+    Load or catch up the snapshot. Database reads happen outside _lock, so
+    readers are never stuck behind a Supabase round-trip: one thread polls
+    while the others keep serving the current copy (only a worker with no
+    snapshot yet waits for the first load). Results are applied only if
+    _version has not moved meanwhile; otherwise the next poll starts over.
+    """
+    global _version, _checked_at
+    with _lock:
+        if not _due(time.time()):
+            return
+        cold = not _loaded_at
+
+    if not _sync_lock.acquire(blocking=cold):
+        return
+    try:
+        with _lock:
+            now = time.time()
+            if not _due(now):
+                return
+            since = _version
+            full = not _loaded_at or now - _loaded_at >= SNAPSHOT_MAX_AGE_SECONDS
+
+        try:
+            shared = _read_shared_state()
+        except Exception as e:
+            print(f"⚠️ Could not read project snapshot version: {e}")
+            shared = None
+
+        rows = None
+        if not full and shared and shared['version'] != since:
+            changes = [c for c in shared.get('changes', []) if c['version'] > since]
+            oldest = min((c['version'] for c in shared.get('changes', [])), default=shared['version'])
+            if shared['version'] < since or oldest > since + 1 or any(c.get('project_id') is None for c in changes):
+                # Fell behind the change log (or a full invalidation was requested)
+                full = True
+            else:
+                rows = _fetch_rows(c['project_id'] for c in changes)
+        all_rows = _fetch_all() if full else None
+
+        with _lock:
+            _checked_at = now
+            if _version != since:
+                return  # a local write adopted a newer version meanwhile
+            if all_rows is not None:
+                _apply_all(all_rows, shared['version'] if shared else since)
+            elif rows is not None:
+                _apply_rows(rows)
+                _version = shared['version']
+    finally:
+        _sync_lock.release()
+
+
+def _publish(project_ids: List[Optional[str]]) -> Tuple[int, List[Dict]]:
+    """
+    Append changes to the shared log. The write only succeeds if the log is
+    unchanged since it was read (compare-and-swap on the value), so two
+    workers publishing at once can't both claim a version and drop the
+    other's changes; the loser re-reads and tries again.
+
+    Returns:
+        (the new version, the log entries that were there before ours)
+    """
+    for _ in range(PUBLISH_RETRIES):
+        raw, shared = _read_shared_value()
+        version = max(shared['version'], _version) + 1
+        new_changes = [{"version": version, "project_id": project_id} for project_id in project_ids]
+        value = json.dumps({
+            "version": version,
+            "changes": (shared.get('changes', []) + new_changes)[-CHANGE_LOG_SIZE:]
+        })
+
+        if raw is None:
+            try:
+                db.table("app_settings").insert({
+                    "key": VERSION_SETTING_KEY,
+                    "value": value,
+                    "is_secret": False,
+                    "description": "Project context snapshot version (internal)"
+                }).execute()
+                return version, []
+            except Exception:
+                continue  # another worker created the row first
+
+        result = db.table("app_settings").update({"value": value})\
+            .eq("key", VERSION_SETTING_KEY).eq("value", raw).execute()
+        if result.data:
+            return version, shared.get('changes', [])
+
+    raise Exception(f"Could not publish snapshot version after {PUBLISH_RETRIES} attempts")
+
+
+def _adopt(version: int, since: int, earlier: List[Dict], rows: Dict[str, Optional[Dict]]) -> None:
+    """
+    Apply our published change and the ones other workers published before
+    it; database reads happen before taking _lock.
+    """
+    global _version, _checked_at
+    missed = [c['project_id'] for c in earlier if c['version'] > since]
+    all_rows = _fetch_all() if None in missed else None
+    missed_rows = _fetch_rows(p for p in missed if p not in rows) if all_rows is None else {}
+
+    with _lock:
+        if _version >= version:
+            return  # a poll already caught up past our change
+        if all_rows is not None:
+            _apply_all(all_rows, version)
+        else:
+            _apply_rows({**missed_rows, **rows})
+            _version = version
+        _checked_at = time.time()
+
+
+def get_projects() -> List[Dict]:
+    """All project rows from the snapshot (do not mutate them)."""
+    _sync()
+    with _lock:
+        return [entry['row'] for entry in _projects.values()]
+
+
+def get_project(project_id: str) -> Optional[Dict]:
+    """One project row from the snapshot."""
+    _sync()
+    with _lock:
+        entry = _projects.get(project_id)
+        return entry['row'] if entry else None
+
+
+def get_cells() -> Dict[str, Dict[str, str]]:
+    """Preformatted context cells per project (see context_builder.format_cells)."""
+    _sync()
+    with _lock:
+        return {project_id: entry['cells'] for project_id, entry in _projects.items()}
+
+
+def get_version() -> str:
+    """
+    Snapshot version for cache keys: the shared version plus a local
+    generation, so it changes whenever this worker's copy changes.
+    """
+    _sync()
+    with _lock:
+        return f"{_version}.{_generation}"
+
+
+def refresh_project(project_id: str) -> None:
+    """
+    Reload one project after a write and tell other workers about it.
+    Also used when data derived from a project (e.g. its stakeholders) changes.
+    Failures are logged, never raised, so they can't break the write path.
+    """
+    refresh_projects([project_id])
+
+
+def refresh_projects(project_ids: Iterable[str]) -> None:
+    """Reload several projects with one query and one version bump."""
+    project_ids = list(dict.fromkeys(p for p in project_ids if p))
+    if not project_ids:
+        return
+    try:
+        _sync()
+        with _lock:
+            since = _version
+        rows = _fetch_rows(project_ids)
+        try:
+            version, earlier = _publish(project_ids)
+        except Exception:
+            with _lock:
+                _apply_rows(rows)  # at least this worker sees the write
+            raise
+        _adopt(version, since, earlier, rows)
+    except Exception as e:
+        print(f"⚠️ Could not refresh project snapshot for {', '.join(project_ids)}: {e}")
+
+
+def invalidate_all() -> None:
+    """Force every worker to reload the whole snapshot (e.g. after bulk changes)."""
+    try:
+        version, _ = _publish([None])
+        rows = _fetch_all()
+        with _lock:
+            _apply_all(rows, max(version, _version))
+    except Exception as e:
+        print(f"⚠️ Could not invalidate project snapshot: {e}")
@@ -0,0 +1,187 @@
+# backend/app/services/request_coalescer.py
+"""
+Single-flight coalescing for expensive AI requests.
+Concurrent identical requests (same normalized payload, role and data
+version) share one upstream call: the first becomes the leader, the rest
+wait for its result. Works across threads in a worker, and optionally
+across workers through the inflight_requests table (migration 030).
+"""
+from app.core.config import settings
+from app.core.supabase import admin_db
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Tuple
+import hashlib
+import httpx
+import openai
+import json
+import threading
+import time
+
+# A leader that hasn't finished by then is presumed dead; followers take over
+LEADER_TIMEOUT_SECONDS = 100
+
+# How long a finished shared result is kept for requests that arrive just after
+RESULT_GRACE_SECONDS = 10
+
+SHARED_POLL_SECONDS = 0.25
+
+
+class CoalescedRequestError(Exception):
+    """The shared leader's call failed; raised in the followers of another worker."""
+
+
+def _encode_error(error: Exception) -> str:
+    """Error column value: enough to raise the same kind of error in followers."""
+    return json.dumps({
+        "type": type(error).__name__,
+        "status_code": getattr(error, 'status_code', None),
+        "message": str(error)
+    })
+
+
+def _decode_error(value: str) -> Exception:
+    """
+    Rebuild a leader's error. OpenAI status errors (authentication, rate
+    limit, ...) come back as the same class, so views answer followers with
+    the status the leader got; anything else is a CoalescedRequestError.
+    """
+    try:
+        info = json.loads(value)
+        message = info['message']
+    except (TypeError, ValueError, KeyError):
+        return CoalescedRequestError(value or 'Coalesced request failed')
+
+    cls = getattr(openai, info.get('type') or '', None)
+    if isinstance(cls, type) and issubclass(cls, openai.APIStatusError) and info.get('status_code'):
+        response = httpx.Response(info['status_code'], request=httpx.Request("POST", "https://api.openai.com/v1"))
+        return cls(message, response=response, body=None)
+    return CoalescedRequestError(message)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_lock = threading.Lock()
+_inflight: Dict[str, _Call] = {}
+_stats = {'leaders': 0, 'followers': 0, 'shared_followers': 0, 'follower_timeouts': 0}
+
+
+def make_key(namespace: str, payload: Any, role: str, data_version: Any) -> str:
+    """Key for a request: endpoint, JSON-normalized payload, role and data version."""
+    raw = json.dumps([namespace, payload, role or '', data_version], sort_keys=True, default=str)
+    return f"{namespace}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _finish(key: str, **fields) -> None:
+    """Publish the leader's outcome; a failure here must not lose the result."""
+    fields["expires_at"] = (_now() + timedelta(seconds=RESULT_GRACE_SECONDS)).isoformat()
+    try:
+        admin_db.table("inflight_requests").update(fields).eq("key", key).execute()
+    except Exception as e:
+        print(f"⚠️ Could not publish coalesced result for {key}: {e}")
+
+
+def _run_shared(key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    """Cross-worker single flight using a row per key as the lock."""
+    try:
+        admin_db.table("inflight_requests").delete().lt("expires_at", _now().isoformat()).execute()
+        admin_db.table("inflight_requests").insert({
+            "key": key,
+            "status": "running",
+            "expires_at": (_now() + timedelta(seconds=LEADER_TIMEOUT_SECONDS)).isoformat()
+        }).execute()
+        is_leader = True
+    except Exception:
+        is_leader = False
+
+    if is_leader:
+        try:
+            result = fn()
+        except Exception as e:
+            _finish(key, status="error", error=_encode_error(e))
+            raise
+        _finish(key, status="done", result=result)
+        return result, False
+
+    # Another worker is computing it: wait for its row to resolve
+    deadline = time.monotonic() + LEADER_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            rows = admin_db.table("inflight_requests").select("status, result, error, expires_at").eq("key", key).execute().data
+        except Exception as e:
+            print(f"⚠️ Shared request coalescing unavailable: {e}")
+            break
+        if not rows or datetime.fromisoformat(rows[0]['expires_at'].replace('Z', '+00:00')) < _now():
+            break  # leader vanished; compute it ourselves
+        if rows[0]['status'] == 'done':
+            with _lock:
+                _stats['shared_followers'] += 1
+            return rows[0]['result'], True
+        if rows[0]['status'] == 'error':
+            raise _decode_error(rows[0].get('error'))
+        time.sleep(SHARED_POLL_SECONDS)
+
+    return fn(), False
+
+
+def run(key: str, fn: Callable[[], Any], shared: bool = None) -> Tuple[Any, bool]:
+    """
+    Run fn once for all concurrent callers with the same key.
+
+    Args:
+        key: From make_key()
+        fn: Does the upstream call; its result must be JSON-serializable in shared mode
+        shared: Coalesce across workers too (default: settings.REQUEST_COALESCING_SHARED)
+
+    Returns:
+        (result, coalesced) where coalesced is True if another request did the work
+    """
+    if shared is None:
+        shared = settings.REQUEST_COALESCING_SHARED
+
+    with _lock:
+        call = _inflight.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _inflight[key] = _Call()
+            _stats['leaders'] += 1
+        else:
+            _stats['followers'] += 1
+
+    if not is_leader:
+        if not call.done.wait(LEADER_TIMEOUT_SECONDS):
+            # The leader is hung: don't tie this thread up with it
+            with _lock:
+                _stats['follower_timeouts'] += 1
+            return fn(), False
+        if call.error:
+            raise call.error
+        return call.result, True
+
+    try:
+        if shared:
+            call.result, coalesced = _run_shared(key, fn)
+        else:
+            call.result, coalesced = fn(), False
+        return call.result, coalesced
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+
+def get_stats() -> Dict:
+    """Leader/follower counts since the worker started."""
+    with _lock:
+        return dict(_stats, inflight=len(_inflight))
@@ -0,0 +1,148 @@
+# backend/app/services/slack_directory.py
+"""
+Shared in-memory Slack workspace directory.
+Builds an email -> Slack ID index from one paginated users.list call
+and reuses it across requests and sync runs until the TTL expires.
+"""
+from app.services.slack_utils import slack_client
+from slack_sdk.errors import SlackApiError
+from typing import Dict, Optional
+import threading
+import time
+
+# How long a directory snapshot is trusted before users.list is called again
+DIRECTORY_TTL_SECONDS = 60 * 60
+
+_lock = threading.Lock()
+_users_by_id: Dict[str, Dict] = {}
+_ids_by_email: Dict[str, str] = {}
+_missing: set = set()  # IDs users.info could not resolve, retried after the next refresh
+_loaded_at = 0.0
+
+
+def _normalize_member(member: dict) -> Dict:
+    """Reduce a Slack member object to the fields we actually use."""
+    profile = member.get('profile', {}) or {}
+    return {
+        'id': member['id'],
+        'name': member.get('name'),
+        'real_name': member.get('real_name') or profile.get('real_name') or member.get('name') or 'Unknown',
+        'email': profile.get('email') or '',
+        'avatar_url': profile.get('image_48', ''),
+        'is_bot': bool(member.get('is_bot')) or member['id'] == 'USLACKBOT',
+        'deleted': bool(member.get('deleted'))
+    }
+
+
+def _fetch_all_members() -> list:
+    """Page through users.list (Tier 2, 200 per page)."""
+    members = []
+    cursor = None
+
+    while True:
+        response = slack_client.users_list(cursor=cursor, limit=200)
+        members.extend(response.get('members', []))
+
+        cursor = (response.get('response_metadata') or {}).get('next_cursor')
+        if not cursor:
+            break
+
+    return members
+
+
+def refresh_directory(force: bool = False) -> int:
+    """
+    Load the workspace directory if the cached copy is missing or stale.
+
+    Args:
+        force: Ignore the TTL and always call users.list
+
+    Returns:
+        Number of users in the directory
+    """
+    global _users_by_id, _ids_by_email, _missing, _loaded_at
+
+    with _lock:
+        if not force and _users_by_id and time.time() - _loaded_at < DIRECTORY_TTL_SECONDS:
+            return len(_users_by_id)
+
+        start_time = time.time()
+        users_by_id = {}
+        ids_by_email = {}
+
+        for member in _fetch_all_members():
+            user = _normalize_member(member)
+            users_by_id[user['id']] = user
+
+            if user['email'] and not user['deleted'] and not user['is_bot']:
+                ids_by_email[user['email'].lower()] = user['id']
+
+        # Swap in the new snapshot atomically
+        _users_by_id = users_by_id
+        _ids_by_email = ids_by_email
+        _missing = set()
+        _loaded_at = time.time()
+
+        print(f"📇 Loaded Slack directory: {len(users_by_id)} users in {int((_loaded_at - start_time) * 1000)}ms")
+        return len(users_by_id)
+
+
+def get_user(user_id: str) -> Optional[Dict]:
+    """
+    Get a user's profile from the cached directory.
+    Falls back to users.info for users who joined after the last refresh
+    and caches the result, so a miss costs at most one API call per
+    directory refresh. Users Slack can't resolve (e.g. Slack Connect users
+    from other workspaces: user_not_found) are remembered as missing until
+    the next refresh; other failures are not cached.
+    """
+    if not user_id:
+        return None
+
+    refresh_directory()
+    user = _users_by_id.get(user_id)
+    if user:
+        return user
+    if user_id in _missing:
+        return None
+
+    try:
+        user_info = slack_client.users_info(user=user_id)
+        user = _normalize_member(user_info['user'])
+    except SlackApiError as e:
+        print(f"⚠️ Could not fetch Slack user {user_id}: {e.response['error']}")
+        if e.response['error'] in ('user_not_found', 'user_not_visible'):
+            with _lock:
+                _missing.add(user_id)
+        return None
+    except Exception as e:
+        print(f"⚠️ Could not fetch Slack user {user_id}: {e}")
+        return None
+
+    with _lock:
+        _users_by_id[user_id] = user
+        if user['email'] and not user['deleted'] and not user['is_bot']:
+            _ids_by_email[user['email'].lower()] = user_id
+
+    return user
+
+
+def lookup_user_id_by_email(email: str) -> Optional[str]:
+    """Resolve an email address to a Slack user ID using the cached directory."""
+    if not email:
+        return None
+    refresh_directory()
+    return _ids_by_email.get(email.strip().lower())
+
+
+def get_email_index() -> Dict[str, str]:
+    """Return the lowercased email -> Slack ID index (refreshed if stale)."""
+    refresh_directory()
+    return _ids_by_email
+
+
+def invalidate_directory() -> None:
+    """Drop the cached directory so the next lookup reloads it."""
+    global _loaded_at
+    with _lock:
+        _loaded_at = 0.0
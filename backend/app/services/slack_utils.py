@@ -2,6 +2,8 @@
 from slack_sdk import WebClient
 from app.core.config import settings
 from app.core.supabase import db
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
 
 # Initialize shared client
 slack_client = WebClient(token=settings.SLACK_BOT_TOKEN)
@@ -69,6 +71,52 @@ def resolve_slack_user_name(user_id: str) -> str:
         print(f"⚠️ Could not resolve slack user {user_id}: {e}")
         return user_id # Fallback to ID so we don't lose info
 
+def fetch_channel_member_ids(channel_id: str) -> List[str]:
+    """
+    Fetch all member IDs of a Slack channel, following pagination.
+    """
+    member_ids = []
+    cursor = None
+
+    while True:
+        response = slack_client.conversations_members(channel=channel_id, cursor=cursor, limit=1000)
+        member_ids.extend(response.get("members", []))
+
+        cursor = (response.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            break
+
+    return member_ids
+
+
+def fetch_members_for_channels(channel_ids: Iterable[str], max_workers: int = 8) -> Dict[str, List[str]]:
+    """
+    Fetch members for many channels concurrently with a bounded pool.
+
+    Args:
+        channel_ids: Slack channel IDs
+        max_workers: Maximum number of in-flight conversations.members calls
+
+    Returns:
+        Dict of channel_id -> member IDs. Channels that failed are omitted.
+    """
+    channel_ids = list(dict.fromkeys(c for c in channel_ids if c))
+    if not channel_ids:
+        return {}
+
+    def fetch(channel_id):
+        try:
+            return channel_id, fetch_channel_member_ids(channel_id)
+        except Exception as e:
+            print(f"⚠️ Could not fetch members for channel {channel_id}: {e}")
+            return channel_id, None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(channel_ids))) as executor:
+        results = list(executor.map(fetch, channel_ids))
+
+    return {channel_id: members for channel_id, members in results if members is not None}
+
+
 def extract_message_content(msg: dict) -> str:
     """
     Extract text content from a Slack message object.
@@ -0,0 +1,98 @@
+# backend/app/services/stakeholder_sync_service.py
+"""
+Stakeholder sync service.
+Links contacts to projects based on Slack channel membership using
+set-based queries: one contacts lookup and one bulk insert per run.
+"""
+from app.core.supabase import db
+from app.services.slack_utils import fetch_members_for_channels
+from app.services import project_snapshot
+from typing import Dict, List, Optional
+
+# Keep IN (...) filters well under PostgREST URL length limits
+LOOKUP_CHUNK_SIZE = 200
+
+
+def _contacts_by_slack_id(slack_ids: List[str]) -> Dict[str, str]:
+    """Map Slack user IDs to contact IDs in as few queries as possible."""
+    contact_ids = {}
+
+    for i in range(0, len(slack_ids), LOOKUP_CHUNK_SIZE):
+        chunk = slack_ids[i:i + LOOKUP_CHUNK_SIZE]
+        result = db.table("contacts").select("id, slack_user_id").in_("slack_user_id", chunk).execute()
+        for contact in result.data or []:
+            contact_ids[contact['slack_user_id']] = contact['id']
+
+    return contact_ids
+
+
+def sync_stakeholders(projects: List[Dict], added_by: Optional[str] = None) -> Dict:
+    """
+    Sync stakeholders for the given projects from their Slack channels.
+
+    Args:
+        projects: Project rows with id, channel_id_internal, channel_id_external
+        added_by: Portal user ID recorded on new stakeholder links
+
+    Returns:
+        Dict with added, skipped and unmatched counts plus a per-project breakdown
+    """
+    channel_ids = []
+    for project in projects:
+        channel_ids.extend([project.get('channel_id_internal'), project.get('channel_id_external')])
+
+    members_by_channel = fetch_members_for_channels(channel_ids)
+
+    # Collect the member set per project
+    members_by_project = {}
+    all_slack_ids = set()
+    for project in projects:
+        member_ids = set()
+        for channel_key in ['channel_id_internal', 'channel_id_external']:
+            member_ids.update(members_by_channel.get(project.get(channel_key), []))
+        members_by_project[project['id']] = member_ids
+        all_slack_ids.update(member_ids)
+
+    contact_ids = _contacts_by_slack_id(sorted(all_slack_ids))
+
+    # Build every candidate link, then let the unique constraint drop existing ones
+    rows = []
+    unmatched = 0
+    for project_id, member_ids in members_by_project.items():
+        for slack_id in member_ids:
+            contact_id = contact_ids.get(slack_id)
+            if not contact_id:
+                unmatched += 1
+                continue
+            row = {"project_id": project_id, "contact_id": contact_id}
+            if added_by:
+                row["added_by"] = added_by
+            rows.append(row)
+
+    inserted = []
+    if rows:
+        result = db.table("project_stakeholders").upsert(
+            rows,
+            on_conflict="project_id,contact_id",
+            ignore_duplicates=True
+        ).execute()
+        inserted = result.data or []
+
+    # Per-project breakdown
+    breakdown = {project['id']: {"added": 0, "skipped": 0} for project in projects}
+    for row in rows:
+        breakdown[row['project_id']]["skipped"] += 1
+    for row in inserted:
+        breakdown[row['project_id']]["added"] += 1
+        breakdown[row['project_id']]["skipped"] -= 1
+    
+    # New links change who can see these projects in AlienGPT
+    project_snapshot.refresh_projects(pid for pid, counts in breakdown.items() if counts["added"])
+
+    return {
+        "added": len(inserted),
+        "skipped": len(rows) - len(inserted),
+        "unmatched": unmatched,
+        "channels_scanned": len(members_by_channel),
+        "projects": breakdown
+    }
@@ -0,0 +1,231 @@
+# backend/app/services/vector_store_gc.py
+"""
+Garbage collector for AI vector stores.
+Removes files superseded by newer uploads, and stores/assistants left behind
+by deleted projects, using the upload registry as the source of truth.
+"""
+from app.core.supabase import db
+from app.services import openai_service, vector_store_registry, activity_logger, assistant_registry
+from app.services.knowledge_service import SHARD_PREFIX
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+import time
+
+# Bounded parallelism for list/delete calls
+GC_MAX_WORKERS = 8
+
+STORE_COLUMNS = ['internal_vector_store_id', 'external_vector_store_id', 'pm_vector_store_id', 'email_vector_store_id', 'ai_vector_store_id']
+ASSISTANT_COLUMNS = ['internal_assistant_id', 'external_assistant_id', 'pm_assistant_id', 'email_assistant_id']
+
+# Name suffixes used when project stores are created (project_ai, both layouts).
+# Only swept with sweep_by_name: other users of the same API key may share them
+PROJECT_STORE_SUFFIXES = (' - Internal', ' - External', ' - Internal-Project-Management', ' - Emails', ' - Knowledge')
+
+# Files, stores and assistants younger than this are never collected: a sync
+# or initialization may still be about to record them
+GC_GRACE_SECONDS = 60 * 60
+
+
+def _run_parallel(fn, items: List) -> List:
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(GC_MAX_WORKERS, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+
+def _list_store_files(client, store_id: str) -> List[Tuple[str, int]]:
+    """List every file attached to a vector store as (file ID, created_at) (auto-paginated)."""
+    return [(f.id, f.created_at or 0) for f in client.vector_stores.files.list(vector_store_id=store_id, limit=100)]
+
+
+def _delete_file(client, store_id: str, file_id: str) -> bool:
+    try:
+        client.vector_stores.files.delete(file_id=file_id, vector_store_id=store_id)
+    except Exception as e:
+        print(f"⚠️ GC: could not detach {file_id} from {store_id}: {e}")
+    try:
+        client.files.delete(file_id)
+        return True
+    except Exception as e:
+        print(f"⚠️ GC: could not delete file {file_id}: {e}")
+        return False
+
+
+def collect_garbage(dry_run: bool = True, sweep_by_name: bool = False) -> Dict:
+    """
+    Find and delete superseded files and orphaned stores/assistants.
+    
+    A store is only collected once it has registry entries, so stores that
+    were never synced through the registry keep their legacy files. Nothing
+    younger than GC_GRACE_SECONDS is collected.
+    
+    Superseded files:
+        - Files in a registered store that no registry row points at
+        - Files of legacy registry rows (monolithic pm_data/emails/Slack batch
+          documents) in stores that have since been sharded
+    Orphans:
+        - Registered stores that no project references anymore, together
+          with their files (with sweep_by_name, also unregistered stores
+          named like project stores)
+        - Assistants whose only vector stores are orphaned
+        - Duplicates of registry-managed assistants (same name, other ID)
+    
+    Args:
+        dry_run: Report what would be deleted without deleting anything
+        sweep_by_name: Also collect unreferenced stores matched only by their
+            name suffix (off by default: the API key's organization may have
+            stores owned by something else)
+        
+    Returns:
+        Dict with the candidates found and counts deleted
+    """
+    client = openai_service.get_openai_client()
+    if not client:
+        raise Exception("OpenAI client not configured - check API key in settings")
+    
+    projects = db.table("projects").select(", ".join(['id'] + STORE_COLUMNS + ASSISTANT_COLUMNS)).execute().data or []
+    live_stores = {p[c] for p in projects for c in STORE_COLUMNS if p.get(c)}
+    live_assistants = {p[c] for p in projects for c in ASSISTANT_COLUMNS if p.get(c)}
+    
+    # Group registry rows per store
+    rows_by_store = {}
+    for row in vector_store_registry.get_all_documents():
+        rows_by_store.setdefault(row['store_id'], []).append(row)
+    
+    # 1. Legacy registry rows superseded by shards
+    stale_rows = []
+    active_files = {}
+    for store_id, rows in rows_by_store.items():
+        sharded = any(r['doc_key'].startswith(SHARD_PREFIX) for r in rows)
+        keep = [r for r in rows if r['doc_key'].startswith(SHARD_PREFIX) or not sharded]
+        stale_rows.extend(r for r in rows if r not in keep)
+        active_files[store_id] = {r['file_id'] for r in keep}
+    
+    cutoff = time.time() - GC_GRACE_SECONDS
+    
+    # 2. Orphaned stores: registered (or, with sweep_by_name, project-named) but
+    #    not referenced by any project. A new store is created before its
+    #    project column is written, so recent stores are left alone
+    store_created = {}
+    candidates = {s for s in rows_by_store if s not in live_stores}
+    for store in client.vector_stores.list(limit=100):
+        store_created[store.id] = store.created_at or 0
+        if sweep_by_name and store.id not in live_stores and (store.name or '').endswith(PROJECT_STORE_SUFFIXES):
+            candidates.add(store.id)
+    orphan_stores = {s for s in candidates if store_created.get(s, 0) < cutoff}
+    
+    # 3. Superseded files in live, registered stores (recent files may belong
+    #    to an upload whose registry rows are not visible yet)
+    live_registered = [s for s in rows_by_store if s in live_stores]
+    listings = dict(zip(live_registered, _run_parallel(lambda s: _list_store_files(client, s), live_registered)))
+    superseded = [
+        (store_id, file_id)
+        for store_id, files in listings.items()
+        for file_id, created_at in files
+        if file_id not in active_files.get(store_id, set()) and created_at < cutoff
+    ]
+    
+    # Files of orphaned stores go too
+    orphan_store_list = sorted(orphan_stores)
+    orphan_listings = dict(zip(orphan_store_list, _run_parallel(lambda s: _list_store_files(client, s), orphan_store_list)))
+    orphan_files = [(store_id, file_id) for store_id, files in orphan_listings.items() for file_id, _ in files]
+    
+    # 4. Assistants that only point at orphaned stores, and duplicates of
+    #    registered shared assistants (e.g. AlienGPT) created before the registry
+    registered = {e['name']: e['assistant_id'] for e in assistant_registry.get_registered_assistants() if e.get('name')}
+    orphan_assistants = []
+    for assistant in client.beta.assistants.list(limit=100):
+        if assistant.id in live_assistants or assistant.id in registered.values():
+            continue
+        if (assistant.created_at or 0) >= cutoff:
+            continue
+        if assistant.name in registered:
+            orphan_assistants.append(assistant.id)
+            continue
+        file_search = getattr(assistant.tool_resources, 'file_search', None) if assistant.tool_resources else None
+        store_ids = list(getattr(file_search, 'vector_store_ids', None) or [])
+        if store_ids and all(s in orphan_stores for s in store_ids):
+            orphan_assistants.append(assistant.id)
+    
+    report = {
+        'dry_run': dry_run,
+        'stores_scanned': len(listings),
+        'superseded_files': len(superseded),
+        'legacy_registry_rows': len(stale_rows),
+        'orphan_stores': len(orphan_stores),
+        'orphan_files': len(orphan_files),
+        'orphan_assistants': len(orphan_assistants),
+        'files_deleted': 0,
+        'stores_deleted': 0,
+        'assistants_deleted': 0
+    }
+    
+    if dry_run:
+        report['candidates'] = {
+            'superseded_files': [f for _, f in superseded],
+            'orphan_stores': orphan_store_list,
+            'orphan_assistants': orphan_assistants
+        }
+        return report
+    
+    # Delete in bounded parallel batches
+    deleted = _run_parallel(lambda sf: _delete_file(client, *sf), superseded + orphan_files)
+    report['files_deleted'] = sum(1 for ok in deleted if ok)
+    
+    def delete_store(store_id):
+        try:
+            client.vector_stores.delete(store_id)
+            return True
+        except Exception as e:
+            print(f"⚠️ GC: could not delete store {store_id}: {e}")
+            return False
+    
+    def delete_assistant(assistant_id):
+        try:
+            client.beta.assistants.delete(assistant_id)
+            return True
+        except Exception as e:
+            print(f"⚠️ GC: could not delete assistant {assistant_id}: {e}")
+            return False
+    
+    report['assistants_deleted'] = sum(1 for ok in _run_parallel(delete_assistant, orphan_assistants) if ok)
+    report['stores_deleted'] = sum(1 for ok in _run_parallel(delete_store, orphan_store_list) if ok)
+    
+    # Forget registry rows that no longer point at live files
+    vector_store_registry.delete_documents(
+        [r['id'] for r in stale_rows] +
+        [r['id'] for s in orphan_stores for r in rows_by_store.get(s, [])]
+    )
+    
+    return report
+
+
+def run_gc(user_id: str, user_name: str, dry_run: bool = True, sweep_by_name: bool = False) -> Dict:
+    """
+    Run the garbage collector and record it in the activity log.
+    
+    Returns:
+        GC report (see collect_garbage)
+    """
+    start_time = time.time()
+    
+    try:
+        report = collect_garbage(dry_run=dry_run, sweep_by_name=sweep_by_name)
+        duration_ms = int((time.time() - start_time) * 1000)
+        
+        activity_logger.log_activity(
+            user_id=user_id,
+            user_name=user_name,
+            action_type='vector_store_gc',
+            resource_type='global',
+            status='success',
+            details={k: v for k, v in report.items() if k != 'candidates'},
+            duration_ms=duration_ms
+        )
+        
+        return report
+    
+    except Exception as e:
+        duration_ms = int((time.time() - start_time) * 1000)
+        activity_logger.log_error(user_id, user_name, 'vector_store_gc', e, 'global', duration_ms=duration_ms)
+        raise
@@ -0,0 +1,60 @@
+# backend/app/services/vector_store_registry.py
+"""
+Upload registry for vector store documents.
+Tracks which file currently holds each logical document in a vector store,
+together with a hash of its content, so uploads can be skipped or replaced.
+"""
+from app.core.supabase import db
+from typing import Dict, Iterable, List, Tuple
+from datetime import datetime, timezone
+import hashlib
+
+
+def content_hash(content: str) -> str:
+    """SHA-256 of a document's text content."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_documents(store_ids: Iterable[str]) -> Dict[Tuple[str, str], Dict]:
+    """
+    Get registered documents for the given vector stores.
+
+    Returns:
+        Dict of (store_id, doc_key) -> registry row
+    """
+    store_ids = list({s for s in store_ids if s})
+    if not store_ids:
+        return {}
+
+    result = db.table("vector_store_documents").select("*").in_("store_id", store_ids).execute()
+    return {(row['store_id'], row['doc_key']): row for row in result.data or []}
+
+
+def record_documents(rows: List[Dict]) -> None:
+    """
+    Insert or replace registry rows.
+
+    Args:
+        rows: Dicts with store_id, doc_key, file_id, content_hash and optionally
+            project_id and filename
+    """
+    if not rows:
+        return
+
+    updated_at = datetime.now(timezone.utc).isoformat()
+    db.table("vector_store_documents").upsert(
+        [{**row, "updated_at": updated_at} for row in rows],
+        on_conflict="store_id,doc_key"
+    ).execute()
+
+
+def get_all_documents() -> List[Dict]:
+    """Get every registry row (used by the garbage collector)."""
+    result = db.table("vector_store_documents").select("id, project_id, store_id, doc_key, file_id").execute()
+    return result.data or []
+
+
+def delete_documents(row_ids: List[str]) -> None:
+    """Delete registry rows by ID."""
+    if row_ids:
+        db.table("vector_store_documents").delete().in_("id", row_ids).execute()
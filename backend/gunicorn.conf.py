@@ -6,7 +6,11 @@ bind = "0.0.0.0:10000"
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+worker_class = "gthread"
+
+# Request threads per worker: a thread waiting on an assistant run is cheap
+# (the run itself is driven by the worker's asyncio loop, see assistant_runner)
+threads = 32
 
 # Timeout - CRITICAL: OpenAI API calls can take 60+ seconds
 timeout = 120  # Increased from default 30s to 120s for AI report generation
@@ -0,0 +1,21 @@
+-- Server-side contact search and keyset pagination
+-- Full-text search over name, email (including its domain) and company
+
+ALTER TABLE contacts
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    to_tsvector(
+        'simple',
+        coalesce(name, '') || ' ' ||
+        coalesce(email, '') || ' ' ||
+        replace(coalesce(email, ''), '@', ' ') || ' ' ||
+        coalesce(company, '')
+    )
+) STORED;
+
+-- GIN index backing the ?q= search
+CREATE INDEX IF NOT EXISTS idx_contacts_search_vector ON contacts USING GIN (search_vector);
+
+-- Composite index backing cursor pagination (ORDER BY name, id)
+CREATE INDEX IF NOT EXISTS idx_contacts_name_id ON contacts(name, id);
+
+COMMENT ON COLUMN contacts.search_vector IS 'Generated tsvector over name, email and company for contact search';
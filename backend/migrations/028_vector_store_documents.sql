@@ -0,0 +1,25 @@
+-- Upload registry for vector store documents
+-- One row per (vector store, logical document) pointing at the current file,
+-- so unchanged content is skipped and changed content replaces the old file
+
+CREATE TABLE IF NOT EXISTS vector_store_documents (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    project_id UUID REFERENCES projects(id) ON DELETE SET NULL,
+    store_id TEXT NOT NULL,
+    doc_key TEXT NOT NULL, -- Logical document, e.g. 'pm_data', 'emails'
+    file_id TEXT NOT NULL, -- Current OpenAI file in the store
+    content_hash TEXT NOT NULL, -- SHA-256 of the uploaded content
+    filename TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE(store_id, doc_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_vector_store_documents_project ON vector_store_documents(project_id);
+CREATE INDEX IF NOT EXISTS idx_vector_store_documents_file ON vector_store_documents(file_id);
+
+-- Accessed through the service role only (same as activity_logs)
+ALTER TABLE vector_store_documents DISABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE vector_store_documents IS 'Registry of uploaded vector store documents with content hashes';
+COMMENT ON COLUMN vector_store_documents.project_id IS 'Owning project; NULL once the project is deleted';
@@ -0,0 +1,80 @@
+-- Accessible projects and vector stores for a portal user, in one round-trip
+-- Called from access_control via RPC: admin_db.rpc('get_user_access', {...})
+--
+--   superadmin / internal : every project except the Shopline workspace, all 4 stores
+--   shopline              : projects they're linked to (stakeholder contact with the
+--                           same email, or assigned_projects), external store only
+--   merchant              : assigned_projects, or projects where their contact is the
+--                           'Merchant' stakeholder, external store only
+
+CREATE OR REPLACE FUNCTION get_user_access(p_user_id UUID, p_role TEXT)
+RETURNS TABLE (
+    project_id UUID,
+    project_name TEXT,
+    access TEXT,
+    vector_store_ids TEXT[]
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH me AS (
+        SELECT id, lower(email) AS email, COALESCE(assigned_projects, '{}') AS assigned_projects
+        FROM portal_users
+        WHERE id = p_user_id
+    ),
+    linked AS (
+        -- Stakeholder links through the contact that shares the user's email
+        SELECT ps.project_id, ps.role
+        FROM project_stakeholders ps
+        JOIN contacts c ON c.id = ps.contact_id
+        JOIN me ON lower(c.email) = me.email
+    ),
+    visible AS (
+        SELECT p.*, 'full'::TEXT AS access
+        FROM projects p
+        WHERE p_role IN ('superadmin', 'internal')
+          AND p.client_name IS DISTINCT FROM 'Shopline'
+
+        UNION ALL
+
+        SELECT p.*, 'external'::TEXT AS access
+        FROM projects p
+        WHERE p_role = 'shopline'
+          AND (
+              p.id IN (SELECT linked.project_id FROM linked)
+              OR p.id = ANY ((SELECT assigned_projects FROM me))
+          )
+
+        UNION ALL
+
+        SELECT p.*, 'external'::TEXT AS access
+        FROM projects p
+        WHERE p_role = 'merchant'
+          AND (
+              p.id IN (SELECT linked.project_id FROM linked WHERE linked.role = 'Merchant')
+              OR p.id = ANY ((SELECT assigned_projects FROM me))
+          )
+    )
+    SELECT
+        v.id,
+        v.client_name,
+        v.access,
+        array_remove(
+            CASE WHEN v.access = 'full'
+                THEN ARRAY[v.internal_vector_store_id, v.external_vector_store_id, v.pm_vector_store_id, v.email_vector_store_id]
+                ELSE ARRAY[v.external_vector_store_id]
+            END,
+            NULL
+        )
+    FROM visible v
+    ORDER BY v.client_name;
+$$;
+
+-- Service role only: the function bypasses RLS and takes any user ID
+REVOKE ALL ON FUNCTION get_user_access(UUID, TEXT) FROM PUBLIC;
+REVOKE ALL ON FUNCTION get_user_access(UUID, TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_user_access(UUID, TEXT) TO service_role;
+
+COMMENT ON FUNCTION get_user_access(UUID, TEXT) IS 'Accessible projects, access level and vector store IDs for a portal user';
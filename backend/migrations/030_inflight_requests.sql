@@ -0,0 +1,19 @@
+-- Shared single-flight lock for AI requests (request_coalescer, shared mode)
+-- One row per in-flight request key: the worker whose insert succeeds runs the
+-- upstream call, the others poll the row until the result is written
+
+CREATE TABLE IF NOT EXISTS inflight_requests (
+    key TEXT PRIMARY KEY, -- '<endpoint>:<sha256 of payload, role and data version>'
+    status TEXT NOT NULL DEFAULT 'running', -- running | done | error
+    result JSONB, -- Leader's response, shared with followers
+    error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL -- Leader timeout, then a short grace period once finished
+);
+
+CREATE INDEX IF NOT EXISTS idx_inflight_requests_expires ON inflight_requests(expires_at);
+
+-- Accessed through the service role only
+ALTER TABLE inflight_requests DISABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE inflight_requests IS 'Cross-worker coalescing of identical in-flight AI requests';
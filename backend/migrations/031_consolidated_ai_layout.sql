@@ -0,0 +1,81 @@
+-- Consolidated per-project AI layout
+-- One vector store per project holding every source (internal, external, pm,
+-- email); files carry a "source" attribute and chat applies a file_search
+-- filter per visibility, replacing 4 stores + 4 assistants per project.
+-- Used for new projects when AI_CONSOLIDATED_LAYOUT=true.
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS ai_vector_store_id TEXT;
+
+COMMENT ON COLUMN projects.ai_vector_store_id IS 'Consolidated vector store (all sources, tagged by source attribute); NULL for the per-source layout';
+
+-- get_user_access (029) with the consolidated store. It mixes internal and
+-- external data, and AlienGPT's assistant runs cannot filter by attribute,
+-- so only full-access users get it.
+CREATE OR REPLACE FUNCTION get_user_access(p_user_id UUID, p_role TEXT)
+RETURNS TABLE (
+    project_id UUID,
+    project_name TEXT,
+    access TEXT,
+    vector_store_ids TEXT[]
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH me AS (
+        SELECT id, lower(email) AS email, COALESCE(assigned_projects, '{}') AS assigned_projects
+        FROM portal_users
+        WHERE id = p_user_id
+    ),
+    linked AS (
+        -- Stakeholder links through the contact that shares the user's email
+        SELECT ps.project_id, ps.role
+        FROM project_stakeholders ps
+        JOIN contacts c ON c.id = ps.contact_id
+        JOIN me ON lower(c.email) = me.email
+    ),
+    visible AS (
+        SELECT p.*, 'full'::TEXT AS access
+        FROM projects p
+        WHERE p_role IN ('superadmin', 'internal')
+          AND p.client_name IS DISTINCT FROM 'Shopline'
+
+        UNION ALL
+
+        SELECT p.*, 'external'::TEXT AS access
+        FROM projects p
+        WHERE p_role = 'shopline'
+          AND (
+              p.id IN (SELECT linked.project_id FROM linked)
+              OR p.id = ANY ((SELECT assigned_projects FROM me))
+          )
+
+        UNION ALL
+
+        SELECT p.*, 'external'::TEXT AS access
+        FROM projects p
+        WHERE p_role = 'merchant'
+          AND (
+              p.id IN (SELECT linked.project_id FROM linked WHERE linked.role = 'Merchant')
+              OR p.id = ANY ((SELECT assigned_projects FROM me))
+          )
+    )
+    SELECT
+        v.id,
+        v.client_name,
+        v.access,
+        array_remove(
+            CASE WHEN v.access = 'full'
+                THEN ARRAY[v.internal_vector_store_id, v.external_vector_store_id, v.pm_vector_store_id, v.email_vector_store_id, v.ai_vector_store_id]
+                ELSE ARRAY[v.external_vector_store_id]
+            END,
+            NULL
+        )
+    FROM visible v
+    ORDER BY v.client_name;
+$$;
+
+REVOKE ALL ON FUNCTION get_user_access(UUID, TEXT) FROM PUBLIC;
+REVOKE ALL ON FUNCTION get_user_access(UUID, TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_user_access(UUID, TEXT) TO service_role;
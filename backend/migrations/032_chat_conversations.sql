@@ -0,0 +1,20 @@
+-- Server-side AlienGPT chat conversations (chat.send_message)
+-- Older turns are folded into a rolling summary; only the summary and the
+-- most recent turns are kept verbatim and sent to the model
+
+CREATE TABLE IF NOT EXISTS chat_conversations (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES portal_users(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL DEFAULT '', -- Rolling summary of the turns no longer kept verbatim
+    turns JSONB NOT NULL DEFAULT '[]', -- Recent turns: [{"role": "user"|"assistant", "content": "..."}]
+    turn_count INTEGER NOT NULL DEFAULT 0, -- All turns ever added, including summarized ones
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_conversations_user ON chat_conversations(user_id, updated_at DESC);
+
+-- Accessed through the service role only; the API checks ownership
+ALTER TABLE chat_conversations DISABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE chat_conversations IS 'AlienGPT chat memory: rolling summary plus recent turns per conversation';
@@ -0,0 +1,7 @@
+-- Last project AI chat (AI_LAZY_INIT)
+-- Stamped by chats (at most every few minutes); in lazy mode global sync only
+-- refreshes projects chatted with recently, so sync cost follows actual use
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS last_ai_chat_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN projects.last_ai_chat_at IS 'Last project AI chat; lazy-mode global sync skips projects without recent chats';
@@ -22,6 +22,7 @@ REQUIRED_TABLES = [
     "activity_logs",
     "emails",  # Required for AI sync
     "unmatched_emails",
+    "vector_store_documents",  # Upload registry for AI sync
 ]
 
 
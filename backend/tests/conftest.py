@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Run from backend/ or the repo root: make the app package importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.core.supabase refuses to import without credentials; tests never reach the database
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test.test.test")
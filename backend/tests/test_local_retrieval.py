@@ -0,0 +1,118 @@
+# backend/tests/test_local_retrieval.py
+"""
+Local retrieval index: deterministic hashing embedder, keyed upserts that
+replace edited passages, visibility filtering, compaction and reloading
+by another worker.
+"""
+from app.services import local_retrieval
+from app.services.local_retrieval import HashingEmbedder
+import numpy as np
+import os
+import pytest
+
+
+@pytest.fixture
+def passages(tmp_path, monkeypatch):
+    """Source records served to update_index(), editable by the test."""
+    records = {}
+    monkeypatch.setattr(local_retrieval.settings, 'LOCAL_RETRIEVAL_DIR', str(tmp_path))
+    monkeypatch.setattr(local_retrieval, '_indexes', {})
+    monkeypatch.setattr(local_retrieval, '_update_locks', {})
+    monkeypatch.setattr(local_retrieval, 'collect_passages', lambda project_id, since=None: [
+        {'key': key, 'text': text, 'visibility': visibility, 'timestamp': '2025-10-01T00:00:00+00:00'}
+        for key, (text, visibility) in records.items()
+    ])
+    return records
+
+
+def search(index, question, visibility='internal', k=5):
+    return [hit['text'] for hit in index.search(index.embedder.embed([question])[0], k, visibility)]
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    first = HashingEmbedder(dim=64).embed(["Checkout launch moved to Friday", ""])
+    second = HashingEmbedder(dim=64).embed(["Checkout launch moved to Friday", ""])
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+    assert not first[1].any()
+
+
+def test_hashing_embedder_ranks_shared_words_higher():
+    embedder = HashingEmbedder(dim=256)
+    query, related, unrelated = embedder.embed(["payment gateway error", "the payment gateway returns an error",
+                                                "team lunch on thursday"])
+    assert query @ related > query @ unrelated
+
+
+def test_upsert_replaces_edited_passages(passages):
+    embedder = HashingEmbedder(dim=64)
+    passages['pm:project_info'] = ("Status: New", 'internal')
+    passages['log:1'] = ("Theme review scheduled", 'external')
+    assert local_retrieval.update_index('p1', embedder) == {'added': 2, 'replaced': 0, 'total': 2}
+
+    # Unchanged records are not embedded again
+    assert local_retrieval.update_index('p1', embedder) == {'added': 0, 'replaced': 0, 'total': 2}
+
+    passages['pm:project_info'] = ("Status: Launched", 'internal')
+    assert local_retrieval.update_index('p1', embedder) == {'added': 0, 'replaced': 1, 'total': 2}
+    index = local_retrieval.get_index('p1', embedder)
+    assert search(index, "status") == ["Status: Launched", "Theme review scheduled"]
+
+
+def test_external_search_skips_internal_passages(passages):
+    embedder = HashingEmbedder(dim=64)
+    passages['email:1'] = ("Margin notes for the renewal", 'internal')
+    passages['log:1'] = ("Renewal call booked", 'external')
+    local_retrieval.update_index('p1', embedder)
+
+    index = local_retrieval.get_index('p1', embedder)
+    assert search(index, "renewal", 'external') == ["Renewal call booked"]
+    assert len(search(index, "renewal", 'internal')) == 2
+
+
+def test_compaction_drops_dead_rows(passages, monkeypatch):
+    monkeypatch.setattr(local_retrieval, 'COMPACT_MIN_DEAD_ROWS', 2)
+    embedder = HashingEmbedder(dim=64)
+    passages['log:1'] = ("Kickoff call done", 'external')
+    for status in ("New", "Ready", "Almost Ready", "Launched"):
+        passages['pm:project_info'] = (f"Status: {status}", 'internal')
+        local_retrieval.update_index('p1', embedder)
+
+    index = local_retrieval.get_index('p1', embedder)
+    assert len(index.meta['keys']) == index.live_count == 2
+    assert index.meta['vectors_file'] != 'vectors-0.f32'
+    assert sorted(name for name in os.listdir(index.path) if name.endswith('.f32')) == [index.meta['vectors_file']]
+    assert search(index, "status") == ["Status: Launched", "Kickoff call done"]
+
+
+def test_update_does_not_touch_the_published_index(passages, monkeypatch):
+    monkeypatch.setattr(local_retrieval, 'COMPACT_MIN_DEAD_ROWS', 1)
+    embedder = HashingEmbedder(dim=64)
+    passages['pm:project_info'] = ("Status: New", 'internal')
+    local_retrieval.update_index('p1', embedder)
+
+    index = local_retrieval.get_index('p1', embedder)
+    meta, vectors = index.meta, index.vectors
+    for status in ("Ready", "Launched"):
+        passages['pm:project_info'] = (f"Status: {status}", 'internal')
+        local_retrieval.update_index('p1', embedder)
+
+    # A search that started before the updates keeps a consistent view
+    assert meta['keys'] == ['pm:project_info'] and len(meta['passages']) == len(vectors) == 1
+    assert index.meta is not meta
+
+
+def test_rebuild_and_reload_by_another_worker(passages):
+    embedder = HashingEmbedder(dim=64)
+    passages['log:1'] = ("Domain verified", 'external')
+    local_retrieval.update_index('p1', embedder)
+
+    other = local_retrieval.ProjectIndex('p1', embedder)
+    other.load()
+    assert search(other, "domain") == ["Domain verified"]
+
+    del passages['log:1']
+    passages['log:2'] = ("Payment provider approved", 'external')
+    assert local_retrieval.update_index('p1', embedder, rebuild=True) == {'added': 1, 'replaced': 0, 'total': 1}
+    other.load()
+    assert search(other, "payment") == ["Payment provider approved"]
@@ -0,0 +1,82 @@
+# backend/tests/test_project_query.py
+"""
+project_query answers exactly or not at all: questions with a filter it
+can't apply must go to the LLM (None) instead of getting a wrong count.
+"""
+from app.services import project_query
+from datetime import date
+import pytest
+
+TODAY = date(2025, 10, 15)
+
+PROJECTS = [
+    {'id': '1', 'client_name': 'Acme Goods', 'owner': 'Leo Peng', 'developer': 'Maya', 'category': 'Launched',
+     'blocker': '', 'launch_date_public': '2025-10-08'},
+    {'id': '2', 'client_name': 'Blue Harbor', 'owner': 'Bule', 'developer': 'Leo', 'category': 'Stuck / On Hold',
+     'blocker': 'Waiting on DNS', 'launch_date_public': '2025-10-20'},
+    {'id': '3', 'client_name': 'Cedar Lane', 'owner': 'Leo Peng', 'developer': 'Maya', 'category': 'New / In Progress',
+     'blocker': 'none', 'launch_date_internal': '2025-09-12'},
+]
+
+
+def ask(question):
+    return project_query.answer(question, PROJECTS, version='test', today=TODAY)
+
+
+@pytest.mark.parametrize('question', [
+    "how many projects does Bob manage",
+    "how many projects does bob manage",
+    "how many projects were created in September",
+    "how many projects are not blocked",
+    "which projects aren't blocked",
+    "list projects without a developer",
+    "how many projects launched last week",
+    "which projects launch in 2026",
+    "how many projects are due this week",
+    "which projects does Leo own for Shopify",
+    "what is the total budget across all projects",
+    "which clients have a live url",
+    "which projects is Leo waiting on",
+    "give me the merchant emails for blocked projects",
+])
+def test_unparsed_filters_go_to_llm(question):
+    assert ask(question) is None
+
+
+def test_develop_is_a_developer_question():
+    result = ask("how many projects does Leo develop")
+    assert result['intent']['filters']['people'] == ['Leo']
+    assert result['intent']['matched'] == 1
+    assert 'Blue Harbor' in result['response']
+
+
+def test_owner_count():
+    result = ask("how many projects does Leo manage")
+    assert result['intent']['matched'] == 2
+
+
+def test_blocked_list():
+    result = ask("which projects are blocked")
+    assert result['intent']['matched'] == 1
+    assert 'Blue Harbor' in result['response']
+
+
+def test_launch_window():
+    result = ask("which projects launch next week")
+    assert result['intent']['matched'] == 1
+    assert 'Blue Harbor' in result['response']
+
+
+def test_total_count():
+    assert ask("how many projects are there")['intent']['matched'] == 3
+
+
+@pytest.mark.parametrize('question, matched', [
+    ("how many projects per pm", 3),
+    ("which projects are live", 1),
+    ("how many projects are in progress", 1),
+    ("list blocked projects with developer Leo", 1),
+    ("any projects launching in the next 10 days", 1),
+])
+def test_fully_parsed_questions(question, matched):
+    assert ask(question)['intent']['matched'] == matched
@@ -12,6 +12,8 @@ export default function AlienGPT() {
     const [messages, setMessages] = useState([]);
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
+    // Server-side conversation; only the new message is sent with it
+    const [conversationId, setConversationId] = useState(null);
     const messagesEndRef = useRef(null);
 
     const scrollToBottom = () => {
@@ -55,9 +57,13 @@ What would you like to know?`,
         try {
             const response = await api.post('/chat/message', {
                 message: input,
-                history: messages.map(m => ({ role: m.role, content: m.content }))
+                conversation_id: conversationId
             });
 
+            if (response.data.conversation_id) {
+                setConversationId(response.data.conversation_id);
+            }
+
             const aiMessage = {
                 role: 'assistant',
                 content: response.data.message,
@@ -66,6 +72,10 @@ What would you like to know?`,
 
             setMessages(prev => [...prev, aiMessage]);
         } catch (error) {
+            if (error.response?.status === 404) {
+                // Conversation expired or was cleared elsewhere; the next message starts a new one
+                setConversationId(null);
+            }
             const errorMessage = {
                 role: 'assistant',
                 content: `❌ Error: ${error.response?.data?.error || 'Failed to get response. Please try again.'}`,
@@ -84,6 +94,14 @@ What would you like to know?`,
             variant: 'warning'
         });
         if (confirmed) {
+            if (conversationId) {
+                try {
+                    await api.post('/chat/clear', { conversation_id: conversationId });
+                } catch (error) {
+                    console.error('Failed to clear conversation:', error);
+                }
+                setConversationId(null);
+            }
             setMessages([{
                 role: 'assistant',
                 content: `Conversation cleared! How can I help you?`,